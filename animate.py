@@ -0,0 +1,369 @@
+""" Animations of the time evolution of a run: DF, BDNK, ideal hydro and free streaming.
+
+The figures only show the final time, but a run keeps its whole history: the
+solution dataset of the .h5 (the density frame solver) and the rows of
+name_out/<tag>.txt (BDNK). animate draws one field of all four against x at
+every printed time
+
+    DF      solution[i, :, tag] of the run, read one time slice at a time (solution.py)
+    BDNK    row i of name_out/<tag>.txt, read line by line (or from its binary cache)
+    ideal   the eta/s = 0 run with the same initial data, or idealhydro.py stepped
+            from one frame to the next
+    free    freestream.py of the initial data at the time of the frame
+
+Every source is a generator which yields the values of one frame, so only one
+time of every source is in memory whatever the length of the history. The
+static parts of the figure (axes, ticks, labels, legend) are drawn once and
+saved; every frame restores them, updates the data of the lines and draws only
+the lines and the time (blitting). The frames are handed through a short queue
+to a writer thread, which encodes them while the next ones are read and drawn:
+
+    .mp4, .gif    piped to ffmpeg (rcParams['animation.ffmpeg_path'])
+    .gif          without ffmpeg, by Pillow, which keeps every frame (one byte
+                  per pixel) until the end
+    a directory   one PNG per frame
+
+    python animate.py --testcase test1 --etabys 0.513 -o test1.mp4
+    python animate.py DFAndBDNK/nbys_6d446548125166256_d_0d12_A_0d48_w_25d0 --tag eps -o frames/
+"""
+import os
+import sys
+import time
+import queue
+import shutil
+import argparse
+import threading
+import subprocess
+import numpy as np
+
+from dfdata import topdir, touch, isfresh, cachename, loadout, readcolumns, h5variables
+
+
+# Tags which every source can draw
+animtags = list(h5variables)
+
+# Sources in the order of the legend, with their colors
+animsources = {'DF': 'C0', 'BDNK': 'C1', 'ideal': 'k', 'free': 'C2'}
+
+# Labels of the tags
+taglabels = {'Ttt': r'$T^{tt}$', 'Ttx': r'$T^{tx}$', 'eps': r'$\varepsilon$', 'ux': r'$u^x$'}
+
+# Number of frames the writer thread can fall behind
+queuesize = 8
+
+
+################################################################################
+def nearest(times, t):
+    """ Returns the index of the time in times closest to t """
+    i = int(np.searchsorted(times, t))
+    if i == 0 or (i < len(times) and times[i] - t < t - times[i - 1]):
+        return min(i, len(times) - 1)
+    return i - 1
+
+
+def fieldof(tag, Ttt, Ttx):
+    """ Returns tag from the conserved densities Ttt and Ttx """
+    from idealhydro import primitives
+    if tag in ('Ttt', 'Ttx'):
+        return Ttt if tag == 'Ttt' else Ttx
+    e, v = primitives(Ttt, Ttx)
+    return e if tag == 'eps' else v/np.sqrt(1 - v**2)
+
+
+def h5stream(entry, tag, times):
+    """ Yields (x, values) of tag from the solution of a run at the times closest to times """
+    from solution import SolutionView
+    with SolutionView(entry) as view:
+        x, rows = view.x, view.times
+        for t in times:
+            yield x, view[nearest(rows, t), :, tag]
+
+
+def outstream(name, tag, times):
+    """ Yields (x, values) of tag from name_out/<tag>.txt at the times closest to times, which must increase """
+    filename = name + '_out/{}.txt'.format(tag)
+    x, rows = loadout(name, 'x'), loadout(name, 't')
+    if isfresh(filename, cachename(filename)):
+        history = loadout(name, tag)
+        for t in times:
+            yield x, np.asarray(history[nearest(rows, t)])
+        return
+    touch(filename)
+    with open(filename) as f:
+        current, line = -1, ''
+        for t in times:
+            i = nearest(rows, t)
+            while current < i:
+                line, current = f.readline(), current + 1
+            yield x, np.array(line.split(), dtype=float)
+
+
+def idealstream(entry, tag, times, x, Ttt, Ttx):
+    """ Yields (x, values) of tag of ideal hydro, stepped from the initial data Ttt, Ttx to every time """
+    from idealhydro import solveideal
+    now = entry.get('initial_time', 0.0)
+    for t in times:
+        if t > now:
+            Ttt, Ttx = solveideal(x, Ttt, Ttx, t - now)
+            now = t
+        yield x, fieldof(tag, Ttt, Ttx)
+
+
+def freestreamer(entry, tag, times, x, Ttt0, Ttx0):
+    """ Yields (x, values) of tag of the free streaming of the initial data Ttt0, Ttx0 at every time """
+    from freestream import freestream
+    start = entry.get('initial_time', 0.0)
+    for t in times:
+        Ttt, Ttx = freestream(x, Ttt0, Ttx0, t - start)
+        yield x, fieldof(tag, Ttt[0], Ttx[0])
+
+
+def frametimes(entry, every=1):
+    """ Returns every every-th printed time of a run """
+    if entry.get('h5'):
+        from solution import SolutionView
+        with SolutionView(entry) as view:
+            times = view.times
+    else:
+        times = np.atleast_1d(loadout(os.path.join(topdir, entry['name']), 't'))
+    return np.asarray(times)[::every]
+
+
+def streams(entry, tag, times, sources=tuple(animsources)):
+    """ Returns {source: generator of (x, values)} of the sources which the run has """
+    from catalog import idealof
+
+    name = os.path.join(topdir, entry['name'])
+    found = {}
+    if 'DF' in sources and entry.get('h5'):
+        found['DF'] = h5stream(entry, tag, times)
+    if 'BDNK' in sources and entry.get('out'):
+        found['BDNK'] = outstream(name, tag, times)
+    if not entry.get('h5') or not {'ideal', 'free'} & set(sources):
+        return found
+
+    from solution import SolutionView
+    with SolutionView(entry) as view:
+        x = view.x
+    initial = readcolumns(name + '.h5', 'initialdatain', ['Ttt', 'Ttx'])
+    if 'ideal' in sources:
+        try:
+            entry0 = idealof(entry)
+        except KeyError:
+            entry0 = None
+        # An eta/s = 0 run is its own ideal baseline
+        if entry0 is not None and entry0.get('h5'):
+            if entry0['name'] != entry['name']:
+                found['ideal'] = h5stream(entry0, tag, times)
+        else:
+            found['ideal'] = idealstream(entry, tag, times, x, initial['Ttt'], initial['Ttx'])
+    if 'free' in sources:
+        found['free'] = freestreamer(entry, tag, times, x, initial['Ttt'], initial['Ttx'])
+    return found
+
+
+################################################################################
+def ffmpegpath():
+    """ Returns the ffmpeg executable of matplotlib's settings, or None if there is none """
+    import matplotlib
+    return shutil.which(matplotlib.rcParams['animation.ffmpeg_path'])
+
+
+def framesof(frames):
+    """ Yields the frames put in the queue frames until None """
+    while True:
+        frame = frames.get()
+        if frame is None:
+            return
+        yield frame
+
+
+def encodeffmpeg(output, frames, size, fps):
+    """ Pipes the RGBA frames of size (width, height) to ffmpeg, which writes an MP4 or a GIF """
+    width, height = size
+    command = [ffmpegpath(), '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+               '-s', '{}x{}'.format(width, height), '-r', str(fps), '-i', '-']
+    if output.endswith('.gif'):
+        # A palette per frame, so that ffmpeg never has to hold the whole animation
+        command += ['-vf', 'split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1', '-loop', '0']
+    else:
+        command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p']
+    process = subprocess.Popen(command + [output], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+    except BrokenPipeError:
+        pass
+    finally:
+        process.stdin.close()
+        errors = process.stderr.read().decode(errors='replace')
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError('ffmpeg failed on {}: {}'.format(output, errors.strip()))
+
+
+def encodegif(output, frames, size, fps):
+    """ Writes a GIF with Pillow. Every frame is kept, with one byte per pixel, until the file is written """
+    from PIL import Image
+    images = [Image.fromarray(frame[..., :3]).convert('P', palette=Image.Palette.ADAPTIVE) for frame in frames]
+    if images:
+        images[0].save(output, save_all=True, append_images=images[1:], duration=int(round(1000/fps)), loop=0)
+
+
+def encodepngs(output, frames, size, fps):
+    """ Writes every frame as output/frame_<n>.png """
+    from PIL import Image
+    os.makedirs(output, exist_ok=True)
+    for i, frame in enumerate(frames):
+        Image.fromarray(frame).save(os.path.join(output, 'frame_{:05d}.png'.format(i)))
+
+
+def encoderof(output):
+    """ Returns the function which encodes the frames into output """
+    if os.path.isdir(output) or not os.path.splitext(output)[1]:
+        return encodepngs
+    if ffmpegpath():
+        return encodeffmpeg
+    if output.endswith('.gif'):
+        return encodegif
+    raise RuntimeError('writing {} needs ffmpeg; write a .gif or a directory of PNGs instead'.format(output))
+
+
+class FrameWriter:
+    """ Encodes frames into output in a background thread.
+
+    write blocks when the thread is queuesize frames behind, so the memory used
+    does not grow with the number of frames. An error of the encoder is raised
+    by the next write or by close.
+    """
+
+    def __init__(self, output, size, fps):
+        self.output = output
+        self.frames = queue.Queue(maxsize=queuesize)
+        self.error = None
+        self.encode = encoderof(output)
+        self.thread = threading.Thread(target=self.run, args=(size, fps), daemon=True)
+        self.thread.start()
+
+    def run(self, size, fps):
+        try:
+            self.encode(self.output, framesof(self.frames), size, fps)
+        except Exception as error:
+            self.error = error
+            # Whatever is left must not block the producer
+            for frame in framesof(self.frames):
+                pass
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.frames.put(frame)
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+################################################################################
+def animate(entry, output, tag='Ttt', sources=tuple(animsources), every=1, fps=15, figsize=(6, 4), dpi=100,
+            verbose=False):
+    """ Writes the animation of tag of a run (a catalog entry or the name of a run) to output.
+
+    Returns the number of frames. The y limits start from the first frame and
+    only ever grow, with a margin, when a later frame leaves them; the static
+    parts of the figure are then drawn again.
+    """
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from catalog import entryof
+
+    entry = entry if isinstance(entry, dict) else entryof(entry)
+    times = frametimes(entry, every)
+    sourcestreams = streams(entry, tag, times, sources)
+    if not sourcestreams:
+        raise ValueError('{} has none of the sources {}'.format(entry['name'], ', '.join(sources)))
+
+    with matplotlib.rc_context({'text.usetex': False}):
+        fig = Figure(figsize=figsize, dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        first = {source: next(stream) for source, stream in sourcestreams.items()}
+        lines = {source: ax.plot(x, values, color=animsources[source], label=source, animated=True)[0]
+                 for source, (x, values) in first.items()}
+        label = ax.text(0.03, 0.93, '', transform=ax.transAxes, animated=True)
+        ax.set_xlabel(r'$x$')
+        ax.set_ylabel(taglabels.get(tag, tag))
+        ax.set_title(r'{}, $4\pi\eta/s = {:.3g}$'.format(entry['testcase'], entry['fourpietabys']))
+        ax.set_xlim(min(x[0] for x, v in first.values()), max(x[-1] for x, v in first.values()))
+        ax.legend(loc='upper right')
+        limits = [np.inf, -np.inf]
+
+        def background(values):
+            """ Grows the y limits to hold values, redrawing the static parts if they changed """
+            finite = np.concatenate([v[np.isfinite(v)] for v in values])
+            lo, hi = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+            if lo >= limits[0] and hi <= limits[1]:
+                return None
+            margin = 0.05*max(max(hi, limits[1]) - min(lo, limits[0]), abs(hi), 1e-12)
+            limits[:] = min(lo, limits[0]) - margin, max(hi, limits[1]) + margin
+            ax.set_ylim(*limits)
+            fig.tight_layout()
+            canvas.draw()
+            return canvas.copy_from_bbox(fig.bbox)
+
+        size = canvas.get_width_height()
+        start = time.perf_counter()
+        saved, nframes = None, 0
+        with FrameWriter(output, size, fps) as writer:
+            frames = {source: (x, values) for source, (x, values) in first.items()}
+            for i, t in enumerate(times):
+                if i > 0:
+                    frames = {source: next(stream) for source, stream in sourcestreams.items()}
+                saved = background([values for x, values in frames.values()]) or saved
+                canvas.restore_region(saved)
+                for source, (x, values) in frames.items():
+                    lines[source].set_data(x, values)
+                    ax.draw_artist(lines[source])
+                label.set_text(r'$t = {:.2f}$'.format(t))
+                ax.draw_artist(label)
+                writer.write(np.asarray(canvas.buffer_rgba()).copy())
+                nframes += 1
+        if verbose:
+            print('{} frames of {} in {:.1f}s: {}'.format(nframes, entry['name'], time.perf_counter() - start, output))
+    return nframes
+
+
+if __name__ == '__main__':
+    from catalog import findruns
+
+    parser = argparse.ArgumentParser(description='Animates DF, BDNK, ideal hydro and free streaming of a run')
+    parser.add_argument('run', nargs='?', help='the name of a run, e.g. DFAndBDNK/nbys_..._w_25d0')
+    parser.add_argument('--testcase', help='with --etabys, the run to animate instead of its name')
+    parser.add_argument('--etabys', type=float, help='eta/s of the run')
+    parser.add_argument('-o', '--output', required=True, help='.mp4, .gif or a directory for PNG frames')
+    parser.add_argument('--tag', default='Ttt', choices=animtags)
+    parser.add_argument('--sources', nargs='+', default=list(animsources), choices=list(animsources))
+    parser.add_argument('--every', type=int, default=1, help='draw every n-th printed time')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.run:
+        run = args.run
+    else:
+        found = findruns(testcase=args.testcase, fourpietabys=4*np.pi*(args.etabys or 0.0), rtol=1e-4,
+                         source='DFAndBDNK')
+        if len(found) != 1:
+            parser.error('{} runs match --testcase {} --etabys {}'.format(len(found), args.testcase, args.etabys))
+        run = found[0]
+    animate(run, args.output, args.tag, args.sources, args.every, args.fps, dpi=args.dpi, verbose=True)
+    sys.exit(0)
@@ -0,0 +1,334 @@
+""" Benchmarks of the loaders, the analytic references and the figures.
+
+Every benchmark is timed repeat times, starting each time from an empty
+in-process memo (dfdata.memoclear), so the numbers are for a fresh figure
+build with the binary caches of .dfcache in place. The peak memory allocated
+while it runs is measured in one more run under tracemalloc (which also sees
+numpy's arrays). Three groups:
+
+    data       getDFdata, getEKTdata, getMUSICdata, freefunction, ... on the checked-in data
+    synthetic  the same code paths on data from synthetic.py, scale times larger than the runs
+    figures    every figure of dfplots.py, drawn in draft mode (no LaTeX, no PDFs written)
+
+The results are written as JSON (by default to benchdir/<commit>.json), and
+compared with an earlier result file; any benchmark which got slower (or uses
+more memory) by more than the threshold is reported and the exit status is 1.
+
+    python bench.py run                          # everything
+    python bench.py run getDF freestream -r 10   # benchmarks whose names contain getDF or freestream
+    python bench.py run --baseline bench/abc123.json
+    python bench.py compare bench/abc123.json bench/def456.json --threshold 0.1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+
+from dfdata import topdir, cachename, memoclear
+
+
+# Where the result files go
+benchdir = os.path.join(topdir, 'bench')
+
+# Default relative slowdown which counts as a regression, and the times and
+# sizes below which differences are noise
+threshold = 0.25
+minseconds = 0.005
+minbytes = 2**20
+
+
+################################################################################
+# Every benchmark is  (name, setup)  where setup(scale, workdir) does the
+# untimed preparation and returns the function to time
+def databenchmarks():
+    """ The loaders and analytic references on the checked-in data """
+    import plot_test2
+    import plot_tests12
+    from dfdata import getDFfields
+    from catalog import runname, loadcatalog
+
+    name = runname(4*np.pi*0.18, 0.12, 0.48, 25.0)
+    return [
+        ('getDFdata', lambda scale, workdir: lambda: plot_test2.getDFdata(20, 'test1', 'Ttt')),
+        ('getDFfields', lambda scale, workdir: lambda: getDFfields(name, ['Ttt', 'Ttx', 'eps', 'ux'])),
+        ('getEKTdata', lambda scale, workdir: lambda: plot_test2.getEKTdata(20, 'test1', 'Ttt')),
+        ('getMUSICdata', lambda scale, workdir: lambda: plot_test2.getMUSICdata('0.18', 'test1', 'Ttt')),
+        ('freefunction', lambda scale, workdir: lambda: plot_tests12.freefunction(name, 50.0)),
+        ('loadcatalog', lambda scale, workdir: lambda: loadcatalog(rebuild=True)),
+        ('metricstable', lambda scale, workdir: metricsbench),
+    ]
+
+
+def metricsbench():
+    from metrics import metricstable, _plans
+    _plans.clear()
+    return metricstable()
+
+
+def syntheticrun(scale, workdir):
+    """ Writes (once) a synthetic run and EKT file with 257*scale times of 2049*scale points. Returns the run's name """
+    from synthetic import writesynthetic
+    nt, nx = 257*scale, 2049*scale
+    written = os.path.join(workdir, 'written.json')
+    if not os.path.exists(written):
+        files = writesynthetic(workdir, nx, nt, [0.18], ['test1'], [20], sources=['df', 'ekt'])
+        with open(written, 'w') as f:
+            json.dump(files, f)
+    with open(written) as f:
+        return json.load(f)[0]
+
+
+def parsetext(scale, workdir):
+    from dfdata import loadtxtcached
+    filename = syntheticrun(scale, workdir) + '_out/Ttt.txt'
+
+    def run():
+        # Remove the binary copy so that the text is parsed every time
+        for f in (cachename(filename), cachename(filename) + '.json'):
+            if os.path.exists(f):
+                os.remove(f)
+        return loadtxtcached(filename, ndmin=2)
+    return run
+
+
+def tailtext(scale, workdir):
+    from dfdata import tailrows
+    filename = syntheticrun(scale, workdir) + '_out/Ttt.txt'
+    return lambda: tailrows(filename, 1)
+
+
+def solutionslice(scale, workdir):
+    from solution import SolutionView
+    filename = syntheticrun(scale, workdir) + '.h5'
+
+    def run():
+        with SolutionView(filename) as view:
+            return view[-1, :, 'Ttt']
+    return run
+
+
+def ektblock(scale, workdir):
+    from dfdata import loadekt, cachename
+    syntheticrun(scale, workdir)
+    filename = os.path.join(workdir, 'new_EKT', 'test1_L20_gluon_Tmunu_vs_time.out')
+
+    def run():
+        # Without the cached layout the whole file is scanned once
+        layout = cachename(filename, '.layout.json')
+        if os.path.exists(layout):
+            os.remove(layout)
+        return loadekt(filename, -1)
+    return run
+
+
+def freestreambench(scale, workdir):
+    from freestream import freestream
+    x = np.linspace(-100, 100, 2049*scale)
+    Ttt0 = 0.12 + 0.48*np.exp(-x**2/25.0)
+    return lambda: freestream(x, Ttt0, 0*x, np.linspace(0, 50, 51))
+
+
+def idealbench(scale, workdir):
+    from idealhydro import solveideal
+    x = np.linspace(-100, 100, 513*scale)
+    Ttt0 = 0.06 + 9.6*np.exp(-x**2/25.0)
+    return lambda: solveideal(x, Ttt0, 0*x, 10.0)
+
+
+def syntheticbenchmarks():
+    """ The same code paths on generated data, scale times larger than the runs in the repository """
+    return [
+        ('synthetic/loadtxt', parsetext),
+        ('synthetic/tailrows', tailtext),
+        ('synthetic/solutionslice', solutionslice),
+        ('synthetic/loadekt', ektblock),
+        ('synthetic/freestream', freestreambench),
+        ('synthetic/solveideal', idealbench),
+    ]
+
+
+def figurebenchmarks():
+    """ Every figure of dfplots.py, drawn in draft mode """
+    import importlib
+    from dfplots import findjobs, jobname, applystyle
+    from render import setdraft
+
+    def setup(job):
+        def prepare(scale, workdir):
+            import matplotlib.pyplot as plt
+            module = importlib.import_module(job[0])
+            func = getattr(module, job[1])
+
+            def run():
+                applystyle(module)
+                try:
+                    func(**job[2])
+                finally:
+                    plt.close('all')
+            return run
+        return prepare
+
+    setdraft()
+    return [('figure/' + jobname(job), setup(job)) for job in findjobs()]
+
+
+################################################################################
+def measure(func, repeat=5):
+    """ Times func() repeat times from an empty memo, then measures its peak allocation. Returns a dictionary """
+    times = []
+    for i in range(repeat):
+        memoclear()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    memoclear()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'median': float(np.median(times)), 'first': times[0],
+            'repeat': repeat, 'peak_bytes': peak}
+
+
+def gitcommit():
+    """ Returns the short hash of HEAD, with -dirty if the tree has changes, or 'unknown' """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=topdir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=topdir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def runbenchmarks(patterns=(), repeat=5, scale=1, groups=('data', 'synthetic', 'figures'), verbose=True):
+    """ Runs the benchmarks whose names contain one of patterns. Returns the result dictionary """
+    benchmarks = []
+    if 'data' in groups:
+        benchmarks += databenchmarks()
+    if 'synthetic' in groups:
+        benchmarks += syntheticbenchmarks()
+    if 'figures' in groups:
+        benchmarks += figurebenchmarks()
+    if patterns:
+        benchmarks = [b for b in benchmarks if any(p in b[0] for p in patterns)]
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='dfbench')
+    try:
+        for name, setup in benchmarks:
+            try:
+                results[name] = measure(setup(scale, workdir), repeat)
+            except Exception as error:
+                results[name] = {'error': '{}: {}'.format(type(error).__name__, error)}
+            if verbose:
+                print(formatresult(name, results[name]), flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(cachename(os.path.join(workdir, 'x'))), ignore_errors=True)
+
+    return {'commit': gitcommit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scale': scale,
+            'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'results': results}
+
+
+def formatresult(name, result):
+    if 'error' in result:
+        return '{:50s}  FAILED {}'.format(name, result['error'])
+    return '{:50s} {:9.4f} s  (median {:.4f} s, first {:.4f} s)  peak {:8.1f} MB'.format(
+        name, result['seconds'], result['median'], result['first'], result['peak_bytes']/2**20)
+
+
+################################################################################
+def compare(old, new, threshold=threshold):
+    """ Compares two result dictionaries. Returns the list of  (name, what, old, new, ratio, regressed)  """
+    rows = []
+    for name, b in new['results'].items():
+        a = old['results'].get(name)
+        if a is None or 'error' in a or 'error' in b:
+            continue
+        for what, floor in (('seconds', minseconds), ('peak_bytes', minbytes)):
+            ratio = b[what]/a[what] if a[what] > 0 else np.inf
+            regressed = ratio > 1 + threshold and b[what] - a[what] > floor
+            rows.append((name, what, a[what], b[what], ratio, regressed))
+    return rows
+
+
+def reportcomparison(old, new, threshold=threshold):
+    """ Prints the comparison of two result dictionaries. Returns the number of regressions """
+    rows = compare(old, new, threshold)
+    print('{} -> {}  (threshold {:.0%})'.format(old['commit'], new['commit'], threshold))
+    if old.get('scale') != new.get('scale'):
+        print('the synthetic benchmarks were run at scale {} and {}'.format(old.get('scale'), new.get('scale')))
+    for name, what, a, b, ratio, regressed in rows:
+        if what == 'peak_bytes':
+            a, b = a/2**20, b/2**20
+        print('{:50s} {:10s} {:10.4g} -> {:10.4g}  x{:.2f}{}'.format(name, what, a, b, ratio,
+                                                                     '  REGRESSION' if regressed else ''))
+    for name in sorted(set(new['results']) - set(old['results'])):
+        print('{:50s} new'.format(name))
+    regressions = sum(row[-1] for row in rows)
+    print('{} regressions'.format(regressions))
+    return regressions
+
+
+def loadresult(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def runcommand(args):
+    groups = [g for g in ('data', 'synthetic', 'figures') if g not in args.skip]
+    result = runbenchmarks(args.patterns, args.repeat, args.scale, groups)
+    output = args.output or os.path.join(benchdir, result['commit'] + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=1)
+    print('wrote', output)
+    if args.baseline:
+        return 1 if reportcomparison(loadresult(args.baseline), result, args.threshold) else 0
+    return 0
+
+
+def comparecommand(args):
+    return 1 if reportcomparison(loadresult(args.old), loadresult(args.new), args.threshold) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the loaders, references and figures')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run.add_argument('patterns', nargs='*', help='only the benchmarks whose names contain one of these')
+    run.add_argument('-r', '--repeat', type=int, default=5, help='timed runs of every benchmark')
+    run.add_argument('-s', '--scale', type=int, default=1, help='size of the synthetic data')
+    run.add_argument('--skip', nargs='+', default=[], choices=['data', 'synthetic', 'figures'])
+    run.add_argument('-o', '--output', help='result file (default {}/<commit>.json)'.format(os.path.relpath(benchdir)))
+    run.add_argument('--baseline', help='result file to compare with')
+    run.add_argument('--threshold', type=float, default=threshold, help='relative slowdown reported (default %(default)s)')
+    run.set_defaults(func=runcommand)
+
+    comp = commands.add_parser('compare', help='compare two result files')
+    comp.add_argument('old')
+    comp.add_argument('new')
+    comp.add_argument('--threshold', type=float, default=threshold)
+    comp.set_defaults(func=comparecommand)
+
+    args = parser.parse_args(argv)
+    os.chdir(topdir)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+""" Catalog of all the runs in the repository.
+
+The runs are spread over several directories with different naming schemes
+
+    DFAndBDNK/nbys_<4pi eta/s>_d_<const>_A_<amplitude>_w_<width>.{json,h5} and _out/
+    figure12_data/nbys_..._w_<width>.json and _out/
+    music_data/shear_relax_<factor>/<testcase>/<eta/s>_tfinal_<time>.dat
+    <testcase>_eta<eta/s>.h5
+
+Rather than rebuilding file names from str(float), the directories are scanned
+once and every run is described by a dictionary holding its parameters (from the
+file name, the .json sidecar and the HDF5 attributes) and its location. The list
+is saved in cachedir and rescanned only when a run is added or removed, or one
+of the .json and .h5 files read changes.
+
+Runs are found with findruns(testcase=..., fourpietabys=..., const=..., ...).  A
+number matches within a relative tolerance and a tuple (lo, hi) matches a range.
+"""
+import os
+import re
+import glob
+import json
+import numpy as np
+
+from dfdata import topdir, cachedir, normalize, stamp
+
+
+# Initial conditions of the kinetic theory comparisons. These are the same as testcases in plot_test2.py
+testparams = {'test1': {'const': 0.12, 'amplitude': 0.48, 'width': 25.0},
+              'test2': {'const': 0.06, 'amplitude': 9.6, 'width': 25.0}}
+
+# Fields of an entry which make up its key
+keyfields = ['testcase', 'fourpietabys', 'const', 'amplitude', 'width', 'source']
+
+# Directories with density frame / BDNK runs named nbys_..._w_...
+dfdirs = ['DFAndBDNK', 'figure12_data']
+
+catalogfile = os.path.join(cachedir, 'catalog.json')
+
+dfpattern = re.compile(r'nbys_(?P<fourpietabys>[0-9d-]+)_d_(?P<const>[0-9d-]+)_A_(?P<amplitude>[0-9d-]+)_w_(?P<width>[0-9d-]+)$')
+musicpattern = re.compile(r'(?P<etabys>[0-9.]+)_tfinal_(?P<tfinal>[0-9.]+)\.dat$')
+etapattern = re.compile(r'(?P<testcase>test[0-9]+)_eta(?P<etabys>[0-9.]+)\.h5$')
+
+
+################################################################################
+def runkey(entry):
+    """ Returns the hashable key of a run  (testcase, fourpietabys, const, amplitude, width, source) """
+    return tuple(normalize(entry[k]) for k in keyfields)
+
+
+def testcaseof(const, amplitude, width):
+    """ Returns 'test1' or 'test2' if the initial conditions are one of the kinetic theory tests, otherwise None """
+    for testcase, p in testparams.items():
+        if np.allclose([const, amplitude, width], [p['const'], p['amplitude'], p['width']]):
+            return testcase
+    return None
+
+
+def h5attrs(filename):
+    """ Returns the attributes of an HDF5 run as plain python numbers and strings """
+    import h5py as h5
+    with h5.File(filename, 'r') as file:
+        return {k: (v.item() if hasattr(v, 'item') else v) for k, v in file.attrs.items()}
+
+
+################################################################################
+def scandf(directory):
+    """ Returns the entries for the nbys_... runs in directory """
+    entries = []
+    bases = set(os.path.splitext(f)[0] for f in glob.glob(os.path.join(topdir, directory, 'nbys_*'))
+                if f.endswith(('.json', '.h5', '_out')))
+    for base in sorted(bases):
+        base = base[:-4] if base.endswith('_out') else base
+        match = dfpattern.match(os.path.basename(base))
+        if match is None:
+            continue
+        p = {k: float(v.replace('d', '.')) for k, v in match.groupdict().items()}
+        entry = dict(p, source=directory, testcase=testcaseof(p['const'], p['amplitude'], p['width']),
+                     name=os.path.relpath(base, topdir),
+                     h5=os.path.exists(base + '.h5'), out=os.path.isdir(base + '_out'))
+        if os.path.exists(base + '.json'):
+            with open(base + '.json') as f:
+                entry.update({k: v for k, v in json.load(f).items() if k not in entry})
+        if entry['h5']:
+            entry.update({k: v for k, v in h5attrs(base + '.h5').items() if k not in entry})
+        entries.append(entry)
+    return entries
+
+
+def scanmusic():
+    """ Returns the entries for the MUSIC .dat files """
+    entries = []
+    for filename in sorted(glob.glob(os.path.join(topdir, 'music_data', 'shear_relax_*', 'test*', '*_tfinal_*.dat'))):
+        match = musicpattern.match(os.path.basename(filename))
+        if match is None:
+            continue
+        testcase = os.path.basename(os.path.dirname(filename))
+        factor = os.path.basename(os.path.dirname(os.path.dirname(filename)))[len('shear_relax_'):]
+        etabys = float(match['etabys'])
+        entry = dict(testparams.get(testcase, {'const': None, 'amplitude': None, 'width': None}),
+                     testcase=testcase, fourpietabys=4*np.pi*etabys, eta_over_s=etabys,
+                     source='music_{}'.format(factor), shear_relax_factor=factor,
+                     visMUSIC=match['etabys'], final_time=float(match['tfinal']),
+                     name=os.path.relpath(filename, topdir))
+        entries.append(entry)
+    return entries
+
+
+def scaneta():
+    """ Returns the entries for the <testcase>_eta<eta/s>.h5 runs in the top directory """
+    entries = []
+    for filename in sorted(glob.glob(os.path.join(topdir, 'test*_eta*.h5'))):
+        match = etapattern.match(os.path.basename(filename))
+        if match is None:
+            continue
+        testcase = match['testcase']
+        attrs = h5attrs(filename)
+        entry = dict(testparams.get(testcase, {'const': None, 'amplitude': None, 'width': None}),
+                     testcase=testcase, fourpietabys=4*np.pi*attrs['eta_over_s'], source='eta_h5',
+                     name=os.path.relpath(filename, topdir), h5=True)
+        entry.update({k: v for k, v in attrs.items() if k not in entry})
+        entries.append(entry)
+    return entries
+
+
+def scannedfiles():
+    """ Returns the files (and _out directories) of the runs the scan finds, matched like the scan matches them """
+    files = [f for d in dfdirs for f in glob.glob(os.path.join(topdir, d, 'nbys_*'))
+             if f.endswith(('.json', '.h5', '_out')) and dfpattern.match(re.sub(r'(\.json|\.h5|_out)$', '', os.path.basename(f)))]
+    files += [f for f in glob.glob(os.path.join(topdir, 'music_data', 'shear_relax_*', 'test*', '*_tfinal_*.dat'))
+              if musicpattern.match(os.path.basename(f))]
+    files += [f for f in glob.glob(os.path.join(topdir, 'test*_eta*.h5')) if etapattern.match(os.path.basename(f))]
+    return sorted(files)
+
+
+def scanstamps():
+    """ The files of the runs, with the stamps of the .json and .h5 the scan reads.
+    Adding or removing a run, editing a .json or rewriting an .h5 changes them; other files do not
+    """
+    return {os.path.relpath(f, topdir): stamp(f) if f.endswith(('.json', '.h5')) else None for f in scannedfiles()}
+
+
+def buildcatalog():
+    """ Scans all the data directories and returns the list of entries """
+    entries = []
+    for directory in dfdirs:
+        entries += scandf(directory)
+    entries += scanmusic()
+    entries += scaneta()
+    return entries
+
+
+################################################################################
+_catalog = None
+
+
+def loadcatalog(rebuild=False):
+    """ Returns the catalog as a dictionary  runkey -> entry.
+
+    The scan is saved to catalogfile and reused as long as no run was added or
+    removed, and none of the .json and .h5 files read by the scan have changed.
+    Within a process the catalog is only loaded once.
+    """
+    global _catalog
+    if _catalog is not None and not rebuild:
+        return _catalog
+
+    stamps = scanstamps()
+    entries = None
+    if not rebuild:
+        try:
+            with open(catalogfile) as f:
+                saved = json.load(f)
+            if saved['stamps'] == stamps:
+                entries = saved['entries']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    if entries is None:
+        entries = buildcatalog()
+        os.makedirs(cachedir, exist_ok=True)
+        tmp = '{}.{}.tmp'.format(catalogfile, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({'stamps': stamps, 'entries': entries}, f, indent=1)
+        os.replace(tmp, catalogfile)
+
+    _catalog = {runkey(entry): entry for entry in entries}
+    return _catalog
+
+
+def matches(value, wanted, rtol):
+    """ Compares one field of an entry to a query value, a (lo, hi) range or a list of allowed values """
+    if isinstance(wanted, tuple):
+        lo, hi = wanted
+        return value is not None and (lo is None or value >= lo) and (hi is None or value <= hi)
+    if isinstance(wanted, list):
+        return any(matches(value, w, rtol) for w in wanted)
+    if isinstance(wanted, str) or wanted is None or value is None:
+        return value == wanted
+    return bool(np.isclose(value, wanted, rtol=rtol, atol=1e-12))
+
+
+def findruns(rtol=1e-6, **query):
+    """ Returns the list of entries which match the query, sorted by fourpietabys.
+
+    Every keyword is a field of the entry (testcase, fourpietabys, const,
+    amplitude, width, source, NX, final_time, ...). A number matches within the
+    relative tolerance rtol, a tuple (lo, hi) is an inclusive range where either
+    end can be None, and a list matches any of its elements.
+    """
+    found = [entry for entry in loadcatalog().values()
+             if all(k in entry and matches(entry[k], v, rtol) for k, v in query.items())]
+    return sorted(found, key=lambda e: (e['source'], str(e['testcase']), e['fourpietabys']))
+
+
+def findrun(fourpietabys, const, amplitude, width, source='DFAndBDNK', testcase=None, rtol=1e-6):
+    """ Returns the single entry with the given parameters.
+
+    The exact key is looked up first. If that misses the catalog is searched
+    with the tolerance rtol. A KeyError is raised if no run or several runs match.
+    """
+    if testcase is None:
+        testcase = testcaseof(const, amplitude, width)
+    catalog = loadcatalog()
+    key = runkey({'testcase': testcase, 'fourpietabys': fourpietabys, 'const': const,
+                  'amplitude': amplitude, 'width': width, 'source': source})
+    if key in catalog:
+        return catalog[key]
+
+    found = findruns(rtol=rtol, fourpietabys=fourpietabys, const=const, amplitude=amplitude,
+                     width=width, source=source)
+    if len(found) != 1:
+        raise KeyError('{} runs in the catalog match {}'.format(len(found), key))
+    return found[0]
+
+
+def runname(fourpietabys, const, amplitude, width, source='DFAndBDNK'):
+    """ Returns the file name (without extension) of a density frame / BDNK run. This replaces getnames """
+    return os.path.join(topdir, findrun(fourpietabys, const, amplitude, width, source=source)['name'])
+
+
+def entryof(name):
+    """ Returns the entry of the run stored under name (with or without extension, absolute or relative) """
+    rel = os.path.relpath(os.path.abspath(name), topdir)
+    for entry in loadcatalog().values():
+        if entry['name'] == rel or os.path.splitext(entry['name'])[0] == rel:
+            return entry
+    raise KeyError('{} is not in the catalog'.format(name))
+
+
+def idealname(entry):
+    """ Returns the file name (without extension) the eta/s=0 run with the same initial conditions as entry would have """
+    directory, base = os.path.split(os.path.join(topdir, entry['name']))
+    if entry['source'] == 'eta_h5':
+        return os.path.join(directory, re.sub(r'_eta[0-9.]+\.h5$', '_eta0', base))
+    return os.path.join(directory, re.sub(r'^nbys_[0-9d-]+_', 'nbys_0d0_', base))
+
+
+def idealof(entry):
+    """ Returns the eta/s=0 run with the same initial conditions and source as entry """
+    return findrun(0.0, entry['const'], entry['amplitude'], entry['width'], source=entry['source'],
+                   testcase=entry['testcase'])
@@ -0,0 +1,95 @@
+""" Shape preserving decimation of dense curves.
+
+A curve of N points drawn into a plot W pixels (or points, for a PDF) wide
+cannot show more than a few points per pixel column, so the output only needs
+O(W) of them. Two methods are provided, both working in display coordinates:
+
+    minmax   keeps in every pixel column the first, last, lowest and highest
+             point. The drawn envelope is exactly that of the full curve, so
+             peaks and shock fronts are kept to the pixel.
+    lttb     largest triangle three buckets: keeps one point per bucket, the one
+             spanning the largest triangle with its neighbours. Fewer points and
+             smoother, but a peak narrower than a bucket can be lowered.
+
+Points to the left or right of the axes are gathered into one column on each
+side, so the number of points kept is bounded by the width of the axes and not
+by the range of the data. render.py applies this to every line with more points
+than the axes are wide when it is drawn (DFPLOTS_DECIMATE), and can rasterize
+lines which still have many points (DFPLOTS_RASTERIZE).
+"""
+import numpy as np
+
+
+################################################################################
+def pixelcolumns(px, left, right, scale=2.0):
+    """ Returns the column of every display x coordinate, scale columns per display unit.
+    Everything left of left (right of right) is in one column
+    """
+    first, last = np.floor(left*scale), np.floor(right*scale)
+    return np.clip(np.floor(px*scale), first - 1, last + 1).astype(np.int64)
+
+
+def extreme(values, starts, segment, ufunc):
+    """ Returns the index of the first smallest (np.minimum) or largest (np.maximum) value of every segment """
+    best = ufunc.reduceat(values, starts)
+    hits = np.flatnonzero(values == best[segment])
+    first = np.r_[True, segment[hits[1:]] != segment[hits[:-1]]]
+    return hits[first]
+
+
+def minmax(px, py, left=-np.inf, right=np.inf, scale=2.0):
+    """ Returns the sorted indices of the points to keep: the first, last, lowest and highest of every column.
+
+    px must not decrease (the x of a grid), and points where py is nan are
+    kept, so that gaps in the curve stay gaps.
+    """
+    n = len(px)
+    if n < 3:
+        return np.arange(n)
+    columns = pixelcolumns(px, left, right, scale) if np.isfinite(left) else np.floor(px*scale).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+
+    finite = np.isfinite(py)
+    lowest = extreme(np.where(finite, py, np.inf), starts, segment, np.minimum)
+    highest = extreme(np.where(finite, py, -np.inf), starts, segment, np.maximum)
+
+    keep = np.concatenate([starts, ends, lowest, highest, np.flatnonzero(~finite)])
+    return np.unique(keep)
+
+
+def lttb(px, py, nout):
+    """ Returns the sorted indices of nout points chosen by largest triangle three buckets """
+    n = len(px)
+    if nout >= n or nout < 3:
+        return np.arange(n)
+    # Buckets of the points between the first and the last, which are always kept
+    edges = np.linspace(1, n - 1, nout - 1).astype(np.int64)
+    keep = np.empty(nout, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(nout - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # The average of the next bucket is the third corner
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = px[nlo:max(nhi, nlo + 1)].mean(), py[nlo:max(nhi, nlo + 1)].mean()
+        area = abs((px[a] - cx)*(py[lo:hi] - py[a]) - (px[a] - px[lo:hi])*(cy - py[a]))
+        a = lo + int(np.nanargmax(area)) if np.any(np.isfinite(area)) else lo
+        keep[i + 1] = a
+    return keep
+
+
+def decimate(px, py, left, right, method='minmax', scale=2.0):
+    """ Returns the indices of the points of a curve in display coordinates to draw in the columns from left to right """
+    if method == 'lttb':
+        inside = np.flatnonzero((px >= left) & (px <= right))
+        if len(inside) == 0:
+            return minmax(px, py, left, right, scale)
+        # The view plus one point on each side, so that the curve still enters and leaves it
+        lo, hi = max(inside[0] - 1, 0), min(inside[-1] + 1, len(px) - 1)
+        nout = int(2*scale*(right - left)) + 2
+        return np.unique(np.r_[minmax(px[:lo + 1], py[:lo + 1], left, right, scale),
+                               lo + lttb(px[lo:hi + 1], py[lo:hi + 1], nout),
+                               hi + minmax(px[hi:], py[hi:], left, right, scale)])
+    return minmax(px, py, left, right, scale)
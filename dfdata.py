@@ -0,0 +1,586 @@
+""" Shared readers for the solver output used by the plotting scripts.
+
+The density frame / BDNK solver writes the history of every field as an ASCII
+file  <name>_out/<tag>.txt  with one row per printed time step.  Parsing these
+with np.loadtxt dominates the cost of building a figure, so the first time a
+file is read it is converted to a .npy file in cachedir.  Later reads memory
+map the .npy file and parse no text at all.
+
+This module and catalog.py are the data-only part of the repository. They
+never import matplotlib and import h5py only when an HDF5 file is read, so
+scripts can use the loaders without paying for the plotting stack.
+"""
+import os
+import json
+import inspect
+import warnings
+import functools
+import threading
+import contextlib
+import collections
+import numpy as np
+
+
+# Fields written by the solver into every <name>_out directory
+outtags = ['Ttt', 'Ttx', 'eps', 'ux', 'VISC', 'xi', 'xiD', 'uxD', 't', 'x']
+
+# Top of the repository. Paths inside the repository are mirrored relative to this
+topdir = os.path.dirname(os.path.abspath(__file__))
+
+# Directory holding the binary copies of the text files. Can be moved with DFPLOTS_CACHE
+cachedir = os.environ.get('DFPLOTS_CACHE', os.path.join(topdir, '.dfcache'))
+
+
+################################################################################
+# Files read by the loaders. Every set on the stack collects the files read while
+# it is there, which is how dfplots.py finds the data files a figure depends on.
+_touched = []
+
+# The missing EKT files whose RTA stand-in was read (see ektfile). render.py
+# empties it before every figure, and saves the figures drawn from a stand-in
+# under another name.
+standins = set()
+
+
+def touch(filename):
+    """ Records that filename was read """
+    path = os.path.abspath(filename)
+    for files in _touched:
+        files.add(path)
+    # ektfile touches the EKT file it stood in for, and memoized loaders touch it again on every hit
+    if os.path.dirname(path) == ektdir and not os.path.exists(path):
+        standins.add(path)
+
+
+@contextlib.contextmanager
+def touchedfiles():
+    """ Context manager which yields the set of the files read inside the with block """
+    files = set()
+    _touched.append(files)
+    try:
+        yield files
+    finally:
+        # Sets compare by value, so remove this one by identity
+        del _touched[next(i for i, s in enumerate(_touched) if s is files)]
+
+
+################################################################################
+def normalize(value):
+    """ Rounds floats to 10 significant digits so that 0, 0.0 and 4*pi*0.18 computed different ways compare equal """
+    if isinstance(value, (float, int, np.floating, np.integer)) and not isinstance(value, bool):
+        return float('{:.10g}'.format(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return normalize(value.tolist())
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    return value
+
+
+def cachename(filename, suffix='.npy'):
+    """ Returns the path in cachedir which mirrors filename, with the extension replaced by suffix """
+    path = os.path.abspath(filename)
+    rel = os.path.relpath(path, topdir)
+    if rel.startswith(os.pardir):
+        rel = path.lstrip(os.sep)
+    return os.path.join(cachedir, os.path.splitext(rel)[0] + suffix)
+
+
+def stamp(filename):
+    """ Returns the (mtime, size) of filename which is used to decide if a cache entry is stale """
+    st = os.stat(filename)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def isfresh(filename, cachefile):
+    """ True if cachefile exists and was made from the current version of filename """
+    try:
+        with open(cachefile + '.json') as f:
+            return json.load(f) == stamp(filename)
+    except (OSError, ValueError):
+        return False
+
+
+def savecache(array, cachefile, source):
+    """ Writes array to cachefile together with the stamp of source.
+
+    Both files are written to a temporary name and then moved into place, so
+    that several processes building figures at once never see a partial file.
+    """
+    os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(cachefile, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, cachefile)
+    with open(tmp, 'w') as f:
+        json.dump(stamp(source), f)
+    os.replace(tmp, cachefile + '.json')
+
+
+################################################################################
+def loadtxtcached(filename, **kwargs):
+    """ Drop in replacement for np.loadtxt(filename, **kwargs) backed by cachedir.
+
+    The text file is parsed once and stored as .npy. If the modification time or
+    the size of the text file changes the entry is rebuilt. The returned array is
+    a read only memory map.
+    """
+    touch(filename)
+    cachefile = cachename(filename)
+    awaitcache(cachefile)
+    if not isfresh(filename, cachefile):
+        savecache(np.loadtxt(filename, **kwargs), cachefile, filename)
+    return np.load(cachefile, mmap_mode='r')
+
+
+# Caches being built in the background by cacheinbackground, by cache file
+_pending = {}
+_pendinglock = threading.Lock()
+
+# loadoutslice converts the history it read a row of in the background. Off
+# unless DFPLOTS_SLICECACHE=1: otherwise the next full read (loadout) converts it
+slicecache = os.environ.get('DFPLOTS_SLICECACHE', '') not in ('', '0')
+
+
+def cacheinbackground(filename, **kwargs):
+    """ Converts filename to its binary cache in a background thread, unless that is already under way.
+
+    The thread is a daemon, so a process which exits does not wait for it (the
+    conversion is then done by a later read). loadtxtcached waits for it.
+    """
+    cachefile = cachename(filename)
+
+    def build():
+        try:
+            savecache(np.loadtxt(filename, **kwargs), cachefile, filename)
+        except (OSError, ValueError):
+            # The file is parsed again, and the error raised, by the next full read
+            pass
+        finally:
+            with _pendinglock:
+                if _pending.get(cachefile) is threading.current_thread():
+                    del _pending[cachefile]
+
+    with _pendinglock:
+        thread = _pending.get(cachefile)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=build, name='cache ' + os.path.basename(filename), daemon=True)
+            _pending[cachefile] = thread
+            thread.start()
+        return thread
+
+
+def awaitcache(cachefile):
+    """ Waits for the background build of cachefile, if there is one """
+    with _pendinglock:
+        thread = _pending.get(cachefile)
+    if thread is not None:
+        thread.join()
+
+
+def loadout(name, tag):
+    """ Returns the history of tag from the directory name_out.
+
+    For tag='x' or tag='t' this is the 1D grid or time axis. For the fields
+    ('Ttt', 'Ttx', 'eps', 'ux', 'VISC', 'xi', 'xiD', 'uxD') it is an array of shape
+    (ntimes, NX).
+    """
+    filename = name + '_out/{}.txt'.format(tag)
+    if tag in ('x', 't'):
+        return loadtxtcached(filename)
+    return loadtxtcached(filename, ndmin=2)
+
+
+def cacheout(name):
+    """ Converts every text file in name_out into its binary form. Returns the list of tags converted """
+    tags = [tag for tag in outtags if os.path.exists(name + '_out/{}.txt'.format(tag))]
+    for tag in tags:
+        loadout(name, tag)
+    return tags
+
+
+################################################################################
+def tailrows(filename, nrows=1, blocksize=1 << 16):
+    """ Returns the last nrows rows of the text file filename as a 2D array.
+
+    The file is read backwards from the end in blocks of blocksize bytes until
+    enough lines have been seen, so the cost is independent of the number of
+    rows in the file.
+    """
+    touch(filename)
+    with open(filename, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        tail = b''
+        # One more newline than rows is needed, unless we reach the start of the file
+        while pos > 0 and tail.rstrip(b'\n').count(b'\n') < nrows:
+            step = min(blocksize, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+
+    lines = tail.rstrip(b'\n').split(b'\n')[-nrows:] if tail.strip() else []
+    if len(lines) < nrows:
+        raise IndexError('{} has fewer than {} rows'.format(filename, nrows))
+    return np.loadtxt([line.decode() for line in lines], ndmin=2)
+
+
+def headrow(filename, index):
+    """ Returns row index (counting from zero) of the text file filename, reading only the lines before it """
+    touch(filename)
+    with open(filename) as f:
+        for i, line in enumerate(f):
+            if i == index:
+                return np.array(line.split(), dtype=float)
+    raise IndexError('{} has fewer than {} rows'.format(filename, index + 1))
+
+
+def loadoutslice(name, tag, time_index=-1):
+    """ Returns the row time_index of the history of tag from the directory name_out.
+
+    If the binary cache of the file is up to date it is used. Otherwise only the
+    needed lines are parsed: negative indices are read from the end of the file
+    with tailrows, and positive indices by reading up to the requested row. An
+    index out of range raises IndexError like the full read. With slicecache
+    the binary cache is then built in the background, so that later reads memory
+    map it instead of parsing text again.
+    """
+    filename = name + '_out/{}.txt'.format(tag)
+    cachefile = cachename(filename)
+    if isfresh(filename, cachefile):
+        return loadout(name, tag)[time_index]
+    if time_index < 0:
+        row = tailrows(filename, -time_index)[0]
+    else:
+        row = headrow(filename, time_index)
+    if slicecache:
+        cacheinbackground(filename, **({} if tag in ('x', 't') else {'ndmin': 2}))
+    return row
+
+
+################################################################################
+# The kinetic theory output  <test>_L<lambda>_gluon_Tmunu_vs_time.out  stores one
+# block of Nz rows for every printed time. Column 0 is the time and column 18 is z.
+ekt_tcol = 0
+ekt_zcol = 18
+
+
+# Directory of the EKT output, which is not part of the repository
+ektdir = os.path.join(topdir, 'new_EKT')
+
+
+def ektfile(testcase, lambdaekt):
+    """ Returns the EKT file of a test case and lambda.
+
+    If it is not in ektdir, the relaxation time approximation stand-in of rta.py
+    is returned instead (and solved first if needed), with a warning. The
+    missing EKT file is touched, so dfplots.py redraws the figure if it appears,
+    and it is added to standins, so the figure labels the curves with ektlabel.
+    """
+    filename = os.path.join(ektdir, '{}_L{:d}_gluon_Tmunu_vs_time.out'.format(testcase, lambdaekt))
+    if os.path.exists(filename):
+        return filename
+    from rta import rtafile
+    warnings.warn('{} is missing, the RTA stand-in is used instead'.format(os.path.relpath(filename, topdir)),
+                  stacklevel=2)
+    touch(filename)
+    return rtafile(testcase, lambdaekt)
+
+
+def ektlabel(label='QCD kinetics', rtalabel='RTA kinetics'):
+    """ Returns the legend label of the kinetic theory curves: rtalabel if a stand-in was read for this figure """
+    return rtalabel if standins else label
+
+
+def ektrows(f):
+    """ Yields (offset, line) for the data lines of the open binary file f, skipping blanks and comments """
+    offset = f.tell()
+    for line in f:
+        stripped = line.strip()
+        if stripped and not stripped.startswith(b'#'):
+            yield offset, line
+        offset += len(line)
+
+
+def scanekt(filename):
+    """ Works out the block structure of an EKT file with one pass over its lines.
+
+    Nz is the periodicity of column 18 (the first row whose z equals the z of
+    the first row starts the second block). Only the first field of each block is
+    converted to a float. Returns a dictionary with Nz, the number of columns,
+    the time of each block and the byte offset at which each block starts.
+    """
+    times = []
+    offsets = []
+    with open(filename, 'rb') as f:
+        rows = ektrows(f)
+        offset, line = next(rows)
+        first = line.split()
+        z0 = float(first[ekt_zcol])
+        offsets.append(offset)
+        times.append(float(first[ekt_tcol]))
+
+        nz = None
+        nrows = 1
+        for offset, line in rows:
+            if nz is None:
+                cols = line.split()
+                if float(cols[ekt_zcol]) != z0:
+                    nrows += 1
+                    continue
+                nz = nrows
+            if nrows % nz == 0:
+                offsets.append(offset)
+                times.append(float(line.split(None, ekt_tcol + 1)[ekt_tcol]))
+            nrows += 1
+
+    if nz is None:
+        nz = nrows
+    if nrows % nz != 0:
+        raise ValueError('{} has {} rows which is not a multiple of Nz={}'.format(filename, nrows, nz))
+
+    return {'Nz': nz, 'ncols': len(first), 'times': times, 'offsets': offsets}
+
+
+def ektlayout(filename):
+    """ Returns the block structure of an EKT file (see scanekt), cached in cachedir next to the .npy files """
+    cachefile = cachename(filename, '.layout.json')
+    try:
+        with open(cachefile) as f:
+            layout = json.load(f)
+        if layout['stamp'] == stamp(filename):
+            return layout
+    except (OSError, ValueError, KeyError):
+        pass
+
+    layout = scanekt(filename)
+    layout['stamp'] = stamp(filename)
+    os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(cachefile, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(layout, f)
+    os.replace(tmp, cachefile)
+    return layout
+
+
+def loadekt(filename, blocks=-1):
+    """ Returns z[:] and the requested time block(s) of an EKT file.
+
+    blocks is an index (negative values count from the last time) or a list of
+    indices. For a single index the data has shape (Nz, ncols), for a list it is
+    (len(blocks), Nz, ncols). Each block is read by seeking to its offset, so only
+    the requested rows of the file are parsed.
+    """
+    touch(filename)
+    layout = ektlayout(filename)
+    nz = layout['Nz']
+    nblocks = len(layout['offsets'])
+
+    single = np.ndim(blocks) == 0
+    wanted = np.atleast_1d(blocks)
+    if np.any(wanted >= nblocks) or np.any(wanted < -nblocks):
+        raise IndexError('block index out of range for {} with {} blocks'.format(filename, nblocks))
+
+    data = np.empty((len(wanted), nz, layout['ncols']))
+    with open(filename, 'rb') as f:
+        for i, b in enumerate(wanted % nblocks):
+            f.seek(layout['offsets'][b])
+            lines = []
+            for offset, line in ektrows(f):
+                lines.append(line.decode())
+                if len(lines) == nz:
+                    break
+            data[i] = np.loadtxt(lines, ndmin=2)
+
+    z = data[0, :, ekt_zcol].copy()
+    if single:
+        return z, data[0]
+    return z, data
+
+
+################################################################################
+# Columns of finaldata and solution in the HDF5 output of the solver
+h5variables = {'Ttt': 0, 'Ttx': 1, 'eps': 2, 'ux': 3}
+
+
+
+################################################################################
+# In process memoization of the loaders. A figure build asks for the same runs
+# many times, so results are kept in a least recently used cache whose total
+# size is limited to memobudget bytes (DFPLOTS_MEMO_BYTES, default 512 MB).
+memobudget = int(os.environ.get('DFPLOTS_MEMO_BYTES', 512 * 2**20))
+memostats = collections.defaultdict(lambda: {'hits': 0, 'misses': 0, 'evictions': 0})
+_memo = collections.OrderedDict()
+_memobytes = 0
+
+
+def nbytesof(value):
+    """ Returns the number of bytes of the arrays held in value (arrays, tuples, lists and dicts) """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytesof(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytesof(v) for v in value.values())
+    return 0
+
+
+def freeze(value):
+    """ Makes the arrays in value read only, so a caller modifying a memoized result fails instead of corrupting it """
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            freeze(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            freeze(v)
+    return value
+
+
+def memoize(func):
+    """ Decorator which memoizes a loader in the shared LRU cache.
+
+    The key is the function name and its arguments after the defaults are
+    filled in and the numbers are normalized, so getDFdata(20) and
+    getDFdata(20, testcase='test1') share an entry. The files read by the
+    loader are stored with the result and touched again on every hit.
+    """
+    signature = inspect.signature(func)
+    fname = '{}.{}'.format(func.__module__, func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _memobytes
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (fname,) + tuple((k, normalize(v)) for k, v in bound.arguments.items())
+        stats = memostats[fname]
+        if key in _memo:
+            stats['hits'] += 1
+            _memo.move_to_end(key)
+            value, nbytes, files = _memo[key]
+            for filename in files:
+                touch(filename)
+            return value
+
+        stats['misses'] += 1
+        with touchedfiles() as files:
+            value = freeze(func(*args, **kwargs))
+        for filename in files:
+            touch(filename)
+        nbytes = nbytesof(value)
+        if nbytes <= memobudget:
+            _memo[key] = (value, nbytes, files)
+            _memobytes += nbytes
+            while _memobytes > memobudget:
+                oldkey, (old, oldbytes, oldfiles) = _memo.popitem(last=False)
+                _memobytes -= oldbytes
+                memostats[oldkey[0]]['evictions'] += 1
+        return value
+
+    return wrapper
+
+
+def memoclear():
+    """ Empties the memoization cache and resets the counters """
+    global _memobytes
+    _memo.clear()
+    memostats.clear()
+    _memobytes = 0
+
+
+def setmemobudget(nbytes):
+    """ Changes the size limit of the memoization cache, evicting entries if needed """
+    global memobudget, _memobytes
+    memobudget = nbytes
+    while _memobytes > memobudget and _memo:
+        oldkey, (old, oldbytes, oldfiles) = _memo.popitem(last=False)
+        _memobytes -= oldbytes
+        memostats[oldkey[0]]['evictions'] += 1
+
+
+def memoreport():
+    """ Returns a table of the hits, misses and evictions of every memoized loader """
+    lines = ['{:<40s} {:>6s} {:>6s} {:>6s}'.format('loader', 'hits', 'misses', 'evict')]
+    for fname, stats in sorted(memostats.items()):
+        lines.append('{:<40s} {:>6d} {:>6d} {:>6d}'.format(fname, stats['hits'], stats['misses'], stats['evictions']))
+    lines.append('{} entries, {:.1f} MB of {:.1f} MB'.format(len(_memo), _memobytes / 2**20, memobudget / 2**20))
+    return '\n'.join(lines)
+
+
+@memoize
+def readcolumns(filename, dataset, tags):
+    """ Returns {tag: column} for the requested columns of a 2D dataset, read with a single hyperslab.
+
+    The result is memoized, so the ideal run shared by the runs of a figure is read once.
+    """
+    cols = [h5variables[tag] for tag in tags]
+    lo, hi = min(cols), max(cols)
+    import h5py as h5
+    touch(filename)
+    with h5.File(filename, 'r') as file:
+        block = file[dataset][:, lo:hi + 1]
+    return {tag: block[:, col - lo] for tag, col in zip(tags, cols)}
+
+
+@memoize
+def getDFfields(run, tags=('Ttt', 'Ttx', 'eps', 'ux'), time_index=-1):
+    """ Returns several fields of a density frame / BDNK run in one pass. The output is
+
+    x[:], DF, BDNK, ideal, info
+
+    where DF, BDNK and ideal are dictionaries  tag -> array. run is a catalog entry
+    or the file name of the run. The run's .h5 and the ideal (eta/s=0) .h5 are each
+    opened once and all the tags are read from finaldata in one hyperslab. If
+    there is no ideal run, ideal hydro is solved by idealhydro.py instead. BDNK
+    is the row time_index of name_out/<tag>.txt, and for any other time_index
+    than -1 DF and ideal are the same row of solution (see solution.py), or
+    ideal hydro is solved to the time of that row. A ValueError is raised if the
+    row of the ideal run is at another time. The .json and x grid are read once
+    and shared.
+    """
+    from catalog import entryof, idealof, idealname
+
+    entry = run if isinstance(run, dict) else entryof(run)
+    name = os.path.join(topdir, entry['name'])
+    tags = list(tags)
+
+    touch(name + '.json')
+    with open(name + '.json') as f:
+        info = json.load(f)
+
+    time = None
+    if time_index == -1:
+        df = readcolumns(name + '.h5', 'finaldata', tags)
+    else:
+        from solution import SolutionView
+        with SolutionView(entry) as view:
+            block = view[time_index, :, tags]
+            time = float(view.times[time_index])
+        df = {tag: block[:, i] for i, tag in enumerate(tags)}
+    try:
+        entry0 = idealof(entry)
+    except KeyError:
+        entry0 = None
+    if entry0 is not None and entry0.get('h5') and time is None:
+        ideal = readcolumns(os.path.join(topdir, entry0['name']) + '.h5', 'finaldata', tags)
+    elif entry0 is not None and entry0.get('h5'):
+        from solution import SolutionView
+        with SolutionView(entry0) as view:
+            if not np.isclose(view.times[time_index], time):
+                raise ValueError('row {} of {} is at t={:g}, not t={:g} as in {}'.format(
+                    time_index, entry0['name'], view.times[time_index], time, entry['name']))
+            block = view[time_index, :, tags]
+        ideal = {tag: block[:, i] for i, tag in enumerate(tags)}
+    else:
+        # No eta/s=0 run with these initial conditions, so solve ideal hydro here.
+        # Touching the missing file makes dfplots.py redraw the figure if it appears
+        from idealhydro import idealfields
+        touch(idealname(entry) + '.h5')
+        ideal = idealfields(entry, tags, time)
+    bdnk = {tag: loadoutslice(name, tag, time_index) for tag in tags}
+    x = loadout(name, 'x')
+
+    return x, df, bdnk, ideal, info
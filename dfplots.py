@@ -0,0 +1,388 @@
+""" Builds the figures of the paper.
+
+Every figure file (plotfig1.py, plot_tests12.py, plot_test2.py,
+make_paper_plot_test*.py) has a list called figures with the figure functions
+it makes and their arguments. This script collects them and draws them on a
+pool of processes
+
+    dfplots build                  # every figure, one after another
+    dfplots build -j 8             # every figure on 8 processes
+    dfplots build KTPlot1 --case DF   # figures whose name contains KTPlot1, drawn with case='DF'
+    dfplots build plotIC --case BDNK  # a figure function which is not in a figures list, named exactly
+    dfplots build --draft          # quick PNGs in draft/ without LaTeX (see render.py)
+    dfplots build --rta-overwrite  # figures drawn from the RTA stand-in replace the EKT ones (see render.py)
+    dfplots build -f --trace       # also time the stages of every figure into trace.json (see tracing.py)
+    dfplots build -f --audit-io    # also report the data read more than once (see ioaudit.py)
+    dfplots list                   # list the figures and the figure functions
+
+dfplots is the small executable next to this file; python dfplots.py ... does
+the same, and build is the default command.
+
+A failing figure does not stop the others. Its traceback is printed at the end
+and the exit status is the number of figures which failed.
+
+Figures whose data files, source and style have not changed since they were
+last drawn are skipped (see manifest.py); -f draws them anyway. If none of the
+files of a figure changed, python files included, it is skipped without
+starting a worker. The PDFs are written with a fixed creation date, so an
+unchanged figure is byte identical.
+
+--case draws every selected figure function which takes a case argument with
+that case instead of the one in its figures list, and leaves out the others.
+case is either a solver (DF, BDNK, MUSIC) or a test case (test1, test2), and
+is only given to the functions whose default case is of the same kind.
+
+The figures lists are read from the source of the figure files, so listing
+and selecting figures does not import matplotlib. A figure file is imported
+only in the process which draws one of its figures.
+
+Draft and publication figures are recorded separately in the manifest. Before
+publication figures are drawn, the TeX strings of earlier builds which are not
+in the TeX cache are typeset on the pool (render.warmtex).
+"""
+import os
+import sys
+import re
+import ast
+import time
+import argparse
+import functools
+import importlib
+import traceback
+import concurrent.futures
+
+
+# Files with figure functions, in the order they are built
+figuremodules = ['plotfig1', 'plot_tests12', 'plot_test2', 'make_paper_plot_test1', 'make_paper_plot_test2']
+
+# Top of the repository, where the figure files are
+topdir = os.path.dirname(os.path.abspath(__file__))
+
+
+################################################################################
+def parsemodule(modulename):
+    """ Returns the syntax tree of a figure file without importing it """
+    with open(os.path.join(topdir, modulename + '.py')) as f:
+        return ast.parse(f.read(), modulename + '.py')
+
+
+def figurefunctions(modulename):
+    """ Returns the names of all the plot* functions defined in a figure file """
+    return sorted(node.name for node in parsemodule(modulename).body
+                  if isinstance(node, ast.FunctionDef) and node.name.startswith('plot'))
+
+
+def figurelist(modulename):
+    """ Returns the figures list of a figure file as [(function name, kwargs)], read from its source """
+    for node in parsemodule(modulename).body:
+        if isinstance(node, ast.Assign) and [getattr(t, 'id', None) for t in node.targets] == ['figures']:
+            return [(item.elts[0].id, ast.literal_eval(item.elts[1])) for item in node.value.elts]
+    raise ValueError('{}.py has no figures list'.format(modulename))
+
+
+def jobname(job):
+    """ Returns a readable name for a job  (module, function, kwargs) """
+    modulename, funcname, kwargs = job
+    args = ', '.join('{}={!r}'.format(k, v) for k, v in kwargs.items())
+    return '{}.{}({})'.format(modulename, funcname, args)
+
+
+def figuredefaults(modulename):
+    """ Returns {function name: {argument: default}} of the plot* functions of a figure file which
+    can be called without arguments, read from its source
+    """
+    found = {}
+    for node in parsemodule(modulename).body:
+        if isinstance(node, ast.FunctionDef) and node.name.startswith('plot'):
+            args = node.args.args
+            if len(node.args.defaults) == len(args) and None not in node.args.kw_defaults:
+                found[node.name] = {a.arg: ast.literal_eval(d) for a, d in zip(args, node.args.defaults)}
+    return found
+
+
+def casekind(case):
+    """ A case is a test case (test1, test2, ...) or a solver (DF, BDNK, MUSIC) """
+    return 'testcase' if re.match(r'test[0-9]+$', str(case)) else 'solver'
+
+
+def findjobs(patterns=(), case=None):
+    """ Returns the jobs  (module, function, kwargs) in the figures lists which match one of patterns.
+
+    A figure function which is not in a figures list is added if one of
+    patterns is its name. With case, the functions which take a case of that
+    kind are drawn with it and the others are left out.
+    """
+    jobs = []
+    for modulename in figuremodules:
+        listed = figurelist(modulename)
+        defaults = figuredefaults(modulename)
+        found = listed + [(funcname, {}) for funcname in sorted(defaults)
+                          if funcname in patterns and funcname not in dict(listed)]
+        if case is not None:
+            found = [(funcname, dict(kwargs, case=case)) for funcname, kwargs in found
+                     if casekind(defaults.get(funcname, {}).get('case')) == casekind(case)
+                     and 'case' in defaults.get(funcname, {})]
+        jobs += [(modulename, funcname, kwargs) for funcname, kwargs in found]
+    if patterns:
+        jobs = [job for job in jobs if any(p in jobname(job) for p in patterns)]
+    # Entries of a figures list which differ only by their case are the same figure once it is replaced
+    unique = {}
+    for job in jobs:
+        unique.setdefault(jobname(job), job)
+    return list(unique.values())
+
+
+################################################################################
+# Files opened by the figure being drawn, filled in by auditopen
+_opened = None
+
+
+def auditopen(event, args):
+    """ Audit hook which records the files of the repository that are read and written while _opened is set """
+    if event != 'open' or _opened is None or not isinstance(args[0], (str, os.PathLike)):
+        return
+    path = os.path.abspath(args[0])
+    if path.startswith(_opened['cachedir']) or os.path.relpath(path, _opened['topdir']).startswith(os.pardir):
+        return
+    mode, flags = args[1], args[2]
+    if mode is not None:
+        writing = any(c in mode for c in 'wax+')
+    else:
+        writing = bool(flags & (os.O_WRONLY | os.O_RDWR))
+    if writing:
+        _opened['write'].add(path)
+    elif not path.endswith('.py'):
+        _opened['read'].add(path)
+
+
+def audith5():
+    """ Passes the files opened by h5py, which opens them in C without an audit event, to auditopen """
+    import h5py as h5
+
+    fileinit = h5.File.__init__
+
+    @functools.wraps(fileinit)
+    def openh5(self, name, mode='r', *args, **kwargs):
+        if isinstance(name, (str, os.PathLike)):
+            auditopen('open', (name, mode or 'r', 0))
+        return fileinit(self, name, mode, *args, **kwargs)
+    h5.File.__init__ = openh5
+
+
+def recordname(name):
+    """ Returns the key of the manifest record of a figure, which depends on the render mode """
+    from render import modename
+    return ' '.join(modename() + [name])
+
+
+def applystyle(module):
+    """ Resets matplotlib and applies the style of a figure file and the render mode. Returns the resulting rcParams """
+    import matplotlib
+    from render import setmode
+    matplotlib.rcdefaults()
+    module.setstyle()
+    setmode()
+    return matplotlib.rcParams
+
+
+def runjob(job, record=None, hashes=None, force=False):
+    """ Draws one figure unless the manifest record says it is up to date. This runs in the worker processes.
+
+    hashes holds the manifest file hashes of the files in record. Returns
+    (name, status, seconds, traceback or None, new record, hashes) where status
+    is 'ok', 'skip' or 'FAILED'.
+    """
+    global _opened
+    import matplotlib.pyplot as plt
+    from dfdata import cachedir, touchedfiles
+    from manifest import sourcehash, sourcefiles, stylehash, isuptodate, makerecord
+    from render import setmode
+    import ioaudit
+    from tracing import stage, flush
+
+    if not getattr(runjob, 'hooked', False):
+        sys.addaudithook(auditopen)
+        audith5()
+        runjob.hooked = True
+    # A fixed creation date makes the PDF of an unchanged figure byte identical
+    os.environ.setdefault('SOURCE_DATE_EPOCH', '0')
+
+    modulename, funcname, kwargs = job
+    hashes = dict(hashes or {})
+    start = time.perf_counter()
+    try:
+        module = importlib.import_module(modulename)
+        # Start every figure from the style of its own file
+        func = getattr(module, funcname)
+        keys = sourcehash(func, module.setstyle, setmode), stylehash(applystyle(module))
+        sources = sourcefiles(func, module.setstyle, setmode)
+    except Exception:
+        return jobname(job), 'FAILED', time.perf_counter() - start, traceback.format_exc(), None, hashes
+    if not force and isuptodate(record, *keys, hashes):
+        record = makerecord(*keys, record['inputs'], record['outputs'], hashes, sources)
+        return jobname(job), 'skip', time.perf_counter() - start, None, record, hashes
+
+    _opened = {'read': set(), 'write': set(), 'topdir': os.getcwd(), 'cachedir': cachedir}
+    ioaudit.setfigure(jobname(job))
+    try:
+        with touchedfiles() as inputs, stage(jobname(job), 'figure'):
+            getattr(module, funcname)(**kwargs)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        plt.close('all')
+        opened, _opened = _opened, None
+        ioaudit.setfigure(None)
+        flush()
+        ioaudit.flush()
+    if error is not None:
+        return jobname(job), 'FAILED', time.perf_counter() - start, error, None, hashes
+    inputs = (inputs | opened['read']) - opened['write']
+    record = makerecord(*keys, inputs, opened['write'], hashes, sources)
+    return jobname(job), 'ok', time.perf_counter() - start, None, record, hashes
+
+
+def build(jobs, manifest, nprocs=1, force=False):
+    """ Draws the figures of jobs on nprocs processes. Returns the list of results of runjob in the order of jobs """
+    from manifest import isunchanged
+    from render import isdraft, texstrings, warmtex
+
+    results = {}
+    tasks = []
+    for job in jobs:
+        record = manifest['figures'].get(recordname(jobname(job)))
+        if not force and isunchanged(record, manifest['hashes']):
+            results[jobname(job)] = (jobname(job), 'skip', 0.0, None, record, {})
+            report(results[jobname(job)])
+            continue
+        paths = [p for kind in ('inputs', 'outputs', 'sources') for p in (record or {}).get(kind, ())]
+        tasks.append((job, record, {p: manifest['hashes'][p] for p in paths if p in manifest['hashes']}, force))
+
+    strings = texstrings() if tasks and not isdraft() else []
+    if nprocs == 1 or len(tasks) <= 1:
+        warmtex(strings)
+        for task in tasks:
+            results[jobname(task[0])] = runjob(*task)
+            report(results[jobname(task[0])])
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(nprocs, len(tasks))) as pool:
+            nwarm = min(nprocs, len(tasks))
+            list(pool.map(warmtex, [strings[i::nwarm] for i in range(nwarm)]))
+            futures = [pool.submit(runjob, *task) for task in tasks]
+            for future in concurrent.futures.as_completed(futures):
+                results[future.result()[0]] = future.result()
+                report(future.result())
+    return [results[jobname(job)] for job in jobs]
+
+
+def report(result):
+    """ Prints one line for a finished figure """
+    name, status, seconds = result[:3]
+    if status == 'skip':
+        print('   skip   up to date  {}'.format(name), flush=True)
+    else:
+        print('{:>7.2f}s  {:6}  {}'.format(seconds, status, name), flush=True)
+
+
+################################################################################
+def buildcommand(args):
+    """ dfplots build: draws the selected figures and updates the manifest """
+    from manifest import loadmanifest, savemanifest
+    from render import setdraft, setdecimation, setrasterize, setrtaoverwrite
+    from tracing import settrace, istracing, starttrace, writetrace, tracefile
+    from ioaudit import setaudit, isauditing, startaudit, writereport
+
+    if args.draft:
+        setdraft()
+    if args.decimate:
+        setdecimation(args.decimate)
+    if args.rasterize:
+        setrasterize(args.rasterize)
+    if args.rta_overwrite:
+        setrtaoverwrite()
+    if args.trace:
+        settrace(args.trace)
+    if istracing():
+        starttrace()
+    if args.audit_io:
+        setaudit()
+    if isauditing():
+        startaudit()
+    jobs = findjobs(args.patterns, args.case)
+    manifest = loadmanifest()
+    nprocs = args.jobs if args.jobs > 0 else os.cpu_count()
+    start = time.perf_counter()
+    results = build(jobs, manifest, nprocs, args.force)
+
+    for name, status, seconds, error, record, hashes in results:
+        manifest['hashes'].update(hashes)
+        if record is None:
+            manifest['figures'].pop(recordname(name), None)
+        else:
+            manifest['figures'][recordname(name)] = record
+    savemanifest(manifest)
+
+    failed = [(name, error) for name, status, seconds, error, record, hashes in results if error]
+    for name, error in failed:
+        print('\n' + '#' * 80 + '\n' + name + '\n' + error, file=sys.stderr)
+    skipped = sum(result[1] == 'skip' for result in results)
+    print('{} figures drawn in {:.1f}s, {} up to date, {} failed'.format(
+        len(results) - skipped - len(failed), time.perf_counter() - start, skipped, len(failed)))
+    if istracing():
+        print('\n' + writetrace())
+        print('\ntrace written to', tracefile())
+    if isauditing():
+        print('\n' + writereport())
+    return len(failed)
+
+
+def listcommand(args):
+    """ dfplots list: prints the selected figures and the figure functions of every figure file """
+    for job in findjobs(args.patterns, args.case):
+        print(jobname(job))
+    print()
+    for modulename in figuremodules:
+        print('{}: {}'.format(modulename, ', '.join(figurefunctions(modulename))))
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # build is the default command, so  dfplots.py -j 8  still works
+    if not argv or argv[0] not in ('build', 'list', '-h', '--help'):
+        argv = ['build'] + argv
+
+    select = argparse.ArgumentParser(add_help=False)
+    select.add_argument('patterns', nargs='*', help='only figures whose name contains one of these')
+    select.add_argument('--case', help="draw the figures which take a case argument with this one (DF, BDNK, MUSIC, test1, ...)")
+
+    parser = argparse.ArgumentParser(prog='dfplots', description='Builds the figures of the paper')
+    commands = parser.add_subparsers(dest='command', required=True)
+    buildparser = commands.add_parser('build', parents=[select], help='draw the figures')
+    buildparser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes (0 means one per core)')
+    buildparser.add_argument('-f', '--force', action='store_true', help='draw the figures even if they are up to date')
+    buildparser.add_argument('--draft', action='store_true', help='draw quick PNGs without LaTeX (same as DFPLOTS_DRAFT=1)')
+    buildparser.add_argument('--decimate', nargs='?', const='minmax', choices=['minmax', 'lttb'],
+                             help='draw dense lines with only the points which show (same as DFPLOTS_DECIMATE)')
+    buildparser.add_argument('--rasterize', type=int, metavar='N',
+                             help='rasterize lines with more than N points (same as DFPLOTS_RASTERIZE=N)')
+    buildparser.add_argument('--rta-overwrite', action='store_true',
+                             help='save the figures drawn from the RTA stand-in of missing EKT files under their own '
+                                  'name instead of <name>_rta.pdf (same as DFPLOTS_RTA_OVERWRITE=1)')
+    buildparser.add_argument('--trace', nargs='?', const='trace.json', metavar='FILE',
+                             help='time the stages of every figure into a Chrome trace (same as DFPLOTS_TRACE=FILE)')
+    buildparser.add_argument('--audit-io', action='store_true',
+                             help='report the data read more than once by a figure (same as DFPLOTS_IOAUDIT=1)')
+    buildparser.set_defaults(run=buildcommand)
+    listparser = commands.add_parser('list', parents=[select], help='list the figures and the figure functions')
+    listparser.set_defaults(run=listcommand)
+    args = parser.parse_args(argv)
+
+    # Figures are written to the current directory, and the figure files expect to find the data from here
+    os.chdir(topdir)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+""" Free streaming of conformal matter in one dimension, the eta/s -> infinity reference of the figures.
+
+A massless particle moves along x with velocity v = cos(theta), which is
+uniform in [-1, 1] for an isotropic distribution. Starting from initial data
+whose momentum distribution is linear in v (the first two Legendre moments,
+which is all that Ttt and Ttx determine)
+
+    Ttt(t, x) = 1/2 int_{-1}^{1} dv [Ttt0(x - v t) + 3 v Ttx0(x - v t)]
+    Ttx(t, x) = 1/2 int_{-1}^{1} dv v [Ttt0(x - v t) + 3 v Ttx0(x - v t)]
+
+For Ttx0 = 0 and a Gaussian Ttt0 this is the erf solution of freefunction,
+see freegaussian. For any other initial data, freestream evaluates the
+convolutions in Fourier space, where the averages over v become the spherical
+Bessel functions
+
+    1/2 int dv e^{-ikvt} = j0(kt),  1/2 int dv v e^{-ikvt} = -i j1(kt),
+    1/2 int dv v^2 e^{-ikvt} = (j0(kt) - 2 j2(kt))/3
+
+so all the times are done in one batch of FFTs on the grid of the run.
+"""
+import os
+import numpy as np
+
+from dfdata import topdir, memoize, readcolumns, touch, loadout, loadoutslice
+
+
+################################################################################
+def freegaussian(x, times, gaussian_const=0.12, gaussian_amplitude=0.48, gaussian_width=25.0):
+    """ Closed form free streaming of Ttt0 = const + amplitude exp(-x^2/width), Ttx0 = 0. The output is
+
+    Ttt[nt, nx], Ttx[nt, nx]
+
+    for the times in times (a number or an array).
+    """
+    import scipy.special as sp
+    x = np.asarray(x, dtype=float)
+    tc = np.atleast_1d(np.asarray(times, dtype=float))[:, None]
+    delta = gaussian_const
+    A = gaussian_amplitude
+    w = np.sqrt(gaussian_width)
+
+    # At t = 0 the formulas below are 0/0, and the answer is the initial data
+    t = np.where(tc > 0, tc, 1.0)
+    erfs = sp.erf((x + t)/w) - sp.erf((x - t)/w)
+    Ttt = delta + np.sqrt(np.pi)/2*A*w/(2*t)*erfs
+    Ttx = A*w/(4*t**2)*(w*(np.exp(-(t + x)**2/w**2) - np.exp(-(t - x)**2/w**2)) + np.sqrt(np.pi)*x*erfs)
+    Ttt = np.where(tc > 0, Ttt, delta + A*np.exp(-x**2/w**2))
+    Ttx = np.where(tc > 0, Ttx, 0.0)
+    return Ttt, Ttx
+
+
+def freestream(x, Ttt0, Ttx0, times):
+    """ Free streams the initial data Ttt0[nx], Ttx0[nx] given on the uniform grid x. The output is
+
+    Ttt[nt, nx], Ttx[nt, nx]
+
+    for the times in times (a number or an array). Outside the grid the initial
+    data are continued by their values at the edges, as in the solver.
+    """
+    import scipy.fft
+    import scipy.special as sp
+
+    x = np.asarray(x, dtype=float)
+    times = np.atleast_1d(np.asarray(times, dtype=float))
+    dx = x[1] - x[0]
+    if not np.allclose(np.diff(x), dx, rtol=1e-6, atol=0):
+        raise ValueError('freestream needs a uniform grid')
+
+    # Pad by the distance travelled by the fastest particle, so that the
+    # periodic FFT never brings in data from the other end of the grid
+    nx = len(x)
+    pad = int(np.ceil(max(times.max(), 0.0)/dx)) + 1
+    n = scipy.fft.next_fast_len(nx + 2*pad, real=True)
+    padded = np.pad(np.stack([Ttt0, Ttx0]).astype(float), [(0, 0), (pad, n - nx - pad)], mode='edge')
+    htt, htx = scipy.fft.rfft(padded, axis=-1)
+
+    kt = np.outer(times, 2*np.pi*scipy.fft.rfftfreq(n, dx))
+    j0, j1, j2 = (sp.spherical_jn(order, kt) for order in range(3))
+    Ttt = scipy.fft.irfft(htt*j0 - 3j*htx*j1, n, axis=-1)
+    Ttx = scipy.fft.irfft(-1j*htt*j1 + htx*(j0 - 2*j2), n, axis=-1)
+    return Ttt[:, pad:pad + nx], Ttx[:, pad:pad + nx]
+
+
+@memoize
+def freerun(run, times=None):
+    """ Free streams the initial data of a run on its own grid. The output is
+
+    x[:], Ttt[nt, nx], Ttx[nt, nx]
+
+    run is a catalog entry or the file name of a run, and times defaults to
+    the final time of the run. The initial data are initialdatain of its .h5
+    or, for a run without one, the first row of its _out histories.
+    """
+    from catalog import entryof
+
+    entry = run if isinstance(run, dict) else entryof(run)
+    name = os.path.join(topdir, entry['name'])
+    if times is None:
+        times = entry['final_time']
+    if not entry.get('h5'):
+        x = loadout(name, 'x')
+        Ttt, Ttx = freestream(x, loadoutslice(name, 'Ttt', 0), loadoutslice(name, 'Ttx', 0), times)
+        return x, Ttt, Ttx
+
+    import h5py as h5
+    filename = name if name.endswith('.h5') else name + '.h5'
+    initial = readcolumns(filename, 'initialdatain', ['Ttt', 'Ttx'])
+    touch(filename)
+    with h5.File(filename, 'r') as file:
+        x = file['x'][:]
+    Ttt, Ttx = freestream(x, initial['Ttt'], initial['Ttx'], times)
+    return x, Ttt, Ttx
@@ -0,0 +1,326 @@
+""" Space-time (x-t) heatmaps of the histories of a run, drawn from a pyramid of resolutions.
+
+A history of NT times on NX points has far more cells than the pixels of a
+heatmap. Every run gets a pyramid of coarser copies of its histories, kept next
+to it in <run>_pyramid.h5:
+
+    /<source>/<tag>/<level>     level k is [ceil(NT/2^k), ceil(NX/2^k)], every cell the
+                                mean of 2^k x 2^k cells of the history
+
+Level 0 is the history itself: the files of name_out (BDNK, which has every
+tag including VISC and xi, read from their binary cache) or the solution
+dataset of the .h5 (DF, the tags of h5variables). The levels are built in one
+pass over the history, a block of times at a time, each level pooled from the
+one below (buildpyramid). The pyramid records the stamps of the files it was
+built from and is rebuilt when one of them changes.
+
+heatmapdata returns a window in x and t at a resolution of at least size
+pixels, read from the coarsest level which still has that many cells in the
+window, so an overview of the whole run reads a few thousand cells and a zoom
+into a front reads the level 0 cells of that front only:
+
+    python heatmap.py DFAndBDNK/nbys_6d446548125166256_d_0d12_A_0d48_w_25d0 --tag ux -o ux.png
+    python heatmap.py DFAndBDNK/nbys_6d446548125166256_d_0d12_A_0d48_w_25d0 --xlim 20 40 --tlim 10 30 -o front.png
+    python heatmap.py --build           # builds the pyramids of every run
+"""
+import os
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+
+from dfdata import topdir, stamp, touch, loadout, h5variables
+
+
+# Tags of the pyramids
+pyramidtags = ['Ttt', 'ux', 'VISC', 'xi']
+
+# The pyramid stops at the first level with no more than this many cells in either direction
+toplevelsize = 64
+
+# Size of the blocks of a history which are pooled at once
+pyramidbytes = int(os.environ.get('DFPLOTS_PYRAMID_BYTES', 32 * 2**20))
+
+
+################################################################################
+def pyramidname(entry):
+    """ Returns the file of the pyramid of a catalog entry """
+    return os.path.join(topdir, entry['name']) + '_pyramid.h5'
+
+
+def nlevels(nt, nx):
+    """ Returns the number of levels above level 0 of the pyramid of a history of nt times on nx points """
+    return max(0, int(np.ceil(np.log2(max(nt, nx)/toplevelsize))))
+
+
+def levelshape(nt, nx, level):
+    """ Shape of a level: every level halves the one below, rounding up """
+    return -(-nt//2**level), -(-nx//2**level)
+
+
+def pool(a):
+    """ Halves a block [nt, nx] in both directions by averaging 2x2 cells. An odd last row or column is repeated """
+    if a.shape[0] % 2:
+        a = np.concatenate([a, a[-1:]], axis=0)
+    if a.shape[1] % 2:
+        a = np.concatenate([a, a[:, -1:]], axis=1)
+    return (a[0::2, 0::2] + a[1::2, 0::2] + a[0::2, 1::2] + a[1::2, 1::2])/4
+
+
+def sourceof(entry, tag, source=None):
+    """ The source of the history of tag: BDNK if the run has name_out/<tag>.txt, otherwise DF """
+    if source is not None:
+        return source
+    name = os.path.join(topdir, entry['name'])
+    return 'BDNK' if entry.get('out') and os.path.exists(name + '_out/{}.txt'.format(tag)) else 'DF'
+
+
+def sourcetags(entry, source, tags=pyramidtags):
+    """ The tags of tags which the source of a run has """
+    name = os.path.join(topdir, entry['name'])
+    if source == 'DF':
+        return [tag for tag in tags if tag in h5variables] if entry.get('h5') else []
+    return [tag for tag in tags if os.path.exists(name + '_out/{}.txt'.format(tag))]
+
+
+def sourcefiles(entry, source, tags):
+    """ The files (relative to topdir) of the histories of tags """
+    if source == 'DF':
+        return [entry['name'] + '.h5']
+    return ['{}_out/{}.txt'.format(entry['name'], tag) for tag in tags + ['t', 'x']]
+
+
+def sourcestamps(entry, source, tags):
+    return json.dumps({f: stamp(os.path.join(topdir, f)) for f in sourcefiles(entry, source, tags)}, sort_keys=True)
+
+
+def grid(entry, source):
+    """ Returns x[:], t[:] of the history of a source """
+    name = os.path.join(topdir, entry['name'])
+    if source == 'BDNK':
+        return loadout(name, 'x'), np.atleast_1d(loadout(name, 't'))
+    from solution import SolutionView
+    with SolutionView(entry) as view:
+        return view.x, view.times
+
+
+def historyblocks(entry, source, tags, rows):
+    """ Yields (first time index, {tag: block[rows, nx]}) of the history of a source """
+    name = os.path.join(topdir, entry['name'])
+    if source == 'DF':
+        from solution import SolutionView
+        with SolutionView(entry) as view:
+            for lo in range(0, view.shape[0], rows):
+                block = view[lo:lo + rows, :, tags]
+                yield lo, {tag: block[..., k] for k, tag in enumerate(tags)}
+        return
+
+    files = {}
+    try:
+        for tag in tags:
+            filename = name + '_out/{}.txt'.format(tag)
+            touch(filename)
+            files[tag] = open(filename)
+        for lo in itertools.count(0, rows):
+            block = {tag: list(itertools.islice(f, rows)) for tag, f in files.items()}
+            if not any(block.values()):
+                return
+            yield lo, {tag: np.loadtxt(lines, ndmin=2) for tag, lines in block.items()}
+    finally:
+        for f in files.values():
+            f.close()
+
+
+################################################################################
+def buildpyramid(entry, source, tags=pyramidtags, verbose=False):
+    """ Builds the levels of the histories of tags of one source of a run in its pyramid file.
+    Returns the tags built.
+    """
+    import h5py as h5
+    from store import compression
+
+    tags = sourcetags(entry, source, tags)
+    if not tags:
+        return []
+    x, t = grid(entry, source)
+    nt, nx = len(t), len(x)
+    levels = nlevels(nt, nx)
+    rows = max(1, pyramidbytes//(8*nx*len(tags)))
+
+    with h5.File(pyramidname(entry), 'a') as file:
+        if source in file:
+            del file[source]
+        group = file.create_group(source)
+        datasets, written, pending = {}, {}, {}
+        for tag in tags:
+            for level in range(1, levels + 1):
+                shape = levelshape(nt, nx, level)
+                datasets[tag, level] = group.create_dataset('{}/{}'.format(tag, level), shape, 'f8',
+                                                            chunks=(min(shape[0], 64), shape[1]), **compression)
+                written[tag, level], pending[tag, level] = 0, None
+
+        def poolrows(tag, block, final=False):
+            """ Pools block into every level. A row left without a pair waits for the next block """
+            for level in range(1, levels + 1):
+                key = tag, level
+                if pending[key] is not None:
+                    block, pending[key] = np.concatenate([pending[key], block]), None
+                if not final and len(block) % 2:
+                    pending[key], block = block[-1:], block[:-1]
+                block = pool(block)
+                if len(block):
+                    datasets[key][written[key]:written[key] + len(block)] = block
+                    written[key] += len(block)
+
+        for lo, fields in historyblocks(entry, source, tags, rows):
+            for tag, block in fields.items():
+                poolrows(tag, block)
+        for tag in tags:
+            poolrows(tag, np.zeros((0, nx)), final=True)
+        group.attrs['levels'] = levels
+        group.attrs['shape'] = (nt, nx)
+        # Written last, so that a pyramid whose building was interrupted is built again
+        group.attrs['stamps'] = sourcestamps(entry, source, tags)
+    if verbose:
+        print('built {} levels of {} {}'.format(levels, entry['name'], source))
+    return tags
+
+
+def haspyramid(entry, source, tags):
+    """ True if the pyramid of the source of a run is built and up to date for tags """
+    import h5py as h5
+    filename = pyramidname(entry)
+    if not os.path.exists(filename):
+        return False
+    with h5.File(filename, 'r') as file:
+        group = file.get(source)
+        return group is not None and group.attrs.get('stamps') == sourcestamps(entry, source, tags)
+
+
+def buildpyramids(force=False, verbose=False):
+    """ Builds the pyramids of every run in DFAndBDNK and figure12_data which are missing or out of date """
+    from catalog import findruns, dfdirs
+    built = []
+    for entry in sorted(findruns(source=dfdirs), key=lambda e: e['name']):
+        for source in ('DF', 'BDNK'):
+            tags = sourcetags(entry, source)
+            if tags and (force or not haspyramid(entry, source, tags)):
+                buildpyramid(entry, source, tags, verbose)
+                built.append((entry['name'], source))
+    return built
+
+
+################################################################################
+def chooselevel(ncells, size, levels):
+    """ Returns the coarsest level at which ncells = (nt, nx) cells of level 0 are still at least size = (height, width) """
+    ratio = min(ncells[0]/max(size[0], 1), ncells[1]/max(size[1], 1))
+    return int(np.clip(np.floor(np.log2(max(ratio, 1.0))), 0, levels))
+
+
+def heatmapdata(run, tag, xlim=None, tlim=None, size=(600, 800), source=None):
+    """ Returns values[nt, nx], extent, level of the window xlim, tlim of the history of tag of a run.
+
+    size is the (height, width) in pixels the heatmap is drawn at, and the
+    level read is the coarsest with at least that many cells in the window.
+    extent is (xmin, xmax, tmin, tmax) of the cells, for imshow. The pyramid is
+    built first if it is missing or out of date.
+    """
+    import h5py as h5
+    from catalog import entryof
+
+    entry = run if isinstance(run, dict) else entryof(run)
+    source = sourceof(entry, tag, source)
+    tags = sourcetags(entry, source)
+    if tag not in tags:
+        raise KeyError('{} has no history of {} in {} (the pyramids hold {})'.format(
+            entry['name'], tag, source, ', '.join(pyramidtags)))
+    x, t = grid(entry, source)
+    ix = slice(int(np.searchsorted(x, xlim[0], 'left')), int(np.searchsorted(x, xlim[1], 'right'))) if xlim else slice(0, len(x))
+    it = slice(int(np.searchsorted(t, tlim[0], 'left')), int(np.searchsorted(t, tlim[1], 'right'))) if tlim else slice(0, len(t))
+    if ix.start >= ix.stop or it.start >= it.stop:
+        raise ValueError('the window x in {}, t in {} holds no point of {}'.format(xlim, tlim, entry['name']))
+
+    levels = nlevels(len(t), len(x))
+    level = chooselevel((it.stop - it.start, ix.stop - ix.start), size, levels)
+    # The cells of the level which cover the window
+    cx = slice(ix.start >> level, -(-ix.stop >> level))
+    ct = slice(it.start >> level, -(-it.stop >> level))
+    if level == 0:
+        name = os.path.join(topdir, entry['name'])
+        if source == 'BDNK':
+            values = np.asarray(loadout(name, tag)[ct, cx])
+        else:
+            from solution import SolutionView
+            with SolutionView(entry) as view:
+                values = view[ct, cx, tag]
+    else:
+        if not haspyramid(entry, source, tags):
+            buildpyramid(entry, source, tags)
+        touch(pyramidname(entry))
+        with h5.File(pyramidname(entry), 'r') as file:
+            values = file[source][tag][str(level)][ct, cx]
+
+    # Uniform grids: a cell of the level spans 2^level points
+    dx, dt = x[1] - x[0], (t[1] - t[0] if len(t) > 1 else 1.0)
+    step = 2**level
+    extent = (x[0] + (cx.start*step - 0.5)*dx, x[0] + (min(cx.stop*step, len(x)) - 0.5)*dx,
+              t[0] + (ct.start*step - 0.5)*dt, t[0] + (min(ct.stop*step, len(t)) - 0.5)*dt)
+    return values, extent, level
+
+
+def heatmap(run, tag, xlim=None, tlim=None, ax=None, size=None, source=None, **kwargs):
+    """ Draws the x-t heatmap of tag of a run on ax (the current axes by default). Returns the image.
+    size defaults to the size of ax in pixels. Fields of both signs get a diverging colormap centred on 0.
+    """
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.gca()
+    if size is None:
+        box = ax.get_window_extent()
+        size = (int(box.height), int(box.width))
+    values, extent, level = heatmapdata(run, tag, xlim, tlim, size, source)
+    finite = values[np.isfinite(values)]
+    lo, hi = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+    if lo < 0 < hi:
+        bound = max(-lo, hi)
+        kwargs = dict({'cmap': 'RdBu_r', 'vmin': -bound, 'vmax': bound}, **kwargs)
+    image = ax.imshow(values, extent=extent, origin='lower', aspect='auto', interpolation='nearest', **kwargs)
+    ax.set_xlabel(r'$x$')
+    ax.set_ylabel(r'$t$')
+    if xlim:
+        ax.set_xlim(*xlim)
+    if tlim:
+        ax.set_ylim(*tlim)
+    return image
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='x-t heatmaps of the histories of a run')
+    parser.add_argument('run', nargs='?', help='the name of a run, e.g. DFAndBDNK/nbys_..._w_25d0')
+    parser.add_argument('--tag', default='Ttt')
+    parser.add_argument('--source', choices=['DF', 'BDNK'], help='default: BDNK if the run has the tag in name_out')
+    parser.add_argument('--xlim', type=float, nargs=2)
+    parser.add_argument('--tlim', type=float, nargs=2)
+    parser.add_argument('-o', '--output', help='the image (default: show it)')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--build', action='store_true', help='build the missing pyramids of every run')
+    parser.add_argument('-f', '--force', action='store_true', help='with --build, build every pyramid again')
+    args = parser.parse_args()
+
+    if args.build:
+        buildpyramids(args.force, verbose=True)
+    if args.run:
+        import matplotlib
+        if args.output:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(6, 4.5), dpi=args.dpi)
+        image = heatmap(args.run, args.tag, args.xlim, args.tlim, ax=ax, source=args.source)
+        fig.colorbar(image, ax=ax, label=args.tag)
+        ax.set_title(args.run, fontsize='small')
+        if args.output:
+            fig.savefig(args.output)
+        else:
+            plt.show()
+    sys.exit(0)
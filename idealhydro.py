@@ -0,0 +1,130 @@
+""" Ideal conformal hydrodynamics in one dimension, the eta/s = 0 baseline of the figures.
+
+The figures draw ideal hydro from an eta/s = 0 run of the solver. When there is
+no such run for a set of initial conditions, for instance in figure12_data, the
+baseline is computed here instead. The conserved densities E = Ttt and M = Ttx
+obey
+
+    d_t E + d_x M = 0,    d_t M + d_x (M v + p) = 0,    p = e/3
+
+with the energy density and velocity in the local rest frame given by
+
+    e = -E + sqrt(4 E^2 - 3 M^2),    v = M/(E + p)
+
+They are evolved with the second order central scheme of Kurganov and Tadmor
+(minmod limited slopes, local propagation speed (|v| + cs)/(1 + |v| cs)) and
+Heun's method in time. Every step works on whole arrays, and the initial data
+can have leading dimensions to evolve several runs at once.
+
+Results of idealfinal are saved in cachedir/ideal and reused by later builds.
+"""
+import os
+import hashlib
+import numpy as np
+
+from dfdata import cachedir, memoize, h5variables
+
+
+# Speed of sound of a conformal fluid
+cs = 1/np.sqrt(3)
+
+# Changing the scheme changes this, which invalidates the saved results
+idealversion = 'kt-minmod-heun-1'
+
+
+################################################################################
+def primitives(E, M):
+    """ Returns the rest frame energy density e and velocity v from Ttt = E and Ttx = M """
+    e = -E + np.sqrt(np.maximum(4*E**2 - 3*M**2, 0.0))
+    v = M/(E + e/3)
+    return e, v
+
+
+def minmod(a, b, c):
+    """ The argument of smallest magnitude if all three have the same sign, otherwise 0 """
+    same = (np.sign(a) == np.sign(b)) & (np.sign(b) == np.sign(c))
+    return np.where(same, np.sign(a)*np.minimum(np.minimum(abs(a), abs(b)), abs(c)), 0.0)
+
+
+def ktrhs(U, dx, theta=1.5):
+    """ Returns -d_x F(U) for U[2, ..., nx] with the Kurganov-Tadmor central scheme.
+
+    Two ghost cells on each side copy the edge values, so waves leave the grid.
+    """
+    pad = [(0, 0)]*(U.ndim - 1) + [(2, 2)]
+    W = np.pad(U, pad, mode='edge')
+    # Limited slopes of the cells 1 .. nx+2 of the padded array
+    left, right = W[..., 1:-1] - W[..., :-2], W[..., 2:] - W[..., 1:-1]
+    slopes = minmod(theta*left, (left + right)/2, theta*right)
+    # States on both sides of the interfaces between the cells j and j+1, j = 1 .. nx+1
+    UL = W[..., 1:-2] + slopes[..., :-1]/2
+    UR = W[..., 2:-1] - slopes[..., 1:]/2
+
+    eL, vL = primitives(UL[0], UL[1])
+    eR, vR = primitives(UR[0], UR[1])
+    FL = np.stack([UL[1], UL[1]*vL + eL/3])
+    FR = np.stack([UR[1], UR[1]*vR + eR/3])
+    speed = np.maximum((abs(vL) + cs)/(1 + abs(vL)*cs), (abs(vR) + cs)/(1 + abs(vR)*cs))
+
+    H = (FL + FR)/2 - speed*(UR - UL)/2
+    return -(H[..., 1:] - H[..., :-1])/dx
+
+
+def solveideal(x, Ttt0, Ttx0, final_time, cfl=0.4):
+    """ Evolves the initial data Ttt0[..., nx], Ttx0[..., nx] on the uniform grid x to final_time. The output is
+
+    Ttt[..., nx], Ttx[..., nx]
+    """
+    x = np.asarray(x, dtype=float)
+    dx = x[1] - x[0]
+    U = np.stack(np.broadcast_arrays(np.asarray(Ttt0, dtype=float), np.asarray(Ttx0, dtype=float)))
+    # Signals never travel faster than light, so dt = cfl*dx is stable for cfl < 1/2
+    nsteps = max(int(np.ceil(final_time/(cfl*dx))), 1)
+    dt = final_time/nsteps
+    for step in range(nsteps):
+        U1 = U + dt*ktrhs(U, dx)
+        U = (U + U1 + dt*ktrhs(U1, dx))/2
+    return U[0], U[1]
+
+
+################################################################################
+def idealcachename(*params):
+    """ Returns the file in cachedir/ideal for a set of parameters of idealfinal """
+    key = repr((idealversion,) + tuple('{:.10g}'.format(p) for p in params))
+    return os.path.join(cachedir, 'ideal', hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+
+@memoize
+def idealfinal(gaussian_const, gaussian_amplitude, gaussian_width, final_time, xmin=-100.0, xmax=100.0, NX=513):
+    """ Ideal hydro at final_time from Ttt = const + amplitude exp(-x^2/width), Ttx = 0. The output is
+
+    x[:], finaldata[:, 4]
+
+    with the columns Ttt, Ttx, eps, ux of finaldata in the HDF5 output (see
+    h5variables). The grid is linspace(xmin, xmax, NX) like the solver's.
+    """
+    x = np.linspace(xmin, xmax, int(NX))
+    cachefile = idealcachename(gaussian_const, gaussian_amplitude, gaussian_width, final_time, xmin, xmax, NX)
+    if os.path.exists(cachefile):
+        return x, np.load(cachefile)
+
+    Ttt, Ttx = solveideal(x, gaussian_const + gaussian_amplitude*np.exp(-x**2/gaussian_width), 0*x, final_time)
+    e, v = primitives(Ttt, Ttx)
+    finaldata = np.stack([Ttt, Ttx, e, v/np.sqrt(1 - v**2)], axis=-1)
+
+    os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(cachefile, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.save(f, finaldata)
+    os.replace(tmp, cachefile)
+    return x, finaldata
+
+
+def idealfields(entry, tags, time=None):
+    """ Returns {tag: column} of the ideal hydro baseline for the initial conditions and grid of a catalog entry,
+    at time (the final time of the entry by default)
+    """
+    time = entry['final_time'] if time is None else time
+    x, finaldata = idealfinal(entry['const'], entry['amplitude'], entry['width'], time,
+                              entry.get('xmin', -100.0), entry.get('xmax', 100.0), entry.get('NX', 513))
+    return {tag: finaldata[:, h5variables[tag]] for tag in tags}
@@ -0,0 +1,310 @@
+""" Accounting of the file reads of a figure build, to find data which is read more than once.
+
+With DFPLOTS_IOAUDIT=1 (or dfplots build --audit-io) every read of a data file
+is recorded as a fetch of an item of a file:
+
+    h5py datasets     item = dataset[selection]     (and every h5py.File open)
+    np.loadtxt        item = loadtxt                (a text file parsed)
+    np.load           item = npy                    (a binary copy in .dfcache)
+    json.load         item = json
+    loadekt, tailrows and headrow of dfdata.py    item = the blocks or rows read
+
+with the bytes read (rchar of /proc/self/io), the time taken, the figure being
+drawn and the function of the repository which asked for it (the innermost
+caller outside the loaders). Every open of a file of the repository is
+counted too.
+
+At the end of the build the fetches are added up per file, and every (file,
+item) which a figure fetched more than once is reported, ranked by the time
+spent on the repeats. Fetches of the same item by different figures are listed
+separately, since the figures may run in different processes.
+
+Like tracing.py, the wrappers are only installed when the audit is on
+(render.setmode calls instrument), and every process appends its records to a
+part file in cachedir/ioaudit which writereport merges.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import collections
+
+from dfdata import topdir, cachedir
+
+
+# Directory of the part files of the processes
+partdir = os.path.join(cachedir, 'ioaudit')
+
+# Modules whose functions are loaders, so that a fetch is blamed on whoever called them
+loadermodules = ('dfdata', 'catalog', 'store', 'solution', 'ioaudit', 'tracing', 'idealhydro', 'freestream', 'rta')
+
+_records = []
+_state = {'figure': None, 'depth': 0, 'collecting': False}
+
+
+################################################################################
+def isauditing():
+    """ True if the reads are audited """
+    return os.environ.get('DFPLOTS_IOAUDIT', '') not in ('', '0')
+
+
+def setaudit(audit=True):
+    """ Switches the audit on or off for this process and the processes it starts """
+    os.environ['DFPLOTS_IOAUDIT'] = '1' if audit else '0'
+
+
+def setfigure(name):
+    """ Sets the figure the following reads are blamed on """
+    _state['figure'] = name
+
+
+def relname(filename):
+    path = os.path.abspath(os.fsdecode(filename))
+    return os.path.relpath(path, topdir) if path.startswith(topdir) else path
+
+
+def caller():
+    """ Returns module.function:line of the innermost caller in the repository outside the loaders """
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(topdir):
+            module = os.path.splitext(os.path.basename(filename))[0]
+            where = '{}.{}:{}'.format(module, frame.f_code.co_name, frame.f_lineno)
+            if module not in loadermodules:
+                return where
+            fallback = fallback or where
+        frame = frame.f_back
+    return fallback or '?'
+
+
+def record(kind, filename, item, start, nbytes, who):
+    _records.append({'kind': kind, 'file': relname(filename), 'item': item, 'seconds': time.perf_counter() - start,
+                     'bytes': nbytes, 'figure': _state['figure'], 'caller': who, 'pid': os.getpid()})
+
+
+def fetching(kind, describe):
+    """ Decorator for a reader: describe(*args, **kwargs) returns (filename, item), or None to not record.
+    Reads inside another recorded read are part of it and are not recorded again.
+    """
+    from tracing import bytesread
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            what = describe(*args, **kwargs) if _state['depth'] == 0 else None
+            if what is None:
+                return func(*args, **kwargs)
+            who = caller()
+            start, before = time.perf_counter(), bytesread()
+            _state['depth'] += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _state['depth'] -= 1
+                record(kind, what[0], what[1], start, bytesread() - before, who)
+        wrapper.__audited__ = func
+        return wrapper
+    return decorate
+
+
+def pathof(value):
+    return value if isinstance(value, (str, bytes, os.PathLike)) else getattr(value, 'name', None)
+
+
+def selection(index):
+    """ A short readable form of an h5py index """
+    index = index if isinstance(index, tuple) else (index,)
+    parts = []
+    for i in index:
+        if isinstance(i, slice):
+            parts.append('{}:{}{}'.format('' if i.start is None else i.start, '' if i.stop is None else i.stop,
+                                          '' if i.step is None else ':{}'.format(i.step)))
+        elif i is Ellipsis:
+            parts.append('...')
+        else:
+            parts.append(repr(i) if len(repr(i)) < 40 else type(i).__name__)
+    return '[{}]'.format(', '.join(parts))
+
+
+################################################################################
+def auditopen(event, args):
+    """ Audit hook which counts the opens of files of the repository and of the cache """
+    if event != 'open' or not isinstance(args[0], (str, os.PathLike)) or _state['depth'] < 0:
+        return
+    path = os.path.abspath(args[0])
+    if path.startswith(topdir) and not path.endswith('.py') and not path.startswith(partdir):
+        _records.append({'kind': 'open', 'file': relname(path), 'pid': os.getpid(), 'figure': _state['figure']})
+
+
+def instrument():
+    """ Wraps the readers of numpy, json, h5py and dfdata. Call after setmode """
+    import json as jsonmodule
+    import numpy as np
+    import h5py as h5
+    import dfdata
+    from tracing import rebind
+
+    if getattr(instrument, 'done', False):
+        return
+    instrument.done = True
+
+    np.loadtxt = fetching('loadtxt', lambda fname, *a, **k: (fname, 'loadtxt')
+                          if isinstance(fname, (str, os.PathLike)) else None)(np.loadtxt)
+    np.load = fetching('npy', lambda file, *a, **k: (pathof(file), 'npy') if pathof(file) else None)(np.load)
+    jsonmodule.load = fetching('json', lambda fp, *a, **k: (pathof(fp), 'json') if pathof(fp) else None)(jsonmodule.load)
+
+    getitem = h5.Dataset.__getitem__
+    h5.Dataset.__getitem__ = fetching(
+        'h5', lambda self, args, *a, **k: (self.file.filename, self.name + selection(args)))(getitem)
+    fileinit = h5.File.__init__
+
+    @functools.wraps(fileinit)
+    def openh5(self, name, *args, **kwargs):
+        if isinstance(name, (str, os.PathLike)):
+            _records.append({'kind': 'open', 'file': relname(name), 'pid': os.getpid(), 'figure': _state['figure']})
+        return fileinit(self, name, *args, **kwargs)
+    h5.File.__init__ = openh5
+
+    for name, describe in (('loadekt', lambda filename, blocks=-1: (filename, 'blocks {}'.format(blocks))),
+                           ('tailrows', lambda filename, nrows=1, *a: (filename, 'last {} rows'.format(nrows))),
+                           ('headrow', lambda filename, index: (filename, 'row {}'.format(index)))):
+        func = getattr(dfdata, name)
+        wrapper = fetching('text', describe)(func)
+        setattr(dfdata, name, wrapper)
+        rebind(func, wrapper)
+
+    # The figures list, which the __main__ block of a figure file runs
+    for module in list(sys.modules.values()):
+        figures = vars(module).get('figures')
+        if (getattr(module, '__file__', None) or '').startswith(topdir) and isinstance(figures, list):
+            for i, (func, kwargs) in enumerate(figures):
+                args = ', '.join('{}={!r}'.format(k, v) for k, v in kwargs.items())
+                name = '{}.{}({})'.format(os.path.splitext(os.path.basename(module.__file__))[0], func.__name__, args)
+                figures[i] = figure(func, name), kwargs
+
+    sys.addaudithook(auditopen)
+    atexit.register(finish)
+
+
+################################################################################
+def figure(func, name):
+    """ Returns func which blames its reads on the figure name """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        setfigure(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            setfigure(None)
+    return wrapper
+
+
+def partname():
+    return os.path.join(partdir, '{}.jsonl'.format(os.getpid()))
+
+
+def startaudit():
+    """ Removes the part files of earlier audits. Called by the process which writes the report """
+    _state['collecting'] = True
+    if os.path.isdir(partdir):
+        for name in os.listdir(partdir):
+            os.remove(os.path.join(partdir, name))
+
+
+def flush():
+    """ Appends the records so far to the part file of this process """
+    if not _records:
+        return
+    records = list(_records)
+    del _records[:]
+    # Writing the part file must not count as a read
+    _state['depth'] -= 1
+    try:
+        os.makedirs(partdir, exist_ok=True)
+        with open(partname(), 'a') as f:
+            for r in records:
+                f.write(json.dumps(r) + '\n')
+    finally:
+        _state['depth'] += 1
+
+
+def finish():
+    """ At exit: a figure file run on its own prints its report, a worker only writes its part file """
+    flush()
+    if not _state['collecting'] and isauditing():
+        print(writereport())
+
+
+def readparts():
+    records = []
+    if os.path.isdir(partdir):
+        for name in sorted(os.listdir(partdir)):
+            with open(os.path.join(partdir, name)) as f:
+                records += [json.loads(line) for line in f if line.strip()]
+    return records
+
+
+def writereport(filename=None):
+    """ Merges the part files and returns the report (also written to filename if given) """
+    flush()
+    text = report(readparts())
+    if filename:
+        with open(filename, 'w') as f:
+            f.write(text + '\n')
+    startaudit()
+    return text
+
+
+################################################################################
+def report(records):
+    """ Returns the text of the audit of a list of records """
+    opens = [r for r in records if r['kind'] == 'open']
+    fetches = [r for r in records if r['kind'] != 'open']
+    lines = ['I/O audit: {} opens of {} files, {} reads of {:.2f} MB in {:.3f} s'.format(
+        len(opens), len(set(r['file'] for r in opens)), len(fetches),
+        sum(r['bytes'] for r in fetches)/2**20, sum(r['seconds'] for r in fetches))]
+
+    perfile = collections.defaultdict(lambda: [0, 0, 0, 0.0])
+    for r in opens:
+        perfile[r['file']][0] += 1
+    for r in fetches:
+        perfile[r['file']][1] += 1
+        perfile[r['file']][2] += r['bytes']
+        perfile[r['file']][3] += r['seconds']
+    lines += ['', '{:>6s} {:>6s} {:>9s} {:>8s}  {}'.format('opens', 'reads', 'MB', 'seconds', 'file')]
+    for name, (nopen, nread, nbytes, seconds) in sorted(perfile.items(), key=lambda item: -item[1][3])[:20]:
+        lines.append('{:6d} {:6d} {:9.2f} {:8.3f}  {}'.format(nopen, nread, nbytes/2**20, seconds, name))
+
+    # Repeats within a figure: everything after the first fetch is wasted
+    groups = collections.defaultdict(list)
+    for r in fetches:
+        groups[r['figure'], r['file'], r['item']].append(r)
+    wasted = []
+    for (fig, name, item), rs in groups.items():
+        if len(rs) > 1:
+            callers = collections.Counter(r['caller'] for r in rs)
+            wasted.append((sum(r['seconds'] for r in rs[1:]), sum(r['bytes'] for r in rs[1:]), len(rs),
+                           name, item, fig, callers))
+    wasted.sort(key=lambda w: (-w[0], -w[1]))
+    lines += ['', 'Wasted I/O: {} items read more than once by the same figure, {:.3f} s and {:.2f} MB of repeats'.format(
+        len(wasted), sum(w[0] for w in wasted), sum(w[1] for w in wasted)/2**20)]
+    if wasted:
+        lines.append('{:>9s} {:>8s} {:>6s}  {}'.format('seconds', 'MB', 'times', 'file :: item / figure / callers'))
+    for seconds, nbytes, n, name, item, fig, callers in wasted:
+        lines.append('{:9.4f} {:8.3f} {:6d}  {} :: {}'.format(seconds, nbytes/2**20, n, name, item))
+        lines.append('{:26s}{}'.format('', fig))
+        lines.append('{:26s}{}'.format('', ', '.join('{} x{}'.format(c, k) for c, k in callers.most_common())))
+
+    # The same item fetched by several figures
+    shared = collections.defaultdict(set)
+    for r in fetches:
+        shared[r['file'], r['item']].add(r['figure'])
+    shared = sorted(((len(figs), name, item) for (name, item), figs in shared.items() if len(figs) > 1), reverse=True)
+    lines += ['', '{} items are read by more than one figure'.format(len(shared))]
+    for n, name, item in shared[:20]:
+        lines.append('{:6d} figures  {} :: {}'.format(n, name, item))
+    return '\n'.join(lines)
@@ -0,0 +1,172 @@
+""" Build manifest used by dfplots.py to skip figures whose inputs have not changed.
+
+For every figure (a job of dfplots.py) the manifest records
+
+    source   hash of the figure function and of every function of the repository it calls
+    style    hash of the rcParams in effect when the figure is drawn
+    inputs   {data file: content hash} of the files the loaders read
+    outputs  {file: content hash} of the files the figure wrote
+    sources  {file: content hash} of the python files holding those functions
+
+A figure is up to date if all of these are unchanged and its outputs are still
+on disk. isunchanged checks the files only, including sources, so dfplots.py can
+skip a figure without importing its figure file. A change to matplotlib itself
+is not seen that way; dfplots build -f redraws everything. File hashes are remembered together with the mtime and size of the file,
+so unchanged files are not read again.
+"""
+import os
+import dis
+import json
+import types
+import hashlib
+import inspect
+import importlib.util
+
+from dfdata import topdir, cachedir
+
+
+manifestfile = os.path.join(cachedir, 'manifest.json')
+
+
+################################################################################
+def loadmanifest():
+    """ Returns the saved manifest, or an empty one """
+    try:
+        with open(manifestfile) as f:
+            manifest = json.load(f)
+        if 'figures' in manifest and 'hashes' in manifest:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'figures': {}, 'hashes': {}}
+
+
+def savemanifest(manifest):
+    """ Writes the manifest to manifestfile """
+    os.makedirs(cachedir, exist_ok=True)
+    tmp = '{}.{}.tmp'.format(manifestfile, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, manifestfile)
+
+
+def filehash(path, hashes):
+    """ Returns the sha1 of the content of path, or None if it does not exist.
+
+    hashes is the table  path -> [mtime_ns, size, sha1]  of the manifest. It is
+    used if the file has not changed, and updated otherwise.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    known = hashes.get(path)
+    if known is not None and known[:2] == [st.st_mtime_ns, st.st_size]:
+        return known[2]
+
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    hashes[path] = [st.st_mtime_ns, st.st_size, sha.hexdigest()]
+    return hashes[path][2]
+
+
+################################################################################
+def calledfunctions(func, found=None):
+    """ Returns the functions of the repository which func calls, directly or through other such functions """
+    if found is None:
+        found = {}
+    func = inspect.unwrap(func)
+    filename = getattr(func.__code__, 'co_filename', '')
+    if os.path.relpath(os.path.abspath(filename), topdir).startswith(os.pardir):
+        return found
+    key = '{}:{}'.format(os.path.relpath(filename, topdir), func.__qualname__)
+    if key in found:
+        return found
+    found[key] = func
+
+    codes = [func.__code__] + [c for c in func.__code__.co_consts if isinstance(c, types.CodeType)]
+    values = [func.__globals__.get(name) for code in codes for name in code.co_names]
+    values += [value for code in codes for value in localimports(code)]
+    for value in values:
+        if isinstance(value, types.FunctionType):
+            calledfunctions(value, found)
+        elif isinstance(value, type) and value.__module__ == func.__module__:
+            for method in vars(value).values():
+                if isinstance(method, types.FunctionType):
+                    calledfunctions(method, found)
+    return found
+
+
+def localimports(code):
+    """ Returns the objects brought in by  from <module> import <name>  inside a function, for modules of the repository """
+    values = []
+    module = None
+    for instruction in dis.get_instructions(code):
+        if instruction.opname == 'IMPORT_NAME':
+            # Only the modules of the repository, which import without side effects
+            spec = importlib.util.find_spec(instruction.argval) if '.' not in instruction.argval else None
+            inrepo = spec is not None and spec.origin and not os.path.relpath(spec.origin, topdir).startswith(os.pardir)
+            module = importlib.import_module(instruction.argval) if inrepo else None
+        elif instruction.opname == 'IMPORT_FROM' and module is not None:
+            values.append(getattr(module, instruction.argval, None))
+    return values
+
+
+def sourcehash(*funcs):
+    """ Hash of the source of funcs and of every function of the repository they call """
+    found = {}
+    for func in funcs:
+        calledfunctions(func, found)
+    sha = hashlib.sha1()
+    for key, f in sorted(found.items()):
+        sha.update(key.encode())
+        sha.update(inspect.getsource(f).encode())
+    return sha.hexdigest()
+
+
+def sourcefiles(*funcs):
+    """ Returns the python files holding funcs and the functions of the repository they call """
+    found = {}
+    for func in funcs:
+        calledfunctions(func, found)
+    return sorted(set(os.path.abspath(f.__code__.co_filename) for f in found.values()))
+
+
+def stylehash(rcparams):
+    """ Hash of a set of rcParams """
+    sha = hashlib.sha1()
+    for key in sorted(rcparams.keys()):
+        sha.update('{}={!r}\n'.format(key, rcparams[key]).encode())
+    return sha.hexdigest()
+
+
+################################################################################
+def isunchanged(record, hashes):
+    """ True if none of the data, output and python files of the manifest record have changed """
+    if record is None or not record['outputs'] or not record.get('sources'):
+        return False
+    for kind in ('inputs', 'outputs', 'sources'):
+        for path, sha in record[kind].items():
+            if filehash(path, hashes) != sha:
+                return False
+    return True
+
+
+def isuptodate(record, source, style, hashes):
+    """ True if the figure described by the manifest record does not need to be drawn again """
+    if record is None or record['source'] != source or record['style'] != style or not record['outputs']:
+        return False
+    for path, sha in list(record['inputs'].items()) + list(record['outputs'].items()):
+        if filehash(path, hashes) != sha:
+            return False
+    return True
+
+
+def makerecord(source, style, inputs, outputs, hashes, sources=()):
+    """ Returns the manifest record of a figure which was drawn from inputs and wrote outputs """
+    return {'source': source, 'style': style,
+            'inputs': {path: filehash(path, hashes) for path in sorted(inputs)},
+            'outputs': {path: filehash(path, hashes) for path in sorted(outputs)},
+            'sources': {path: filehash(path, hashes) for path in sorted(sources)}}
@@ -0,0 +1,234 @@
+""" Comparison metrics between the density frame, BDNK, MUSIC and kinetic theory results.
+
+Every source has its own grid: the x.txt of a DF/BDNK run, the x dataset of the
+<testcase>_eta<eta/s>.h5 runs, column 1 of the MUSIC .dat files and column 18
+of the EKT files. For every test case, eta/s and tag the final time of every
+source is interpolated linearly onto a common uniform grid, and the differences
+to a reference source (kinetic theory by default) are measured with
+
+    L1 = sum |a - b| dx,   L2 = sqrt(sum (a - b)^2 dx),   Linf = max |a - b|
+
+and the same norms relative to the norm of the reference.
+
+The interpolation weights of a pair of grids (a plan) are worked out once and
+applied to all the arrays on that grid at once, whatever their tag. All the
+comparisons of the sweep are then one array, and the norms are computed for
+all of them in one pass.
+
+    python metrics.py                     # table for the whole sweep
+    python metrics.py --reference MUSIC_5 --csv metrics.csv
+    python metrics.py --time 25           # at t = 25 (see timeslice.py)
+"""
+import os
+import sys
+import hashlib
+import argparse
+import numpy as np
+
+from dfdata import topdir, ektdir, ektfile, loadekt, loadtxtcached, readcolumns, getDFfields, touch
+from catalog import testparams, findruns
+from rta import etabys_of_lambdaekt, nug
+from timeslice import musiccols, ektcols, fieldsat
+
+
+# Tags which every source has
+metrictags = ['Ttt', 'Ttx']
+
+# Names of the norms, in the order of the table
+norms = ['L1', 'L2', 'Linf']
+
+
+################################################################################
+# Interpolation plans, keyed by the hashes of the two grids
+_plans = {}
+
+
+def gridkey(x):
+    """ Hash of the values of a grid """
+    return hashlib.sha1(np.ascontiguousarray(x, dtype=float).tobytes()).hexdigest()
+
+
+def interpplan(xfrom, xto):
+    """ Returns (index, weight) such that values[..., index]*(1 - weight) + values[..., index + 1]*weight
+    interpolates values given on xfrom onto xto. Points of xto outside xfrom get weight nan.
+    """
+    key = (gridkey(xfrom), gridkey(xto))
+    if key not in _plans:
+        xfrom = np.asarray(xfrom, dtype=float)
+        index = np.clip(np.searchsorted(xfrom, xto) - 1, 0, len(xfrom) - 2)
+        weight = (xto - xfrom[index])/(xfrom[index + 1] - xfrom[index])
+        weight[(xto < xfrom[0]) | (xto > xfrom[-1])] = np.nan
+        _plans[key] = index, weight
+    return _plans[key]
+
+
+def resample(values, xfrom, xto):
+    """ Interpolates values[..., len(xfrom)] onto xto with the cached plan of the two grids """
+    index, weight = interpplan(xfrom, xto)
+    return values[..., index]*(1 - weight) + values[..., index + 1]*weight
+
+
+def commongrid(grids, npoints=401):
+    """ Uniform grid with npoints covering the range which all the grids have in common """
+    lo = max(np.min(x) for x in grids)
+    hi = min(np.max(x) for x in grids)
+    return np.linspace(lo, hi, npoints)
+
+
+################################################################################
+def sources(testcase, etabys, tags=metrictags):
+    """ Returns {source: (x, {tag: values})} for the final time of everything run with testcase and eta/s """
+    found = {}
+    params = dict(testparams[testcase])
+    for entry in findruns(testcase=testcase, fourpietabys=4*np.pi*etabys, rtol=1e-4, **params):
+        if entry['source'] == 'DFAndBDNK':
+            x, df, bdnk, ideal, info = getDFfields(entry, tags)
+            found['DF'] = x, df
+            found['BDNK'] = x, bdnk
+        elif entry['source'] == 'eta_h5':
+            import h5py as h5
+            filename = os.path.join(topdir, entry['name'])
+            touch(filename)
+            with h5.File(filename, 'r') as file:
+                x = file['x'][:]
+            found['DF_h5'] = x, readcolumns(filename, 'finaldata', tags)
+        elif entry['source'].startswith('music_'):
+            data = loadtxtcached(os.path.join(topdir, entry['name']), skiprows=1)
+            found['MUSIC' + entry['source'][len('music'):]] = data[:, musiccols['x']], {tag: data[:, musiccols[tag]] for tag in tags}
+
+    for lambdaekt, eta in etabys_of_lambdaekt.items():
+        if np.isclose(eta, etabys):
+            filename = ektfile(testcase, lambdaekt)
+            z, data = loadekt(filename, -1)
+            name = 'EKT' if os.path.dirname(filename) == ektdir else 'RTA'
+            found[name] = data[:, ektcols['x']], {tag: nug*data[:, ektcols[tag]] for tag in tags}
+    return found
+
+
+def sourcesat(testcase, etabys, time, tags=metrictags):
+    """ Returns {source: (x, {tag: values})} like sources, at the time time instead of the final time.
+
+    Every source is read with timeslice.fieldsat. Sources whose history does
+    not reach time are left out.
+    """
+    runs = {}
+    params = dict(testparams[testcase])
+    for entry in findruns(testcase=testcase, fourpietabys=4*np.pi*etabys, rtol=1e-4, **params):
+        if entry['source'] == 'DFAndBDNK':
+            if entry.get('h5'):
+                runs['DF'] = entry, None
+            if entry.get('out'):
+                runs['BDNK'] = entry, 'BDNK'
+        elif entry['source'] == 'eta_h5':
+            runs['DF_h5'] = entry, None
+        elif entry['source'].startswith('music_'):
+            runs['MUSIC' + entry['source'][len('music'):]] = entry, None
+    for lambdaekt, eta in etabys_of_lambdaekt.items():
+        if np.isclose(eta, etabys):
+            filename = ektfile(testcase, lambdaekt)
+            runs['EKT' if os.path.dirname(filename) == ektdir else 'RTA'] = filename, None
+
+    found = {}
+    for name, (run, source) in runs.items():
+        try:
+            found[name] = fieldsat(run, tags, time, source)
+        except ValueError:
+            pass
+    return found
+
+
+def comparisons(cases, tags=metrictags, npoints=401, time=None):
+    """ Puts every source of every (testcase, eta/s) in cases on one common grid. Returns
+
+    x[:], rows, values[nrows, len(x)]
+
+    where rows[i] = (testcase, eta/s, tag, source) describes values[i]. The
+    sources are taken at their final time, or at time if it is given.
+    """
+    loaded = {case: sources(*case, tags) if time is None else sourcesat(*case, time, tags) for case in cases}
+    x = commongrid([sx for found in loaded.values() for sx, fields in found.values()], npoints)
+
+    # Gather the arrays by grid, so that every plan is applied once to all of them
+    bygrid = {}
+    for case, found in loaded.items():
+        for source, (sx, fields) in found.items():
+            group = bygrid.setdefault(gridkey(sx), (sx, [], []))
+            for tag in tags:
+                group[1].append(case + (tag, source))
+                group[2].append(fields[tag])
+
+    rows = []
+    blocks = []
+    for sx, grouprows, arrays in bygrid.values():
+        rows += grouprows
+        blocks.append(resample(np.stack(arrays), sx, x))
+    return x, rows, np.concatenate(blocks)
+
+
+def metricstable(cases=None, tags=metrictags, reference=('EKT', 'RTA'), npoints=401, time=None):
+    """ Returns the list of rows  {testcase, etabys, tag, source, reference, L1, L2, Linf, relL1, relL2, relLinf}.
+
+    cases defaults to all the test cases and eta/s of the kinetic theory comparisons.
+    reference is the name of the source compared against, or a list of names of
+    which the first present is used. With time the sources are compared at
+    that time instead of at their final time.
+    """
+    if cases is None:
+        cases = [(testcase, etabys) for testcase in testparams for etabys in sorted(etabys_of_lambdaekt.values())]
+    references = [reference] if isinstance(reference, str) else list(reference)
+    x, rows, values = comparisons(cases, tags, npoints, time)
+    dx = x[1] - x[0]
+
+    # Index of the reference row of every row
+    where = {row: i for i, row in enumerate(rows)}
+    refindex = []
+    for testcase, etabys, tag, source in rows:
+        names = [name for name in references if (testcase, etabys, tag, name) in where]
+        refindex.append(where[(testcase, etabys, tag, names[0])] if names else -1)
+    refindex = np.array(refindex)
+    keep = (refindex >= 0) & (refindex != np.arange(len(rows)))
+
+    a, b = values[keep], values[refindex[keep]]
+    diff = abs(a - b)
+    absolute = np.stack([diff.sum(1)*dx, np.sqrt((diff**2).sum(1)*dx), diff.max(1)])
+    scale = np.stack([abs(b).sum(1)*dx, np.sqrt((b**2).sum(1)*dx), abs(b).max(1)])
+    relative = absolute/np.where(scale > 0, scale, np.nan)
+
+    table = []
+    for k, i in enumerate(np.flatnonzero(keep)):
+        testcase, etabys, tag, source = rows[i]
+        row = {'testcase': testcase, 'etabys': etabys, 'tag': tag, 'source': source,
+               'reference': rows[refindex[i]][3]}
+        row.update({name: float(absolute[n, k]) for n, name in enumerate(norms)})
+        row.update({'rel' + name: float(relative[n, k]) for n, name in enumerate(norms)})
+        table.append(row)
+    return sorted(table, key=lambda r: (r['testcase'], r['etabys'], r['tag'], r['source']))
+
+
+def formattable(table, sep='  '):
+    """ Returns the table as aligned text (sep='  ') or CSV (sep=',') """
+    columns = ['testcase', 'etabys', 'tag', 'source', 'reference'] + norms + ['rel' + name for name in norms]
+    lines = [columns] + [[('{:.4g}'.format(r[c]) if isinstance(r[c], float) else str(r[c])) for c in columns]
+                         for r in table]
+    if sep != '  ':
+        return '\n'.join(sep.join(line) for line in lines)
+    widths = [max(len(line[i]) for line in lines) for i in range(len(columns))]
+    return '\n'.join(sep.join(s.rjust(w) for s, w in zip(line, widths)) for line in lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares DF, BDNK, MUSIC and kinetic theory on a common grid')
+    parser.add_argument('--reference', nargs='+', default=['EKT', 'RTA'], help='source(s) to compare against, first present wins')
+    parser.add_argument('--tags', nargs='+', default=metrictags, choices=metrictags)
+    parser.add_argument('--npoints', type=int, default=401, help='points of the common grid')
+    parser.add_argument('--csv', help='also write the table to this CSV file')
+    parser.add_argument('--time', type=float, help='compare at this time instead of the final time')
+    args = parser.parse_args()
+
+    os.chdir(topdir)
+    table = metricstable(tags=args.tags, reference=args.reference, npoints=args.npoints, time=args.time)
+    print(formattable(table))
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write(formattable(table, sep=',') + '\n')
+    sys.exit(0)
@@ -0,0 +1,259 @@
+""" Time series of the conserved charges and other global observables of every run.
+
+For every time of a history the fields are reduced over x:
+
+    E         int Ttt dx, the energy, conserved while nothing flows out of the grid
+    P         int Ttx dx, the momentum
+    S         int e^(3/4) u^t dx, the entropy (up to a constant), which only grows
+              when there is dissipation
+    Tttmax    the peak height of Ttt, and xpeak where it is
+    Tttmin    the lowest Ttt
+    epsmax    the peak height of the energy density
+
+The integrals are trapezoid sums, one matrix product with the weights of the
+grid for a block of times. The histories are the solution dataset of the .h5
+(DF) and the files of name_out (BDNK) of the runs in DFAndBDNK and
+figure12_data. They are read in blocks of about reducebytes bytes (whole chunks
+of solution, a number of lines of the text files), so the memory used does not
+depend on the length of the history.
+
+The time series are written to observablesfile, one group per run and source,
+with the stamps of the files they come from, so that writeobservables only
+reduces the runs which changed. drifttable reports the largest relative
+change of E and P (and any decrease of S) of every run, up to the first time
+at which they are not finite (the run blew up). The script exits with 1 if a
+run blew up or drifted more than the threshold:
+
+    python observables.py                 # reduces what changed and prints the drifts
+    python observables.py --threshold 1e-4
+"""
+import os
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+
+from dfdata import topdir, cachedir, stamp, touch, isfresh, cachename, loadout
+
+
+# The time series. Can be moved with DFPLOTS_OBSERVABLES
+observablesfile = os.environ.get('DFPLOTS_OBSERVABLES', os.path.join(cachedir, 'observables.h5'))
+
+# Size of the blocks of a history which are reduced at once
+reducebytes = int(os.environ.get('DFPLOTS_REDUCE_BYTES', 32 * 2**20))
+
+# The fields the reductions need, and the observables in the order of the tables
+reducetags = ['Ttt', 'Ttx', 'eps', 'ux']
+observablenames = ['E', 'P', 'S', 'Tttmax', 'xpeak', 'Tttmin', 'epsmax']
+
+# Default relative drift of E and P above which a run is reported
+driftthreshold = 1e-3
+
+
+################################################################################
+def trapezoid(x):
+    """ Returns the weights w such that values @ w is the trapezoid integral over the grid x """
+    dx = np.diff(np.asarray(x, dtype=float))
+    w = np.zeros(len(x))
+    w[:-1] += dx/2
+    w[1:] += dx/2
+    return w
+
+
+def reduceblock(x, w, Ttt, Ttx, eps, ux):
+    """ Returns {observable: values[nt]} for the fields of a block of times, each [nt, nx] """
+    peak = np.argmax(Ttt, axis=1)
+    rows = np.arange(len(Ttt))
+    return {'E': Ttt @ w, 'P': Ttx @ w,
+            'S': (np.maximum(eps, 0.0)**0.75*np.sqrt(1 + ux**2)) @ w,
+            'Tttmax': Ttt[rows, peak], 'xpeak': np.asarray(x)[peak], 'Tttmin': Ttt.min(axis=1),
+            'epsmax': eps.max(axis=1)}
+
+
+def h5blocks(entry):
+    """ Yields (times, {tag: [nt, nx]}) for blocks of the solution of a run, whole chunks at a time """
+    from solution import SolutionView
+    with SolutionView(entry) as view:
+        nt, nx = view.shape[:2]
+        step = view.chunks[0] if view.chunks else 1
+        rows = max(step, reducebytes//(nx*len(reducetags)*8)//step*step)
+        times = view.times
+        yield view.x
+        for lo in range(0, nt, rows):
+            block = view[lo:lo + rows, :, reducetags]
+            yield times[lo:lo + rows], {tag: block[..., k] for k, tag in enumerate(reducetags)}
+
+
+def outblocks(name):
+    """ Yields (times, {tag: [nt, nx]}) for blocks of the rows of name_out/<tag>.txt """
+    x, times = loadout(name, 'x'), np.atleast_1d(loadout(name, 't'))
+    rows = max(1, reducebytes//(len(x)*len(reducetags)*8))
+    yield x
+    filenames = {tag: name + '_out/{}.txt'.format(tag) for tag in reducetags}
+    if all(isfresh(filename, cachename(filename)) for filename in filenames.values()):
+        histories = {tag: loadout(name, tag) for tag in reducetags}
+        for lo in range(0, len(times), rows):
+            yield times[lo:lo + rows], {tag: np.asarray(h[lo:lo + rows]) for tag, h in histories.items()}
+        return
+
+    files = {}
+    try:
+        for tag, filename in filenames.items():
+            touch(filename)
+            files[tag] = open(filename)
+        for lo in range(0, len(times), rows):
+            yield times[lo:lo + rows], {tag: np.loadtxt(list(itertools.islice(f, rows)), ndmin=2)
+                                        for tag, f in files.items()}
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def reducehistory(blocks):
+    """ Reduces the blocks of a history (h5blocks or outblocks). Returns {'t': times, observable: values} """
+    x = next(blocks)
+    w = trapezoid(x)
+    series = {'t': []}
+    for times, fields in blocks:
+        series['t'].append(times)
+        for key, values in reduceblock(x, w, *(fields[tag] for tag in reducetags)).items():
+            series.setdefault(key, []).append(values)
+    return {key: np.concatenate(values) if values else np.zeros(0) for key, values in series.items()}
+
+
+def histories(entry):
+    """ Returns {source: generator of blocks} of the histories of a catalog entry """
+    name = os.path.join(topdir, entry['name'])
+    found = {}
+    if entry.get('h5'):
+        found['DF'] = h5blocks(entry)
+    if entry.get('out') and all(os.path.exists(name + '_out/{}.txt'.format(tag)) for tag in reducetags + ['t']):
+        found['BDNK'] = outblocks(name)
+    return found
+
+
+def historyfiles(entry):
+    """ Returns the files (relative to topdir) the time series of an entry are reduced from """
+    name = entry['name']
+    files = [name + '.h5'] if entry.get('h5') else []
+    return files + ['{}_out/{}.txt'.format(name, tag) for tag in reducetags + ['t', 'x'] if entry.get('out')
+                    and os.path.exists(os.path.join(topdir, '{}_out/{}.txt'.format(name, tag)))]
+
+
+def historystamps(entry):
+    return json.dumps({f: stamp(os.path.join(topdir, f)) for f in historyfiles(entry)}, sort_keys=True)
+
+
+################################################################################
+def writeobservables(filename=None, force=False, verbose=False):
+    """ Reduces the histories of the runs in DFAndBDNK and figure12_data into filename.
+    Returns the names of the runs reduced; the others are up to date (unless force).
+    The time series of runs which are no longer in the catalog are removed.
+    """
+    import h5py as h5
+    from catalog import findruns, dfdirs
+
+    filename = filename or observablesfile
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    entries = sorted(findruns(source=dfdirs), key=lambda e: e['name'])
+    names = set(e['name'] for e in entries)
+    reduced = []
+    with h5.File(filename, 'a') as file:
+        stored = []
+        file.visititems(lambda name, obj: stored.append(name) if 'stamps' in obj.attrs else None)
+        for name in stored:
+            if name not in names:
+                del file[name]
+        for entry in entries:
+            group = file.get(entry['name'])
+            stamps = historystamps(entry)
+            if not force and group is not None and group.attrs.get('stamps') == stamps:
+                continue
+            if group is not None:
+                del file[entry['name']]
+            group = file.create_group(entry['name'])
+            for source, blocks in histories(entry).items():
+                for key, values in reducehistory(blocks).items():
+                    group.create_dataset('{}/{}'.format(source, key), data=values)
+            for key in ('testcase', 'fourpietabys', 'source'):
+                group.attrs[key] = entry[key]
+            # Written last, so that a run whose reduction was interrupted is reduced again
+            group.attrs['stamps'] = stamps
+            reduced.append(entry['name'])
+            if verbose:
+                print('reduced', entry['name'])
+    return reduced
+
+
+def readobservables(name, source='DF', filename=None):
+    """ Returns {'t': times, observable: values} of a run (a catalog entry or its name) """
+    import h5py as h5
+    name = name['name'] if isinstance(name, dict) else name
+    with h5.File(filename or observablesfile, 'r') as file:
+        return {key: dataset[()] for key, dataset in file[name][source].items()}
+
+
+def drift(series):
+    """ Returns the largest changes of E and P relative to E at the first time, and of S relative to S there.
+
+    The entropy drift is the largest decrease, since the entropy may only grow.
+    The drifts are measured up to the first time at which an observable is
+    not finite, which is returned as blowup (None if there is none).
+    """
+    finite = np.isfinite(series['E']) & np.isfinite(series['P']) & np.isfinite(series['S'])
+    n = len(finite) if finite.all() else int(np.argmin(finite))
+    E, P, S = series['E'][:n], series['P'][:n], series['S'][:n]
+    if n == 0:
+        return {'E': np.nan, 'P': np.nan, 'S': np.nan, 'dissipation': np.nan, 'blowup': float(series['t'][0])}
+    return {'E': float(np.max(abs(E - E[0]))/abs(E[0])), 'P': float(np.max(abs(P - P[0]))/abs(E[0])),
+            'S': float(max(0.0, -np.min(np.diff(S), initial=0.0))/abs(S[0])), 'dissipation': float(S[-1]/S[0] - 1),
+            'blowup': None if n == len(finite) else float(series['t'][n])}
+
+
+def isdrifting(row, threshold=driftthreshold):
+    """ True if a row of drifttable blew up or drifted more than threshold """
+    return row['blowup'] is not None or max(row['E'], row['P'], row['S']) > threshold
+
+
+def drifttable(filename=None):
+    """ Returns the list of rows {run, source, E, P, S, dissipation, blowup} of every time series in filename """
+    import h5py as h5
+    table = []
+    with h5.File(filename or observablesfile, 'r') as file:
+        names = []
+        file.visititems(lambda name, obj: names.append(name) if 'stamps' in obj.attrs else None)
+        for name in sorted(names):
+            for source in file[name]:
+                series = {key: dataset[()] for key, dataset in file[name][source].items()}
+                if len(series['t']):
+                    table.append(dict(run=name, source=source, **drift(series)))
+    return table
+
+
+def formatdrifts(table, threshold=driftthreshold):
+    """ Returns the drift table as text, with the rows which blew up or drifted above threshold marked """
+    lines = ['{:>10s} {:>10s} {:>10s} {:>12s}  {}'.format('E', 'P', 'S', 'dissipation', 'run')]
+    for row in table:
+        flag = ''
+        if row['blowup'] is not None:
+            flag = ' <-- not finite from t = {:g}'.format(row['blowup'])
+        elif isdrifting(row, threshold):
+            flag = ' <-- drift'
+        lines.append('{:10.2e} {:10.2e} {:10.2e} {:12.4f}  {} ({}){}'.format(
+            row['E'], row['P'], row['S'], row['dissipation'], row['run'], row['source'], flag))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time series of the conserved charges of every run, and their drifts')
+    parser.add_argument('-o', '--output', default=observablesfile, help='the time series (default %(default)s)')
+    parser.add_argument('-f', '--force', action='store_true', help='reduce every run even if it is unchanged')
+    parser.add_argument('--threshold', type=float, default=driftthreshold,
+                        help='relative drift of E, P or S above which a run is reported')
+    args = parser.parse_args()
+
+    writeobservables(args.output, args.force, verbose=True)
+    table = drifttable(args.output)
+    print(formatdrifts(table, args.threshold))
+    sys.exit(1 if any(isdrifting(r, args.threshold) for r in table) else 0)
@@ -1,9 +1,11 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import scipy.special as sp
-import h5py as h5
-import json
-import scienceplots
+from dfdata import loadekt, ektfile, ektlabel, loadtxtcached, getDFfields, memoize, memoreport
+from catalog import runname
+from render import setmode
+from freestream import freerun
+# Translation between lambda and eta/s
+from rta import etabys_of_lambdaekt
 import matplotlib.colors as mcolors
 from matplotlib.legend_handler import HandlerTuple
 
@@ -26,23 +28,26 @@ class HandlerDoubleLine(HandlerLine2D):
 
 
 
-# Set parameters to make it look like gnuplot
-plt.style.use(['science', 'nature'])
+def setstyle():
+    """ Sets the matplotlib style of the figures in this file. dfplots.py calls this before every figure """
+    import scienceplots  # registers the 'science' styles
+    plt.style.use(['science', 'nature'])
 
-plt.rcParams['axes.prop_cycle'] = plt.cycler('color', ['#0085CA', '#008F00', '#FF9500', '#FF2C00', '#845B97', '#474747', '#9e9e9e', mcolors.CSS4_COLORS["salmon"]])
+    plt.rcParams['axes.prop_cycle'] = plt.cycler('color', ['#0085CA', '#008F00', '#FF9500', '#FF2C00', '#845B97', '#474747', '#9e9e9e', mcolors.CSS4_COLORS["salmon"]])
 
-plt.rcParams['font.size'] = 8
-plt.rcParams['xtick.minor.visible'] = False
-plt.rcParams['ytick.minor.visible'] = False
-plt.rcParams['axes.linewidth'] = 0.5
-plt.rcParams['axes.labelsize'] =  8
-plt.rcParams['axes.labelsize'] =  8
-plt.rcParams['legend.fontsize'] = 8
-plt.rcParams['xtick.labelsize'] = 8
-plt.rcParams['ytick.labelsize'] = 8
+    plt.rcParams['font.size'] = 8
+    plt.rcParams['xtick.minor.visible'] = False
+    plt.rcParams['ytick.minor.visible'] = False
+    plt.rcParams['axes.linewidth'] = 0.5
+    plt.rcParams['axes.labelsize'] =  8
+    plt.rcParams['axes.labelsize'] =  8
+    plt.rcParams['legend.fontsize'] = 8
+    plt.rcParams['xtick.labelsize'] = 8
+    plt.rcParams['ytick.labelsize'] = 8
 
 
 ################################################################################
+@memoize
 def getEKTdata(lambdaekt, testcase='test1', tag='Ttt'):
     """ Returns the EKT data. The output is 
 
@@ -53,28 +58,23 @@ def getEKTdata(lambdaekt, testcase='test1', tag='Ttt'):
     lambdaekt should be one of 20,10,5 as is listed in list_lambdaekt
     """
 
-    Nz=150
     nug=16
 
     variables = {'Ttt':8, 'Ttx':11}
 
-    EKTdata=np.loadtxt("./new_EKT/%s_L%d_gluon_Tmunu_vs_time.out" % (testcase, lambdaekt))
-    nx,ny = EKTdata.shape
-
-    #print(nx,ny)
-    EKTdata.shape=(nx//Nz,Nz,ny)
-    #print(EKTdata.shape)
+    # Only the final time block is read. Nz is worked out from the file
     sl=-1
-    xekt = EKTdata[0,:,18] 
+    xekt, EKTdata = loadekt(ektfile(testcase, lambdaekt), sl)
 
 
     # Get Either the  Ttt component or Ttx component
-    Tttekt = nug*EKTdata[sl,:,variables[tag]]
+    Tttekt = nug*EKTdata[:,variables[tag]]
 
     return xekt, Tttekt
 
 
 ################################################################################
+@memoize
 def getMUSICdata(visMUSIC, testcase='test1', tag='Ttt', tfinal=50, shear_relax_factor='5'):
     """ Returns the MUSIC data. The output is 
 
@@ -89,7 +89,7 @@ def getMUSICdata(visMUSIC, testcase='test1', tag='Ttt', tfinal=50, shear_relax_f
 
     filename='{}_tfinal_{}.dat'.format(visMUSIC, tfinal)
     foldername="./music_data/shear_relax_%s/%s/" % (shear_relax_factor, testcase)
-    MUSICdata=np.loadtxt(foldername + filename, skiprows=1)
+    MUSICdata=loadtxtcached(foldername + filename, skiprows=1)
     nx,ny = MUSICdata.shape
     xmusic = MUSICdata[:,1] 
 
@@ -107,9 +107,6 @@ testcases = { 'test1' :
                  {'const': 0.06 , 'amplitude': 9.6 , 'width':  25.0, 'finaltime': 50.0, }, 
              }
 
-# Translation between lambda and eta/s
-etabys_of_lambdaekt={20:0.180, 10:0.513, 5:1.48}
-
 # List of available lambda
 list_lambdaekt=[20, 10, 5]
 
@@ -118,13 +115,20 @@ list_etabys=[0.180, 0.513, 1.48]
 
 
 # this returns the final names for the kinetic theory tests and is a helper for getdfdata
+# The run is looked up in the catalog of DFAndBDNK so that 0 and 0.0 find the same files
 def getnames(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width):
-    s='DFAndBDNK/nbys_{}_d_{}_A_{}_w_{}'.format(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width)
-    return './' + s.replace('.', 'd')
+    return runname(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width, source='DFAndBDNK')
+
+
+def getDFname(lambdaekt, testcase='test1'):
+    """ Returns the file name of the density frame run which is compared to kinetic theory at coupling lambdaekt """
+    params = testcases[testcase]
+    return getnames(4*np.pi*etabys_of_lambdaekt[lambdaekt], params['const'], params['amplitude'], params['width'])
 
 
 
-def getDFdata(lambdaekt,testcase='test1', tag='Ttt', fourpietabys_in=None):
+@memoize
+def getDFdata(lambdaekt,testcase='test1', tag='Ttt', fourpietabys_in=None, time_index=-1):
 
     """  Returns the density frame and BDNK data for a given run 
 
@@ -132,56 +136,28 @@ def getDFdata(lambdaekt,testcase='test1', tag='Ttt', fourpietabys_in=None):
 
 
     The info is an associative array containing the parameters of the run. If tag  can be 'Ttt' , 'Ttx', 'eps', or 'ux'
-    """
-
-    fourpietabys = 4*np.pi*etabys_of_lambdaekt[lambdaekt]
-
-    variables = {'Ttt':0, 'Ttx':1, 'eps':2, 'ux':3 }  
-    params = testcases[testcase]
-
-    name = getnames(fourpietabys, params['const'], params['amplitude'] , params['width'])
-    name0 = getnames(0.0, params['const'], params['amplitude'], params['width'])
 
-    data = json.load(open(name + '.json'))
-
-    with h5.File(name + '.h5', 'r') as file:
-        finaldata = file['finaldata'][:,variables[tag]]
-
-    try :
-        with h5.File(name0 + '.h5', 'r') as file:
-            finaldata_ideal = file['solution'][-1,:,variables[tag]]
-    except:
-        name0 = getnames(0, gaussian_const, gaussian_amplitude, gaussian_width)
-        with h5.File(name0 + '.h5', 'r') as file:
-            finaldata_ideal = file['finaldata'][:,variables[tag]]   
-            
-    with h5.File(name0 + '.h5', 'r') as file:
-        finaldata_ideal = file['finaldata'][:,variables[tag]]
+    time_index selects the printed time step (the row of name_out/<tag>.txt and of
+    solution) which is returned. The default -1 is the final time.
+    """
 
-    solverdata = np.loadtxt(name + '_out/{}.txt'.format(tag)) 
-    x = np.loadtxt(name +'_out/x.txt') 
+    x, df, bdnk, ideal, data = getDFfields(getDFname(lambdaekt, testcase), [tag], time_index)
 
-    return x, finaldata, solverdata[-1,:], finaldata_ideal, data
+    return x, df[tag], bdnk[tag], ideal[tag], data
 
 
 ################################################################################
-def freefunction(testcase='test1'):
+def freefunction(run):
     """ Returns for the free theory 
 
         x[:], Ttt[:], Ttx[:]
 
+    free streamed to the final time of run from its initial data, on its grid
     """
 
-    x=np.linspace(-75.1,75.1,500)
-    delta=testcases[testcase]['const']
-    A=testcases[testcase]['amplitude'] 
-    w=np.sqrt(testcases[testcase]['width'])
-    tc=testcases[testcase]['finaltime']
+    x, Ttt, Ttx = freerun(run)
 
-    analytic=delta+np.sqrt(np.pi)/2*A*w/(2*tc)*(sp.erf((x+tc)/w)-sp.erf((x-tc)/w))
-    analyticflux= A*w/(4*tc**2)*( w*( np.exp(-(tc+x)**2/w**2  ) - np.exp(-(tc-x)**2/w**2) ) +   np.sqrt(np.pi)*x*(sp.erf((x+tc)/w)-sp.erf((x-tc)/w))  )
-
-    return  x, analytic, analyticflux
+    return  x, Ttt[0], Ttx[0]
 
 
 #########################################################################
@@ -254,7 +230,7 @@ def plotStress(case='DF', lambdaekt=20):
     # Get the MUSIC data
     xmusic, Tttmusic  = getMUSICdata(et)
     # Get Free streaming data
-    xfree, freeTtt, freeTtx = freefunction()
+    xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt))
 
 
     if case == 'DF':
@@ -264,7 +240,7 @@ def plotStress(case='DF', lambdaekt=20):
     else:
         ax1.plot(xmusic, Tttmusic, "C0", linewidth=1.2, label='MUSIC') 
 
-    ax1.plot(xekt, Tttekt, "C3", linestyle=(0,(3,2)), linewidth=1.2, label='QCD kinetics')
+    ax1.plot(xekt, Tttekt, "C3", linestyle=(0,(3,2)), linewidth=1.2, label=ektlabel())
 
     ax1.plot(x, ideal, "k--", linewidth=0.8, label=r"$\eta/s=0$ and $\infty$") 
     ax1.plot(xfree, freeTtt, "k--", linewidth=0.8)
@@ -320,12 +296,12 @@ def plotKTPlot1(case='DF'):
         xekt, Tttekt  = getEKTdata(lambdaekt)
 
         # Get Free streaming data
-        xfree, freeTtt, freeTtx = freefunction()
+        xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt))
 
 
         # For the first plot add the label
         if i == 0: 
-            line1, = ax1.plot(xekt, Tttekt, "C3", linewidth=1.3, linestyle="--", label='QCD kinetics')
+            line1, = ax1.plot(xekt, Tttekt, "C3", linewidth=1.3, linestyle="--", label=ektlabel())
         else:
             line2, = ax1.plot(xekt, Tttekt, "C2", linewidth=1.3, linestyle="--")
 
@@ -334,7 +310,7 @@ def plotKTPlot1(case='DF'):
     ax1.set_ylabel(r'$T^{tt}$')
 
     # # Get Free streaming data
-    # xfree, freeTtt, freeTtx = freefunction()
+    # xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt))
     # ax1.plot(xfree, freeTtt, "k--", linewidth=0.5, label="free streaming") 
 
     ax1.annotate(r'$4\pi\eta/s$={:.1f} and ${:.1f}$'.format(4.0*np.pi*list_etabys[0], 4.0*np.pi*list_etabys[1]), (0.85,0.25), xycoords='figure fraction', ha='right',bbox=dict(alpha=0.8,facecolor='white',edgecolor='white'))
@@ -364,7 +340,7 @@ def plotKTPlot1b(case='DF'):
     x, df, bdnk, ideal, data = getDFdata(lambdaekt)
 
     # Get Free streaming data
-    xfree, freeTtt, freeTtx = freefunction()
+    xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt))
 
     # Get the MUSIC data
     xmusic, Tttmusic  = getMUSICdata(list_etabys[i])
@@ -374,7 +350,7 @@ def plotKTPlot1b(case='DF'):
     elif case == 'MUSIC':
         ax1.plot(xmusic, Tttmusic, "C1", linewidth=1.3, label='MUSIC') 
 
-    ax1.plot(xekt, Tttekt, "C4" , linewidth=1.3, linestyle="--", label='QCD kinetics')
+    ax1.plot(xekt, Tttekt, "C4" , linewidth=1.3, linestyle="--", label=ektlabel())
 
     ax1.plot(xfree, freeTtt, "k:", linewidth=0.8, label="free streaming") 
 
@@ -424,12 +400,12 @@ def plotKTPlot2(case='DF'):
         xekt, Tttekt  = getEKTdata(lambdaekt, testcase='test2')
 
         # Get Free streaming data
-        xfree, freeTtt, freeTtx = freefunction(testcase='test2')
+        xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt, 'test2'))
 
 
         # For the first plot add the label
         if i == 0: 
-            line1, = ax1.plot(xekt, Tttekt, "C3", linewidth=1.3, linestyle="--", label='QCD kinetics')
+            line1, = ax1.plot(xekt, Tttekt, "C3", linewidth=1.3, linestyle="--", label=ektlabel())
         else:
             ax1.plot(xekt, Tttekt, "C2", linewidth=1.3, linestyle="--")
 
@@ -438,7 +414,7 @@ def plotKTPlot2(case='DF'):
     ax1.set_ylabel(r'$T^{tt}$')
 
     # # Get Free streaming data
-    # xfree, freeTtt, freeTtx = freefunction()
+    # xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt))
     # ax1.plot(xfree, freeTtt, "k--", linewidth=0.5, label="free streaming") 
 
     ax1.annotate(r'$4\pi\eta/s$={:.1f} and ${:.1f}$'.format(4.0*np.pi*list_etabys[0], 4.0*np.pi*list_etabys[1]), (0.85,0.80), xycoords='figure fraction', ha='right',bbox=dict(alpha=0.8,facecolor='white',edgecolor='white'))
@@ -466,7 +442,7 @@ def plotKTPlot2b(case='DF'):
     x, df, bdnk, ideal, data = getDFdata(lambdaekt ,  testcase='test2')
 
     # Get Free streaming data
-    xfree, freeTtt, freeTtx = freefunction(testcase='test2')
+    xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt, 'test2'))
 
     # Get the MUSIC data
     xmusic, Tttmusic  = getMUSICdata(list_etabys[i], testcase='test2')
@@ -476,7 +452,7 @@ def plotKTPlot2b(case='DF'):
     elif case == 'MUSIC':
         ax1.plot(xmusic, Tttmusic, "C1", linewidth=1.3, label='MUSIC') 
 
-    ax1.plot(xekt, Tttekt, "C4" , linewidth=1.3, linestyle="--", label='QCD kinetics')
+    ax1.plot(xekt, Tttekt, "C4" , linewidth=1.3, linestyle="--", label=ektlabel())
 
     ax1.plot(xfree, freeTtt, "k:", linewidth=0.80, label="free streaming") 
 
@@ -523,8 +499,7 @@ def plotKTOnlyPlot2(case='DF',figname='KineticOnlyT2.pdf'):
         x, df, bdnk, ideal, data = getDFdata(lambdaekt, testcase='test2')
 
         # Get Free streaming data
-        xfree, freeTtt, freeTtx = freefunction(
-            testcase='test2')
+        xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt, 'test2'))
 
         #ax1.plot(xekt, Tttekt,'o', markersize=2.0, markerfacecolor='none', markeredgecolor=colors[i], markeredgewidth=0.5, linewidth=0.5) 
 
@@ -541,7 +516,7 @@ def plotKTOnlyPlot2(case='DF',figname='KineticOnlyT2.pdf'):
     ax1.plot(xfree, freeTtt, "k:", linewidth=0.80, label=r"free streaming") 
     ax1.set_xlabel(r'$x$')
     ax1.set_ylabel(r'$T^{tt}$')
-    ax1.legend(loc="upper left",fontsize=8, ncols=2,alignment='left',  title="QCD kinetics")
+    ax1.legend(loc="upper left",fontsize=8, ncols=2,alignment='left',  title=ektlabel())
 
     #ax1.annotate("EKT\ntest 1", (0.87,0.8), ha='right', xycoords='figure fraction')
 
@@ -580,7 +555,7 @@ def plotKTOnlyPlot1(case='DF',figname='KineticOnlyT1.pdf'):
         x, df, bdnk, ideal, data = getDFdata(lambdaekt, testcase='test1')
 
         # Get Free streaming data
-        xfree, freeTtt, freeTtx = freefunction()
+        xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt))
 
         #ax1.plot(xekt, Tttekt,'o', markersize=2.0, markerfacecolor='none', markeredgecolor=colors[i], markeredgewidth=0.5, linewidth=0.5) 
 
@@ -598,7 +573,7 @@ def plotKTOnlyPlot1(case='DF',figname='KineticOnlyT1.pdf'):
     ax1.set_ylabel(r'$T^{tt}$')
     #ax1.annotate(r'EKT', (0.41,0.38), xycoords='figure fraction', ha='right',bbox=dict(alpha=0.8,facecolor='white',edgecolor='white'))
     #ax1.annotate(r'QCD kinetics', (0.04,0.95), xycoords='axes fraction', ha='left',va='top')
-    legendleft = ax1.legend(handles=[],loc="upper left", alignment='left', title = r'QCD kinetics')
+    legendleft = ax1.legend(handles=[],loc="upper left", alignment='left', title = ektlabel())
     ax1.add_artist(legendleft)
     ax1.legend(loc="lower left",fontsize=8, ncol=2)
 
@@ -642,8 +617,9 @@ def plotKTOnlyPlotM(case='test1'):
         xekt, Tttekt = getEKTdata(lambdaekt, testcase=case,tag='Ttt')
         xekt, Ttxekt = getEKTdata(lambdaekt, testcase=case,tag='Ttx')
 
-        x, df, bdnk, ideal1, data = getDFdata(lambdaekt, testcase=case, tag='Ttt')
-        x, df, bdnk, ideal2, data = getDFdata(lambdaekt, testcase=case, tag='Ttx')
+        # Ttt and Ttx of the ideal run are read together
+        x, df, bdnk, ideal, data = getDFfields(getDFname(lambdaekt, case), ['Ttt', 'Ttx'])
+        ideal1, ideal2 = ideal['Ttt'], ideal['Ttx']
 
 
         #ax1.plot(xekt, Tttekt,'o', markersize=2.0, markerfacecolor='none', markeredgecolor=colors[i], markeredgewidth=0.5, linewidth=0.5) 
@@ -657,49 +633,52 @@ def plotKTOnlyPlotM(case='test1'):
         # ax1.plot(xekt, Tttekt, color=colors[i], linewidth=1.2, linestyle="--", label=labels[i])
 
     # Get Free streaming data
-    xfree, freeTtt, freeTtx = freefunction(case)
+    xfree, freeTtt, freeTtx = freefunction(getDFname(lambdaekt, case))
     ax1.plot(x, ideal2/ideal1, "k--", linewidth=0.80, label=r"ideal hydro") 
     ax1.plot(xfree, freeTtx/freeTtt, "k:", linewidth=0.80, label=r"free streaming") 
     ax1.set_xlabel(r'$x$')
     ax1.set_ylabel(r'$T^{tx}/T^{tt}$')
     # ax1.annotate(r'QCD kinetics', (0.1,0.9), xycoords='axes fraction', ha='right',bbox=dict(alpha=0.8,facecolor='white',edgecolor='white'))
-    ax1.legend(loc="upper left",fontsize=8, alignment='left', title='QCD kinetics')
+    ax1.legend(loc="upper left",fontsize=8, alignment='left', title=ektlabel())
 
     #ax1.annotate("EKT\ntest 1", (0.87,0.8), ha='right', xycoords='figure fraction')
     fig1.tight_layout() 
     fig1.savefig(figname)
 
-plotKTOnlyPlot1()
-plotKTOnlyPlot2()
-
-plotKTOnlyPlotM('test1')
-plotKTOnlyPlotM('test2')
-# # plotIC()
-# plotStress(lambdaekt=20)
-# plotStress(lambdaekt=10)
-# plotStress(lambdaekt=5)
-#plotStress(case='DF', lambdaekt=20)
-# plotStress(case='DF', lambdaekt=10)
-# plotStress(case='DF', lambdaekt=5)
-# plotStress(case='BDNK', lambdaekt=20)
-# plotStress(case='BDNK', lambdaekt=10)
-# plotStress(case='BDNK', lambdaekt=5)
-# plotStress(case='MUSIC', lambdaekt=20)
-# plotStress(case='MUSIC', lambdaekt=10)
-# plotStress(case='MUSIC', lambdaekt=5)
-
-plotKTPlot1(case='MUSIC')
-plotKTPlot1b(case='MUSIC')
-
-plotKTPlot1(case='DF')
-plotKTPlot1b(case='DF')
-
-plotKTPlot2(case='MUSIC')
-plotKTPlot2b(case='MUSIC')
-
-plotKTPlot2(case='DF')
-plotKTPlot2b(case='DF')
-
-
-
-#plotKTPlot1b(case='DF')
+# Figures made when this file is run. dfplots.py builds the same list
+figures = [
+    (plotKTOnlyPlot1, {}),
+    (plotKTOnlyPlot2, {}),
+
+    (plotKTOnlyPlotM, {'case': 'test1'}),
+    (plotKTOnlyPlotM, {'case': 'test2'}),
+    # (plotStress, {'lambdaekt': 20}),
+    # (plotStress, {'lambdaekt': 10}),
+    # (plotStress, {'lambdaekt': 5}),
+    # (plotStress, {'case': 'BDNK', 'lambdaekt': 20}),
+    # (plotStress, {'case': 'BDNK', 'lambdaekt': 10}),
+    # (plotStress, {'case': 'BDNK', 'lambdaekt': 5}),
+    # (plotStress, {'case': 'MUSIC', 'lambdaekt': 20}),
+    # (plotStress, {'case': 'MUSIC', 'lambdaekt': 10}),
+    # (plotStress, {'case': 'MUSIC', 'lambdaekt': 5}),
+
+    (plotKTPlot1, {'case': 'MUSIC'}),
+    (plotKTPlot1b, {'case': 'MUSIC'}),
+
+    (plotKTPlot1, {'case': 'DF'}),
+    (plotKTPlot1b, {'case': 'DF'}),
+
+    (plotKTPlot2, {'case': 'MUSIC'}),
+    (plotKTPlot2b, {'case': 'MUSIC'}),
+
+    (plotKTPlot2, {'case': 'DF'}),
+    (plotKTPlot2b, {'case': 'DF'}),
+]
+
+if __name__ == '__main__':
+    setstyle()
+    for func, kwargs in figures:
+        setmode()
+        func(**kwargs)
+
+    print(memoreport())
@@ -1,30 +1,33 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import scipy.special as sp
-import h5py as h5
-import json
-import scienceplots
+from dfdata import loadekt, ektfile, ektlabel, getDFfields, memoize, memoreport
+from catalog import runname
+from render import setmode
+from freestream import freerun
 import matplotlib.colors as mcolors
 
 
-# Set parameters to make it look like gnuplot
-plt.style.use(['science', 'nature'])
+def setstyle():
+    """ Sets the matplotlib style of the figures in this file. dfplots.py calls this before every figure """
+    import scienceplots  # registers the 'science' styles
+    plt.style.use(['science', 'nature'])
 
-plt.rcParams['axes.prop_cycle'] = plt.cycler('color', ['#0085CA', '#008F00', '#FF9500', '#FF2C00', '#845B97', '#474747', '#9e9e9e'])
+    plt.rcParams['axes.prop_cycle'] = plt.cycler('color', ['#0085CA', '#008F00', '#FF9500', '#FF2C00', '#845B97', '#474747', '#9e9e9e'])
 
-plt.rcParams['font.size'] = 8
-plt.rcParams['xtick.minor.visible'] = False
-plt.rcParams['ytick.minor.visible'] = False
-plt.rcParams['axes.linewidth'] = 0.5
-plt.rcParams['axes.labelsize'] =  8
-plt.rcParams['axes.labelsize'] =  8
-plt.rcParams['legend.fontsize'] = 8
-plt.rcParams['xtick.labelsize'] = 8
-plt.rcParams['ytick.labelsize'] = 8
+    plt.rcParams['font.size'] = 8
+    plt.rcParams['xtick.minor.visible'] = False
+    plt.rcParams['ytick.minor.visible'] = False
+    plt.rcParams['axes.linewidth'] = 0.5
+    plt.rcParams['axes.labelsize'] =  8
+    plt.rcParams['axes.labelsize'] =  8
+    plt.rcParams['legend.fontsize'] = 8
+    plt.rcParams['xtick.labelsize'] = 8
+    plt.rcParams['ytick.labelsize'] = 8
 
 
 
 ################################################################################
+@memoize
 def getEKTdata(lambdaekt,fourpietabys, tag='Ttt', testcase='test1'):
     """ Returns the EKT data. The output is 
 
@@ -33,48 +36,45 @@ def getEKTdata(lambdaekt,fourpietabys, tag='Ttt', testcase='test1'):
     If tag='Ttx' this function returns  Ttx instead of Ttt
     """
 
-    Nz=150
     nug=16
 
     variables = {'Ttt':8, 'Ttx':11}
 
-    EKTdata=np.loadtxt("./new_EKT/%s_L%d_gluon_Tmunu_vs_time.out" % (testcase, lambdaekt))
-    nx,ny = EKTdata.shape
-    EKTdata.shape=(nx//Nz,Nz,ny)
     sl=-6
-    xekt = EKTdata[0,:,18] 
+    xekt, EKTdata = loadekt(ektfile(testcase, lambdaekt), sl)
 
 
     # Get Either the  Ttt component or Ttx component
-    Tttekt = nug*EKTdata[sl,:,variables[tag]]
+    Tttekt = nug*EKTdata[:,variables[tag]]
     return xekt, Tttekt
 
+@memoize
 def getEKTdata(lambdaekt,fourpietabys, tag='Ttt'):
     """ Returns the EKT data. The output is 
 
     x[:], TttEKT[:]
     """
 
-    Nz=150
     nug=16
 
-    EKTdata=np.loadtxt("./new_EKT/test1_L%d_gluon_Tmunu_vs_time.out" % lambdaekt)
-    nx,ny = EKTdata.shape
-    EKTdata.shape=(nx//Nz,Nz,ny)
     sl=-1
-    xekt = EKTdata[0,:,18] 
-    Tttekt = nug*EKTdata[sl,:,8]
+    xekt, EKTdata = loadekt(ektfile('test1', lambdaekt), sl)
+    Tttekt = nug*EKTdata[:,8]
 
     return xekt, Tttekt
 
 
 ################################################################################
 def getnames(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width):
-    """ Return the filename for a gvien value of the paramaeters. This a helper function used by getDFdata """
-    s='DFAndBDNK/nbys_{}_d_{}_A_{}_w_{}'.format(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width)
-    return './' + s.replace('.', 'd')
+    """ Return the filename for a gvien value of the paramaeters. This a helper function used by getDFdata
 
-def getDFdata(fourpietabys,gaussian_const, gaussian_amplitude, gaussian_width, tag='Ttt'):
+    The run is looked up in the catalog of DFAndBDNK, so 0, 0.0 and 4*pi*eta/s
+    computed in different ways all find the same files.
+    """
+    return runname(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width, source='DFAndBDNK')
+
+@memoize
+def getDFdata(fourpietabys,gaussian_const, gaussian_amplitude, gaussian_width, tag='Ttt', time_index=-1):
 
     """  Returns the density frame and BDNK data for a given run 
 
@@ -83,52 +83,30 @@ def getDFdata(fourpietabys,gaussian_const, gaussian_amplitude, gaussian_width, t
 
 
     The info is an associative array containing the parameters of the run.
+
+    time_index selects the printed time step (the row of name_out/<tag>.txt and of
+    solution) which is returned. The default -1 is the final time.
     """
 
-    variables = {'Ttt':0, 'Ttx':1, 'eps':2, 'ux':3 } 
     name = getnames(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width)
-    name0 = getnames(0.0, gaussian_const, gaussian_amplitude, gaussian_width)
-
-    print(name, name0)
-    data = json.load(open(name + '.json'))
 
-    with h5.File(name + '.h5', 'r') as file:
-        finaldata = file['finaldata'][:,variables[tag]]
+    print(name)
+    x, df, bdnk, ideal, data = getDFfields(name, [tag], time_index)
 
-    try :
-        with h5.File(name0 + '.h5', 'r') as file:
-            finaldata_ideal = file['solution'][-1,:,variables[tag]]
-    except:
-        name0 = getnames(0, gaussian_const, gaussian_amplitude, gaussian_width)
-        with h5.File(name0 + '.h5', 'r') as file:
-            finaldata_ideal = file['finaldata'][:,variables[tag]]   
-            
-    with h5.File(name0 + '.h5', 'r') as file:
-        finaldata_ideal = file['finaldata'][:,variables[tag]]
-
-    solverdata = np.loadtxt(name + '_out/{}.txt'.format(tag)) 
-    x = np.loadtxt(name +'_out/x.txt') 
-
-    return x, finaldata, solverdata[-1,:], finaldata_ideal, data
+    return x, df[tag], bdnk[tag], ideal[tag], data
 
 
 ################################################################################
-def freefunction(finaltime, gaussian_const = 0.12, gaussian_amplitude = 0.48, gaussian_width = 25.0):
+def freefunction(run, finaltime):
     """ Returns for the free theory 
 
         x[:], Ttt[:], Ttx[:]
 
+    free streamed to finaltime from the initial data of run, on its grid
     """
-    x=np.linspace(-75.1,75.1,500)
-    delta=gaussian_const
-    A=gaussian_amplitude
-    w=np.sqrt(gaussian_width)
+    x, Ttt, Ttx = freerun(run, finaltime)
 
-    tc=finaltime
-    analytic=delta+np.sqrt(np.pi)/2*A*w/(2*tc)*(sp.erf((x+tc)/w)-sp.erf((x-tc)/w))
-    analyticflux= A*w/(4*tc**2)*( w*( np.exp(-(tc+x)**2/w**2  ) - np.exp(-(tc-x)**2/w**2) ) +   np.sqrt(np.pi)*x*(sp.erf((x+tc)/w)-sp.erf((x-tc)/w))  )
-
-    return  x, analytic, analyticflux
+    return  x, Ttt[0], Ttx[0]
 
 
 ########################################################################
@@ -151,7 +129,7 @@ def plotIC(case='DF', lambda_case=0):
 
     i = lambda_case
 
-    xfree0, freeTtt0, freeTtx0 = freefunction(0.000001)
+    xfree0, freeTtt0, freeTtx0 = freefunction(getnames(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width), 0.0)
 
 
     if case == 'DF':
@@ -207,7 +185,7 @@ def plotStress(case='DF', lambda_case=0):
     x, df, bdnk, ideal, data = getDFdata(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width)
 
     # Get Free streaming data
-    xfree, freeTtt, freeTtx = freefunction(finaltime)
+    xfree, freeTtt, freeTtx = freefunction(getnames(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width), finaltime)
 
 
     if case == 'DF':
@@ -215,7 +193,7 @@ def plotStress(case='DF', lambda_case=0):
     else:
         ax1.plot(x, bdnk, "C0", linewidth=1.2, label='BDNK') 
 
-    ax1.plot(xekt, Tttekt, "C3", linestyle=(0,(3,2)), linewidth=1.2, label='QCD kinetics')
+    ax1.plot(xekt, Tttekt, "C3", linestyle=(0,(3,2)), linewidth=1.2, label=ektlabel())
 
     ax1.plot(x, ideal, "k--", linewidth=0.5, label=r"$\eta/s=0$ and $\infty$") 
     ax1.plot(xfree, freeTtt, "k--", linewidth=0.5)
@@ -261,7 +239,7 @@ def plotKTPlot1(case='DF'):
         x, df, bdnk, ideal, data = getDFdata(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width)
 
         # Get Free streaming data
-        xfree, freeTtt, freeTtx = freefunction(finaltime)
+        xfree, freeTtt, freeTtx = freefunction(getnames(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width), finaltime)
 
 
         # For the first plot add the label
@@ -271,7 +249,7 @@ def plotKTPlot1(case='DF'):
             else:
                 ax1.plot(x, bdnk, "C0", linewidth=1.2, label='BDNK') 
 
-            ax1.plot(xekt, Tttekt, "C3", linewidth=1.2, linestyle="--", label='QCD kinetics')
+            ax1.plot(xekt, Tttekt, "C3", linewidth=1.2, linestyle="--", label=ektlabel())
         else:
             if case == 'DF':
                 ax1.plot(x, df, "C0", linewidth=1.2) 
@@ -319,7 +297,7 @@ def plotKTPlot1b(case='DF'):
     x, df, bdnk, ideal, data = getDFdata(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width)
 
     # Get Free streaming data
-    xfree, freeTtt, freeTtx = freefunction(finaltime)
+    xfree, freeTtt, freeTtx = freefunction(getnames(etas4pi[i], gaussian_const, gaussian_amplitude, gaussian_width), finaltime)
 
 
     if case == 'DF':
@@ -327,7 +305,7 @@ def plotKTPlot1b(case='DF'):
     else:
         ax1.plot(x, bdnk, "C0", linewidth=1.2, label='BDNK') 
 
-    ax1.plot(xekt, Tttekt, "C3", linewidth=1.2, linestyle="--", label='QCD kinetics')
+    ax1.plot(xekt, Tttekt, "C3", linewidth=1.2, linestyle="--", label=ektlabel())
 
     ax1.plot(xfree, freeTtt, "k--", linewidth=0.5, label="free streaming") 
 
@@ -340,14 +318,24 @@ def plotKTPlot1b(case='DF'):
 
     fig1.savefig('KTPlot1b.pdf')
 
-# plotIC()
-# plotStress(lambda_case=0)
-# plotStress(lambda_case=1)
-# plotStress(lambda_case=2)
-# plotStress(case='BDNK', lambda_case=0)
-# plotStress(case='BDNK', lambda_case=1)
-# plotStress(case='BDNK', lambda_case=2)
-
-plotKTPlot1()
-plotKTPlot1b()
+# Figures made when this file is run. dfplots.py builds the same list
+figures = [
+    # (plotIC, {}),
+    # (plotStress, {'lambda_case': 0}),
+    # (plotStress, {'lambda_case': 1}),
+    # (plotStress, {'lambda_case': 2}),
+    # (plotStress, {'case': 'BDNK', 'lambda_case': 0}),
+    # (plotStress, {'case': 'BDNK', 'lambda_case': 1}),
+    # (plotStress, {'case': 'BDNK', 'lambda_case': 2}),
+    (plotKTPlot1, {}),
+    (plotKTPlot1b, {}),
+]
+
+if __name__ == '__main__':
+    setstyle()
+    for func, kwargs in figures:
+        setmode()
+        func(**kwargs)
+
+    print(memoreport())
 
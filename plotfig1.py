@@ -1,22 +1,27 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import scipy.special as sp
-import json
-import h5py as h5
-import scienceplots
-
-plt.style.use(['science', 'nature'])
-plt.rcParams['axes.prop_cycle'] = plt.cycler('color', ['#0085CA',  '#008F00', '#FF9500', '#FF2C00', '#845B97', '#474747', '#9e9e9e'])
-
-plt.rcParams['font.size'] = 9
-plt.rcParams['xtick.minor.visible'] = False
-plt.rcParams['ytick.minor.visible'] = False
-plt.rcParams['axes.linewidth'] = 0.5
-plt.rcParams['axes.labelsize'] =  9
-plt.rcParams['axes.labelsize'] =  9
-plt.rcParams['legend.fontsize'] = 9
-plt.rcParams['xtick.labelsize'] = 9
-plt.rcParams['ytick.labelsize'] = 9
+from dfdata import getDFfields, memoize, memoreport
+from catalog import runname
+from render import setmode
+from freestream import freerun
+
+def setstyle():
+    """ Sets the matplotlib style of the figures in this file. dfplots.py calls this before every figure """
+    import scienceplots  # registers the 'science' styles
+    plt.style.use(['science', 'nature'])
+    plt.rcParams['axes.prop_cycle'] = plt.cycler('color', ['#0085CA',  '#008F00', '#FF9500', '#FF2C00', '#845B97', '#474747', '#9e9e9e'])
+
+    plt.rcParams['font.size'] = 9
+    plt.rcParams['xtick.minor.visible'] = False
+    plt.rcParams['ytick.minor.visible'] = False
+    plt.rcParams['axes.linewidth'] = 0.5
+    plt.rcParams['axes.labelsize'] =  9
+    plt.rcParams['axes.labelsize'] =  9
+    plt.rcParams['legend.fontsize'] = 9
+    plt.rcParams['xtick.labelsize'] = 9
+    plt.rcParams['ytick.labelsize'] = 9
+
+
 # axes.labelsize: 7
 # xtick.labelsize: 7
 # ytick.labelsize: 7
@@ -31,38 +36,18 @@ gaussian_amplitude = 8.0
 gaussian_width = 25.0
 
 def getnames(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width):
-    """ Helper function for getdata """
-    s='figure12_data/nbys_{}_d_{}_A_{}_w_{}'.format(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width)
-    return s.replace('.', 'd')
+    """ Helper function for getdata. The run is looked up in the catalog of figure12_data """
+    return runname(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width, source='figure12_data')
 
-def getdata(fourpietabys,gaussian_const, gaussian_amplitude, gaussian_width, tag='Ttt'):
+@memoize
+def getdata(fourpietabys,gaussian_const, gaussian_amplitude, gaussian_width, tag='Ttt', time_index=-1):
 
-    variables = {'Ttt':0, 'Ttx':1, 'eps':2, 'ux':3 } 
     name = getnames(fourpietabys, gaussian_const, gaussian_amplitude, gaussian_width)
-    name0 = getnames(0.0, gaussian_const, gaussian_amplitude, gaussian_width)
-
-    data = json.load(open(name + '.json'))
 
-    with h5.File(name + '.h5', 'r') as file:
-        finaldata = file['finaldata'][:,variables[tag]]
+    print(name + '.h5', '\n', name + '.json', '\n', name + '_out')
+    x, df, bdnk, ideal, data = getDFfields(name, [tag], time_index)
 
-    try :
-        with h5.File(name0 + '.h5', 'r') as file:
-            finaldata_ideal = file['finaldata'][:,variables[tag]]
- 
-    except:
-        name0 = getnames(0, gaussian_const, gaussian_amplitude, gaussian_width)
-        with h5.File(name0 + '.h5', 'r') as file:
-            finaldata_ideal = file['finaldata'][:,variables[tag]]   
-            
-    # with h5.File(name0 + '.h5', 'r') as file:
-    #     finaldata_ideal = file['finaldata'][:,variables[tag]]
-
-    print(name + '.h5', '\n', name + '.json', '\n' , name0 + '.h5',  '\n', name + '_out')
-    solverdata = np.loadtxt(name + '_out/{}.txt'.format(tag)) 
-    x = np.loadtxt(name +'_out/x.txt') 
-
-    return x, finaldata, solverdata[-1,:], finaldata_ideal, data
+    return x, df[tag], bdnk[tag], ideal[tag], data
 
 ########################################################################
 def plot(gaussian_const, gaussian_amplitude, gaussian_width):
@@ -152,7 +137,7 @@ def plot1b():
     gaussian_width = 25.0
 
     x, df, bdnk, ideal, data = getdata(20.0, gaussian_const, gaussian_amplitude, gaussian_width)
-    xfree, Tttfree, Ttxfree = freefunction(47.5, gaussian_const, gaussian_amplitude, gaussian_width)
+    xfree, Tttfree, Ttxfree = freefunction(getnames(20.0, gaussian_const, gaussian_amplitude, gaussian_width), 47.5)
 
     fig, axs = plt.subplots(1,1, figure=(10,10))
     #fig.suptitle('density frame vs BDNK $\eta/s = {}/4\pi$'.format(data['eta_over_s']*4.0*np.pi))
@@ -201,22 +186,16 @@ def plot1bPresentation():
 
 
 ########################################################################
-def freefunction(finaltime, gaussian_const = 0.12, gaussian_amplitude = 0.48, gaussian_width = 25.0):
+def freefunction(run, finaltime):
     """ Returns for the free theory
 
         x[:], Ttt[:], Ttx[:]
 
+    free streamed to finaltime from the initial data of run, on its grid
     """
-    x=np.linspace(-75.1,75.1,500)
-    delta=gaussian_const
-    A=gaussian_amplitude
-    w=np.sqrt(gaussian_width)
-
-    tc=finaltime
-    analytic=delta+np.sqrt(np.pi)/2*A*w/(2*tc)*(sp.erf((x+tc)/w)-sp.erf((x-tc)/w))
-    analyticflux= A*w/(4*tc**2)*( w*( np.exp(-(tc+x)**2/w**2  ) - np.exp(-(tc-x)**2/w**2) ) +   np.sqrt(np.pi)*x*(sp.erf((x+tc)/w)-sp.erf((x-tc)/w))  )
+    x, Ttt, Ttx = freerun(run, finaltime)
 
-    return  x, analytic, analyticflux
+    return  x, Ttt[0], Ttx[0]
 
 ########################################################################
 def plot2():
@@ -363,13 +342,24 @@ def plot2d():
     #plt.savefig('smoothtest2d.pdf')
 
 
-#plot1Presentation()
-#plot1bPresentation()
-plot1()
-plot1b()
-plot2()
-plot2b()
-plot2c()
-#plot2d()
+# Figures made when this file is run. dfplots.py builds the same list
+figures = [
+    # (plot1Presentation, {}),
+    # (plot1bPresentation, {}),
+    (plot1, {}),
+    (plot1b, {}),
+    (plot2, {}),
+    (plot2b, {}),
+    (plot2c, {}),
+    # (plot2d, {}),
+]
+
+if __name__ == '__main__':
+    setstyle()
+    for func, kwargs in figures:
+        setmode()
+        func(**kwargs)
+
+    print(memoreport())
 
 #plot2(gaussian_const, gaussian_amplitude, gaussian_width)
@@ -0,0 +1,268 @@
+""" Draft and publication rendering of the figures.
+
+The figure files are written for publication: the scienceplots styles (and
+make_paper_plot_test*.py) set text.usetex, so every label goes through LaTeX
+and every figure is saved as a PDF. That is slow when all one wants is to look
+at the curves. In draft mode
+
+    text.usetex is off and labels are drawn with mathtext
+    figures are rendered by Agg and saved as low resolution PNGs in draftdir
+    tight_layout does nothing
+
+Draft mode is switched on with the environment variable DFPLOTS_DRAFT=1 (or
+dfplots build --draft) and covers every figure function, since it is applied by
+setmode after the style of a figure file is set, both by dfplots.py and by the
+__main__ blocks of the figure files.
+
+Dense lines can be decimated when they are drawn (see decimate.py), with
+DFPLOTS_DECIMATE=minmax (or lttb, or dfplots build --decimate): a line with more
+points than its axes has display columns keeps only the points which show at
+the resolution of the output, so the size of a PDF and the time to draw it are
+set by the width of the figure and not by NX. DFPLOTS_RASTERIZE=N rasterizes
+(at savefig.dpi) every line which still has more than N points.
+
+When the EKT files are missing the figures are drawn from the RTA stand-in of
+rta.py (see dfdata.ektfile), and a publication figure drawn from it is saved as
+<name>_rta.pdf next to <name>.pdf, so that the PDFs made from the EKT data are
+not overwritten. DFPLOTS_RTA_OVERWRITE=1 (or dfplots build --rta-overwrite)
+saves it under its own name.
+
+In publication mode the TeX strings are cached by matplotlib as dvi files in
+its cache directory, which persists between runs and is shared by all the
+processes. Every string that had to go through LaTeX is added to texfile, and
+warmtex runs LaTeX on the ones which are missing from the cache (for instance
+after matplotlib was upgraded) before the figures are drawn.
+"""
+import os
+import json
+import numpy as np
+
+from dfdata import topdir, cachedir, standins
+
+
+# Directory and resolution of the draft PNGs
+draftdir = os.path.join(topdir, 'draft')
+draftdpi = 72
+
+# Display columns per display unit (pixel, or point for PDF) kept by decimation
+decimatescale = 2.0
+
+# TeX strings (and the font settings they were typeset with) seen in publication mode
+texfile = os.path.join(cachedir, 'texstrings.jsonl')
+
+# rcParams which change the LaTeX source of a TeX string, and so its cache entry
+texparams = ['font.family', 'font.serif', 'font.sans-serif', 'font.cursive', 'font.monospace',
+             'text.latex.preamble']
+
+
+################################################################################
+def isdraft():
+    """ True if the figures are drawn in draft mode """
+    return os.environ.get('DFPLOTS_DRAFT', '') not in ('', '0')
+
+
+def setdraft(draft=True):
+    """ Switches draft mode on or off for this process and the processes it starts """
+    os.environ['DFPLOTS_DRAFT'] = '1' if draft else '0'
+
+
+def decimation():
+    """ The decimation method set by DFPLOTS_DECIMATE ('minmax' or 'lttb'), or None """
+    value = os.environ.get('DFPLOTS_DECIMATE', '')
+    if value in ('', '0'):
+        return None
+    return 'minmax' if value == '1' else value
+
+
+def setdecimation(method):
+    """ Switches decimation to method ('minmax' or 'lttb') or off (None) for this process and the processes it starts """
+    os.environ['DFPLOTS_DECIMATE'] = method or '0'
+
+
+def rasterthreshold():
+    """ Lines with more points than this are rasterized (DFPLOTS_RASTERIZE). 0 means never """
+    return int(os.environ.get('DFPLOTS_RASTERIZE', '') or 0)
+
+
+def setrasterize(npoints):
+    """ Rasterizes lines with more than npoints points, for this process and the processes it starts """
+    os.environ['DFPLOTS_RASTERIZE'] = str(int(npoints or 0))
+
+
+def isrtaoverwrite():
+    """ True if publication figures drawn from the RTA stand-in are saved under their own name (DFPLOTS_RTA_OVERWRITE) """
+    return os.environ.get('DFPLOTS_RTA_OVERWRITE', '') not in ('', '0')
+
+
+def setrtaoverwrite(overwrite=True):
+    """ Saves the figures drawn from the RTA stand-in under their own name, for this process and the processes it starts """
+    os.environ['DFPLOTS_RTA_OVERWRITE'] = '1' if overwrite else '0'
+
+
+def modename():
+    """ Returns the words which describe the render mode, e.g. ['draft', 'decimate=minmax'] """
+    words = ['draft'] if isdraft() else []
+    if decimation():
+        words.append('decimate=' + decimation())
+    if rasterthreshold():
+        words.append('rasterize={}'.format(rasterthreshold()))
+    if isrtaoverwrite():
+        words.append('rta-overwrite')
+    return words
+
+
+def draftname(fname):
+    """ Returns the name of the draft PNG for a figure file name """
+    return os.path.join(draftdir, os.path.splitext(os.path.basename(fname))[0] + '.png')
+
+
+def rtaname(fname):
+    """ Returns the name a publication figure drawn from the RTA stand-in is saved under """
+    stem, ext = os.path.splitext(fname)
+    return stem + '_rta' + ext
+
+
+def setmode():
+    """ Applies draft or publication mode on top of the style of a figure file. Call after setstyle, before every figure """
+    import matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+    from matplotlib.figure import Figure
+    from matplotlib.texmanager import TexManager
+
+    # The stand-ins read by the previous figure
+    standins.clear()
+
+    if not hasattr(Figure, 'publicationsavefig'):
+        Figure.publicationsavefig = Figure.savefig
+        Figure.publicationtightlayout = Figure.tight_layout
+        TexManager.publicationmakedvi = TexManager.make_dvi
+        Line2D.publicationdraw = Line2D.draw
+
+    if isdraft():
+        plt.switch_backend('Agg')
+        matplotlib.rcParams.update({'text.usetex': False, 'mathtext.fontset': 'cm',
+                                    'figure.dpi': draftdpi, 'savefig.dpi': draftdpi,
+                                    'figure.autolayout': False, 'figure.constrained_layout.use': False})
+        Figure.savefig = draftsavefig
+        Figure.tight_layout = lambda self, *args, **kwargs: None
+    else:
+        Figure.savefig = rtasavefig
+        Figure.tight_layout = Figure.publicationtightlayout
+        TexManager.make_dvi = classmethod(recordmakedvi)
+
+    Line2D.draw = decimateddraw if decimation() or rasterthreshold() else Line2D.publicationdraw
+
+    # Stage tracing and the I/O audit wrap the functions set above, so they come last
+    import tracing
+    import ioaudit
+    if tracing.istracing():
+        tracing.instrument()
+    if ioaudit.isauditing():
+        ioaudit.instrument()
+
+
+def draftsavefig(self, fname, **kwargs):
+    """ Figure.savefig in draft mode: writes a low resolution PNG to draftdir instead of fname """
+    if isinstance(fname, (str, os.PathLike)):
+        os.makedirs(draftdir, exist_ok=True)
+        fname = draftname(fname)
+    kwargs.update(format='png', dpi=draftdpi)
+    kwargs.pop('bbox_inches', None)
+    return self.publicationsavefig(fname, **kwargs)
+
+
+def rtasavefig(self, fname, **kwargs):
+    """ Figure.savefig in publication mode: a figure drawn from the RTA stand-in is saved under rtaname(fname) """
+    if isinstance(fname, (str, os.PathLike)) and standins and not isrtaoverwrite():
+        fname = rtaname(os.fspath(fname))
+    return self.publicationsavefig(fname, **kwargs)
+
+
+def decimateddraw(self, renderer):
+    """ Line2D.draw with decimation and rasterization: draws only the points which show at the output resolution """
+    from decimate import decimate
+
+    xy = self.get_xydata()
+    n = len(xy)
+    keep = None
+    method = decimation()
+    if method and self.axes is not None and self.get_marker() in ('None', None, '', ' '):
+        display = self.get_transform().transform(xy)
+        px, py = display[:, 0], display[:, 1]
+        left, right = self.axes.bbox.x0, self.axes.bbox.x1
+        steps = np.diff(px)
+        if n > 2*decimatescale*(right - left) and (np.all(steps >= 0) or np.all(steps <= 0)):
+            if steps[0] <= 0 and np.all(steps <= 0):
+                keep = n - 1 - decimate(px[::-1], py[::-1], left, right, method, decimatescale)[::-1]
+            else:
+                keep = decimate(px, py, left, right, method, decimatescale)
+    if rasterthreshold() and (n if keep is None else len(keep)) > rasterthreshold():
+        self.set_rasterized(True)
+    if keep is None:
+        return self.publicationdraw(renderer)
+
+    x, y = self.get_xdata(orig=True), self.get_ydata(orig=True)
+    self.set_data(xy[keep, 0], xy[keep, 1])
+    try:
+        return self.publicationdraw(renderer)
+    finally:
+        self.set_data(x, y)
+
+
+# Line2D.draw of matplotlib handles rasterization, and so does its replacement
+decimateddraw._supports_rasterization = True
+
+
+def recordmakedvi(cls, tex, fontsize):
+    """ TexManager.make_dvi in publication mode: also adds the strings which had to be typeset to texfile """
+    import matplotlib
+    dvi = cls._get_base_path(tex, fontsize).with_suffix('.dvi')
+    if dvi.exists():
+        return str(dvi)
+    result = cls.publicationmakedvi(tex, fontsize)
+    line = json.dumps([tex, fontsize, {k: matplotlib.rcParams[k] for k in texparams}]) + '\n'
+    os.makedirs(cachedir, exist_ok=True)
+    # A single short append is atomic, so the workers can all write to texfile
+    fd = os.open(texfile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+    return result
+
+
+################################################################################
+def texstrings():
+    """ Returns the distinct (tex, fontsize, params) in texfile """
+    try:
+        with open(texfile) as f:
+            lines = sorted(set(f))
+    except OSError:
+        return []
+    strings = []
+    for line in lines:
+        try:
+            strings.append(json.loads(line))
+        except ValueError:
+            pass
+    return strings
+
+
+def warmtex(strings):
+    """ Runs LaTeX on the strings  (tex, fontsize, params)  which are not in the TeX cache yet. Returns how many """
+    import matplotlib
+    from matplotlib.texmanager import TexManager
+
+    made = 0
+    for tex, fontsize, params in strings:
+        with matplotlib.rc_context(params):
+            if TexManager._get_base_path(tex, fontsize).with_suffix('.dvi').exists():
+                continue
+            try:
+                TexManager.make_dvi(tex, fontsize)
+                made += 1
+            except (RuntimeError, OSError):
+                # The figure which uses the string will report the LaTeX error
+                pass
+    return made
@@ -0,0 +1,194 @@
+""" Kinetic theory in the relaxation time approximation, a stand-in for the EKT runs in new_EKT.
+
+The EKT (QCD kinetics) output is not part of the repository. This solves the
+Boltzmann equation of massless particles in the relaxation time approximation
+(Anderson-Witting) in one dimension, from the Gaussian initial conditions of
+the kinetic theory tests (catalog.testparams), and writes it in the format of
+the EKT files so that getEKTdata reads it unchanged.
+
+The energy weighted distribution F(t, x, v), with v = cos(theta) the velocity
+along x, is normalized so that
+
+    Ttt = 1/2 int dv F,   Ttx = 1/2 int dv v F,   Txx = 1/2 int dv v^2 F
+
+and obeys
+
+    d_t F + v d_x F = -gamma (1 - u v) (F - Feq)/tau,    Feq = e / (gamma (1 - u v))^4
+
+with e and u from Landau matching and tau = 5 (eta/s)/T, T = (e/a)^(1/4) for
+nug = 16 gluon degrees of freedom. lambdaekt is translated to eta/s with
+etabys_of_lambdaekt. The v integrals use Gauss-Legendre nodes, the advection is
+a minmod limited upwind scheme with Heun's method, and the collisions are
+integrated exactly over a time step (Strang splitting). Every step works on the
+whole (v, x) array.
+
+    python rta.py -j 6           # writes all the test cases and lambdas
+"""
+import os
+import sys
+import json
+import argparse
+import concurrent.futures
+import numpy as np
+
+from dfdata import topdir
+from catalog import testparams
+
+
+# Translation between lambda and eta/s (also used by plot_test2.py)
+etabys_of_lambdaekt = {20: 0.180, 10: 0.513, 5: 1.48}
+
+# Gluon degrees of freedom. The EKT files hold T^{mu nu} per degree of freedom
+nug = 16
+
+# e = a T^4
+a = nug*np.pi**2/30
+
+# Columns of the EKT files: time, the ten components of T^{mu nu} (t, x, y, z) from
+# column 8 on, and the position z, which is the x of the solver
+ektcols = 19
+ekt_tcol, ekt_zcol = 0, 18
+ekt_tmunu = {'tt': 8, 'tz': 11, 'xx': 12, 'yy': 15, 'zz': 17}
+
+# Directory of the stand-in files, the numerical parameters, and a version to invalidate old files.
+# The EKT files print a block every 0.5, and the figures count blocks from the end (sl=-6 is t = 47.5)
+rtadir = os.path.join(topdir, 'rta_EKT')
+rtaparams = {'xmin': -100.0, 'xmax': 100.0, 'NX': 513, 'nv': 64, 'cfl': 0.4,
+             'final_time': 50.0, 'dtprint': 0.5}
+rtaversion = 'aw-muscl-strang-1'
+
+
+################################################################################
+def moments(F, v, w):
+    """ Returns Ttt, Ttx, Txx of F[nv, nx] for the Gauss-Legendre nodes v and weights w """
+    return (w[:, None]*F).sum(0)/2, (w[:, None]*v[:, None]*F).sum(0)/2, (w[:, None]*v[:, None]**2*F).sum(0)/2
+
+
+def landau(Ttt, Ttx, Txx):
+    """ Returns the rest frame energy density e and velocity u of T^{mu nu} """
+    u = 2*Ttx/((Ttt + Txx) + np.sqrt(np.maximum((Ttt + Txx)**2 - 4*Ttx**2, 0.0)))
+    return Ttt - Ttx*u, u
+
+
+def collide(F, v, w, etabys, dt):
+    """ Relaxes F towards equilibrium over a time dt, exactly for fixed e and u """
+    e, u = landau(*moments(F, v, w))
+    gamma = 1/np.sqrt(1 - u**2)
+    doppler = gamma*(1 - np.outer(v, u))
+    tau = 5*etabys/(e/a)**0.25
+    Feq = e/doppler**4
+    return Feq + (F - Feq)*np.exp(-doppler*dt/tau)
+
+
+def advect(F, v, dx):
+    """ Returns -v d_x F for F[nv, nx] with minmod limited upwind fluxes. The edges are outflow """
+    W = np.pad(F, [(0, 0), (2, 2)], mode='edge')
+    left, right = W[:, 1:-1] - W[:, :-2], W[:, 2:] - W[:, 1:-1]
+    slopes = np.where(left*right > 0, np.sign(left)*np.minimum(abs(left), abs(right)), 0.0)
+    # Upwind state at the interfaces between the cells j and j+1, j = 1 .. nx+1
+    vv = v[:, None]
+    flux = np.where(vv > 0, vv*(W[:, 1:-2] + slopes[:, :-1]/2), vv*(W[:, 2:-1] - slopes[:, 1:]/2))
+    return -(flux[:, 1:] - flux[:, :-1])/dx
+
+
+def solverta(x, Ttt0, etabys, times, nv=64, cfl=0.4):
+    """ Evolves isotropic initial data Ttt0[nx] on the uniform grid x. The output is
+
+    Ttt[nt, nx], Ttx[nt, nx], Txx[nt, nx]
+
+    at the increasing times in times (starting from t = 0).
+    """
+    x = np.asarray(x, dtype=float)
+    dx = x[1] - x[0]
+    v, w = np.polynomial.legendre.leggauss(nv)
+    F = np.tile(np.asarray(Ttt0, dtype=float), (nv, 1))
+
+    out = []
+    t = 0.0
+    for tout in times:
+        nsteps = int(np.ceil((tout - t)/(cfl*dx)))
+        dt = (tout - t)/nsteps if nsteps else 0.0
+        for step in range(nsteps):
+            F = collide(F, v, w, etabys, dt/2)
+            F1 = F + dt*advect(F, v, dx)
+            F = (F + F1 + dt*advect(F1, v, dx))/2
+            F = collide(F, v, w, etabys, dt/2)
+        t = tout
+        out.append(moments(F, v, w))
+    return tuple(np.array(m) for m in zip(*out))
+
+
+################################################################################
+def rtaname(testcase, lambdaekt):
+    """ Returns the stand-in file for a test case and lambda, named like the EKT files """
+    return os.path.join(rtadir, '{}_L{:d}_gluon_Tmunu_vs_time.out'.format(testcase, lambdaekt))
+
+
+def rtakey(testcase, lambdaekt):
+    """ Everything the content of a stand-in file depends on """
+    return dict(rtaparams, testcase=testcase, etabys=etabys_of_lambdaekt[lambdaekt], version=rtaversion,
+                **testparams[testcase])
+
+
+def writerta(testcase, lambdaekt):
+    """ Solves one test case and writes it to rtaname in the format of the EKT files. Returns the file name """
+    p = rtakey(testcase, lambdaekt)
+    x = np.linspace(p['xmin'], p['xmax'], p['NX'])
+    times = np.arange(0, p['final_time'] + p['dtprint']/2, p['dtprint'])
+    Ttt, Ttx, Txx = solverta(x, p['const'] + p['amplitude']*np.exp(-x**2/p['width']), p['etabys'], times,
+                             p['nv'], p['cfl'])
+
+    data = np.zeros((len(times), len(x), ektcols))
+    data[:, :, ekt_tcol] = times[:, None]
+    data[:, :, ekt_zcol] = x
+    data[:, :, ekt_tmunu['tt']] = Ttt/nug
+    data[:, :, ekt_tmunu['tz']] = Ttx/nug
+    data[:, :, ekt_tmunu['zz']] = Txx/nug
+    # Massless and symmetric in the transverse plane, so Txx = Tyy = (Ttt - Tzz)/2
+    data[:, :, ekt_tmunu['xx']] = data[:, :, ekt_tmunu['yy']] = (Ttt - Txx)/2/nug
+
+    filename = rtaname(testcase, lambdaekt)
+    os.makedirs(rtadir, exist_ok=True)
+    tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    np.savetxt(tmp, data.reshape(-1, ektcols), fmt='%.12e')
+    os.replace(tmp, filename)
+    with open(tmp, 'w') as f:
+        json.dump(p, f)
+    os.replace(tmp, filename + '.json')
+    return filename
+
+
+def isrtacurrent(testcase, lambdaekt):
+    """ True if the stand-in file exists and was written with the current parameters """
+    try:
+        with open(rtaname(testcase, lambdaekt) + '.json') as f:
+            return json.load(f) == rtakey(testcase, lambdaekt) and os.path.exists(rtaname(testcase, lambdaekt))
+    except (OSError, ValueError):
+        return False
+
+
+def rtafile(testcase, lambdaekt):
+    """ Returns the stand-in file for a test case and lambda, solving it first if needed """
+    if not isrtacurrent(testcase, lambdaekt):
+        writerta(testcase, lambdaekt)
+    return rtaname(testcase, lambdaekt)
+
+
+def rtasweep(testcases=('test1', 'test2'), lambdas=(20, 10, 5), nprocs=1, force=False):
+    """ Writes the stand-in files for all the test cases and lambdas on nprocs processes. Returns the file names """
+    jobs = [(testcase, lambdaekt) for testcase in testcases for lambdaekt in lambdas
+            if force or not isrtacurrent(testcase, lambdaekt)]
+    if nprocs == 1:
+        return [writerta(*job) for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nprocs) as pool:
+        return list(pool.map(writerta, *zip(*jobs))) if jobs else []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes the RTA stand-ins for the EKT files to ' + rtadir)
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes (0 means one per core)')
+    parser.add_argument('-f', '--force', action='store_true', help='solve again even if the files are current')
+    args = parser.parse_args()
+    for filename in rtasweep(nprocs=args.jobs if args.jobs > 0 else os.cpu_count(), force=args.force):
+        print(filename)
+    sys.exit(0)
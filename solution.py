@@ -0,0 +1,182 @@
+""" Lazy access to the solution history of the HDF5 runs.
+
+The dataset solution[nt, NX, NDOF] of a run holds every printed time step.
+SolutionView opens it without reading anything, and reads only the hyperslab
+it is indexed with:
+
+    view = SolutionView('DFAndBDNK/nbys_2d26..._w_25d0')
+    view[-1, :, 'Ttt']                                  # the last time of Ttt
+    view[10:20, view.window(-20, 20), ['Ttt', 'Ttx']]   # a time and x window of two fields
+
+The fields are the names in h5variables or column numbers. Every read adds to
+view.chunkreads, the number of chunks HDF5 had to read (and decompress), and
+to view.bytesread, their uncompressed size. When the chunks of a file span many
+times, one time slice costs the whole chunk; rechunk rewrites the file with one
+chunk per time, after which a time slice costs O(NX).
+
+SolutionView also reads the runs in the store of store.py (store=storefile).
+"""
+import os
+import numpy as np
+
+from dfdata import topdir, touch, h5variables
+
+
+################################################################################
+def axisread(index, n):
+    """ Splits the index of one axis of length n into what is read from the file and what is picked from that.
+
+    Returns (selection, pick, rows) where selection is an int or a contiguous
+    slice for h5py, pick is applied to the result (None if nothing is left to
+    do), and rows are the indices which are read.
+    """
+    if isinstance(index, (int, np.integer)):
+        i = int(index) + n if index < 0 else int(index)
+        if not 0 <= i < n:
+            raise IndexError('index {} is out of range for an axis of length {}'.format(index, n))
+        return i, None, np.array([i])
+    rows = np.arange(n)[index]
+    if len(rows) == 0:
+        return slice(0, 0), None, rows
+    lo, hi = int(rows.min()), int(rows.max()) + 1
+    if np.array_equal(rows, np.arange(lo, hi)):
+        return slice(lo, hi), None, rows
+    # Read the smallest contiguous block and pick the rows from it
+    return slice(lo, hi), rows - lo, np.arange(lo, hi)
+
+
+class SolutionView:
+    """ Lazy view of solution[t, x, field] of one run, see the module docstring """
+
+    def __init__(self, run, dataset='solution', store=None):
+        """ run is a catalog entry, the name of a run (with or without .h5) or a file name.
+        With store, run is the name of a group in that store.
+        """
+        import h5py as h5
+
+        name = run['name'] if isinstance(run, dict) else run
+        if store is not None:
+            filename = store
+        else:
+            filename = name if os.path.isabs(name) else os.path.join(topdir, name)
+            if not filename.endswith('.h5'):
+                filename += '.h5'
+        touch(filename)
+        self.filename = filename
+        self.file = h5.File(filename, 'r')
+        group = self.file[name] if store is not None else self.file
+        self.dataset = group[dataset]
+        self.attrs = {k: (v.item() if hasattr(v, 'item') else v) for k, v in group.attrs.items()}
+        self.xdataset = group['x'] if 'x' in group else None
+        self.chunkreads = 0
+        self.bytesread = 0
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def chunks(self):
+        return self.dataset.chunks
+
+    @property
+    def x(self):
+        """ The grid, read when first asked for """
+        if not hasattr(self, '_x'):
+            self._x = self.xdataset[()] if self.xdataset is not None else np.linspace(
+                self.attrs['xmin'], self.attrs['xmax'], self.shape[1])
+        return self._x
+
+    @property
+    def times(self):
+        """ The times of the rows: one row every steps_per_print steps from initial_time """
+        a = self.attrs
+        return a.get('initial_time', 0.0) + np.arange(self.shape[0])*a['dt']*a['steps_per_print']
+
+    def window(self, xmin, xmax):
+        """ Returns the slice of the grid points with xmin <= x <= xmax """
+        x = self.x
+        return slice(int(np.searchsorted(x, xmin, 'left')), int(np.searchsorted(x, xmax, 'right')))
+
+    def fieldindex(self, field):
+        """ Translates field names to column numbers """
+        if isinstance(field, str):
+            return h5variables[field]
+        if isinstance(field, (list, tuple)):
+            return [self.fieldindex(f) for f in field]
+        return field
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = index + (slice(None),)*(3 - len(index))
+        index = index[:2] + (self.fieldindex(index[2]),)
+
+        parts = [axisread(i, n) for i, n in zip(index, self.shape)]
+        block = self.dataset[tuple(selection for selection, pick, rows in parts)]
+        self.count([rows for selection, pick, rows in parts])
+
+        # Apply the picks. Integer indices have removed their axis from block
+        axis = 0
+        for selection, pick, rows in parts:
+            if isinstance(selection, int):
+                continue
+            if pick is not None:
+                block = np.take(block, pick, axis=axis)
+            axis += 1
+        return block
+
+    def count(self, rows):
+        """ Adds the chunks which hold the rows of every axis to chunkreads and bytesread """
+        itemsize = self.dataset.dtype.itemsize
+        if any(len(r) == 0 for r in rows):
+            return
+        if self.chunks is None:
+            # Contiguous data is read directly, without chunks
+            self.bytesread += int(np.prod([len(r) for r in rows]))*itemsize
+            return
+        nchunks = int(np.prod([len(np.unique(r//c)) for r, c in zip(rows, self.chunks)]))
+        self.chunkreads += nchunks
+        self.bytesread += nchunks*int(np.prod(self.chunks))*itemsize
+
+    def isslicefriendly(self):
+        """ True if reading one time costs no more than that time """
+        return self.chunks is None or self.chunks[0] == 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+################################################################################
+def rechunk(filename, output=None, dataset='solution', compression=None):
+    """ Rewrites an HDF5 run with one chunk per time slice of dataset (and everything else copied as is).
+
+    output defaults to filename, which is then replaced atomically. The
+    compression defaults to the one of the store (gzip with shuffle).
+    Returns the chunk shape written.
+    """
+    import h5py as h5
+    from store import compression as storecompression
+
+    compression = storecompression if compression is None else compression
+    output = output or filename
+    tmp = '{}.{}.tmp'.format(output, os.getpid())
+    with h5.File(filename, 'r') as src, h5.File(tmp, 'w') as dst:
+        dst.attrs.update(src.attrs)
+        for key in src:
+            if key != dataset:
+                src.copy(key, dst)
+        data = src[dataset]
+        chunks = (1,) + data.shape[1:]
+        out = dst.create_dataset(dataset, shape=data.shape, dtype=data.dtype, chunks=chunks, **compression)
+        out.attrs.update(data.attrs)
+        for i in range(data.shape[0]):
+            out[i] = data[i]
+    os.replace(tmp, output)
+    return chunks
@@ -0,0 +1,290 @@
+""" One HDF5 file holding every run of the repository.
+
+The runs are spread over hundreds of files: the .h5 and .json of every run,
+the ten text files of its _out directory, the <testcase>_eta<eta/s>.h5 runs and
+the MUSIC .dat files. packstore copies all of them into storefile, with one
+group per catalog entry named like the entry:
+
+    /DFAndBDNK/nbys_2d26..._w_25d0      attributes: the catalog entry (parameters, .json, .h5 attributes)
+        x, initialdatain, finaldata, ...  the datasets of the .h5
+        solution                          [nt, NX, NDOF], one chunk per time
+        _out/Ttt, _out/Ttx, ...           [nt, NX], one chunk per time
+        _out/t, _out/x
+    /music_data/shear_relax_5/test1/0.18_tfinal_50.dat
+        data                              the table of the .dat file
+
+All the datasets are compressed (gzip with shuffle). A reader opens the store
+once (openstore) and reads any hyperslab with readstore, for instance one time
+of one field:
+
+    Ttt = readstore('DFAndBDNK/nbys_2d26..._w_25d0', '_out/Ttt', -1)
+
+Every group records the (mtime, size) of the files it was packed from, so
+packing again only repacks the runs whose files changed. The histories are
+copied a block at a time (DFPLOTS_PACK_BYTES), and a store from which runs
+are removed or replaced is rewritten, so it does not keep their space.
+
+    python store.py              # packs (or updates) storefile
+    python store.py -f           # packs every run again
+"""
+import os
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+
+from dfdata import topdir, outtags, stamp, touch, isfresh, cachename
+
+
+# The store. Can be moved with DFPLOTS_STORE
+storefile = os.environ.get('DFPLOTS_STORE', os.path.join(topdir, 'dfstore.h5'))
+
+# Settings of every dataset in the store
+compression = {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+
+# Size of the blocks of a history which are copied at once
+packbytes = int(os.environ.get('DFPLOTS_PACK_BYTES', 32 * 2**20))
+
+
+################################################################################
+def runfiles(entry):
+    """ Returns the files (relative to topdir) a catalog entry is packed from """
+    name = entry['name']
+    if entry['source'].startswith('music_') or name.endswith('.h5'):
+        return [name]
+    files = [name + ext for ext in ('.json', '.h5') if os.path.exists(os.path.join(topdir, name + ext))]
+    files += ['{}_out/{}.txt'.format(name, tag) for tag in outtags
+              if os.path.exists(os.path.join(topdir, '{}_out/{}.txt'.format(name, tag)))]
+    return files
+
+
+def runstamps(entry):
+    """ The stamps of the files of a catalog entry, as stored in its group """
+    return json.dumps({f: stamp(os.path.join(topdir, f)) for f in runfiles(entry)}, sort_keys=True)
+
+
+def chunksof(shape):
+    """ One chunk per time slice for histories, the whole dataset otherwise """
+    return (1,) + tuple(shape[1:]) if len(shape) > 1 and shape[0] > 1 else None
+
+
+def writedataset(group, name, array):
+    """ Writes array as a chunked, compressed dataset """
+    array = np.asarray(array)
+    if array.size < 2:
+        return group.create_dataset(name, data=array)
+    return group.create_dataset(name, data=array, chunks=chunksof(array.shape) or True, **compression)
+
+
+def blockrows(shape, itemsize=8):
+    """ The number of time slices of a dataset of shape copied at once, about packbytes bytes """
+    return max(1, packbytes//max(int(np.prod(shape[1:]))*itemsize, 1))
+
+
+def copydataset(group, name, dataset):
+    """ Copies an HDF5 dataset into group, packbytes at a time along its first axis """
+    if dataset.ndim < 2 or dataset.size < 2:
+        out = writedataset(group, name, dataset[()])
+    else:
+        out = group.create_dataset(name, shape=dataset.shape, dtype=dataset.dtype, chunks=chunksof(dataset.shape),
+                                   **compression)
+        rows = blockrows(dataset.shape, dataset.dtype.itemsize)
+        for lo in range(0, dataset.shape[0], rows):
+            out[lo:lo + rows] = dataset[lo:lo + rows]
+    out.attrs.update(dataset.attrs)
+    return out
+
+
+def historyblocks(filename):
+    """ Yields the rows of the text history filename (one time per line) a block at a time.
+
+    A fresh .npy cache of the file is read instead of the text, and none is made.
+    """
+    touch(filename)
+    if isfresh(filename, cachename(filename)):
+        history = np.load(cachename(filename), mmap_mode='r')
+        rows = blockrows(history.shape)
+        for lo in range(0, len(history), rows):
+            yield np.asarray(history[lo:lo + rows])
+        return
+    with open(filename) as f:
+        first = f.readline()
+        if not first.strip():
+            return
+        rows = blockrows((1, len(first.split())))
+        lines = [first]
+        while lines:
+            lines += itertools.islice(f, rows - len(lines))
+            yield np.loadtxt(lines, ndmin=2)
+            lines = list(itertools.islice(f, rows))
+
+
+def copyhistory(group, name, filename):
+    """ Copies the text history filename into group, one block of rows at a time """
+    out = None
+    for block in historyblocks(filename):
+        if out is None:
+            out = group.create_dataset(name, shape=(0, block.shape[1]), maxshape=(None, block.shape[1]),
+                                       dtype=float, chunks=(1, block.shape[1]), **compression)
+        out.resize(len(out) + len(block), axis=0)
+        out[-len(block):] = block
+    return out
+
+
+def packrun(store, entry):
+    """ Writes the group of one catalog entry, replacing it if it is there.
+
+    The datasets of the .h5 and the _out histories are copied a block of
+    time slices at a time, so the memory used does not depend on the length
+    of a history.
+    """
+    import h5py as h5
+
+    name = entry['name']
+    if name in store:
+        del store[name]
+    group = store.create_group(name)
+    path = os.path.join(topdir, name)
+
+    if entry['source'].startswith('music_'):
+        writedataset(group, 'data', np.loadtxt(path, skiprows=1))
+    else:
+        h5name = path if path.endswith('.h5') else path + '.h5'
+        if os.path.exists(h5name):
+            touch(h5name)
+            with h5.File(h5name, 'r') as file:
+                for key, dataset in file.items():
+                    copydataset(group, key, dataset)
+        for tag in outtags:
+            filename = '{}_out/{}.txt'.format(path, tag)
+            if not os.path.exists(filename):
+                continue
+            if tag in ('x', 't'):
+                writedataset(group, '_out/' + tag, np.loadtxt(filename))
+            else:
+                copyhistory(group, '_out/' + tag, filename)
+
+    for key, value in entry.items():
+        if value is not None and not isinstance(value, (dict, list)):
+            group.attrs[key] = value
+    # Written last, so that a group whose packing was interrupted is packed again
+    group.attrs['stamps'] = runstamps(entry)
+
+
+def packstore(filename=None, force=False, verbose=False):
+    """ Packs all the catalog entries into the store. Returns the names of the runs packed.
+
+    Runs whose files have not changed since they were packed are left alone,
+    unless force is true. Runs which are no longer in the catalog are removed.
+    HDF5 does not give back the space of a deleted group, so when runs are
+    removed or replaced the store is written again to a temporary file, the
+    unchanged runs copied as they are, and moved into place.
+    """
+    import h5py as h5
+    from catalog import loadcatalog
+
+    filename = filename or storefile
+    closestore(filename)
+    entries = sorted(loadcatalog().values(), key=lambda e: e['name'])
+    names = set(e['name'] for e in entries)
+    old = h5.File(filename, 'r') if os.path.exists(filename) else None
+    current = set() if old is None or force else set(e['name'] for e in entries if isstored(e, old))
+    stale = [e for e in entries if e['name'] not in current]
+    rewrite = old is not None and (any(e['name'] in old for e in stale) or not set(storeruns(old)) <= names)
+    if old is not None and not rewrite:
+        old.close()
+
+    packed = []
+    output = '{}.{}.tmp'.format(filename, os.getpid()) if rewrite else filename
+    try:
+        with h5.File(output, 'w' if rewrite else 'a') as store:
+            if rewrite:
+                for name in sorted(current):
+                    old.copy(old[name], store.require_group(os.path.dirname(name) or '/'), name=os.path.basename(name))
+                old.close()
+            for entry in stale:
+                packrun(store, entry)
+                packed.append(entry['name'])
+                if verbose:
+                    print('packed', entry['name'])
+    except BaseException:
+        if rewrite:
+            old.close()
+            if os.path.exists(output):
+                os.remove(output)
+        raise
+    if rewrite:
+        os.replace(output, filename)
+    return packed
+
+
+################################################################################
+_stores = {}
+
+
+def openstore(filename=None):
+    """ Returns the store opened for reading. It is opened once per process and reopened if it changes """
+    import h5py as h5
+
+    filename = filename or storefile
+    touch(filename)
+    key = stamp(filename)['mtime_ns']
+    if filename in _stores and _stores[filename][0] == key:
+        return _stores[filename][1]
+    if filename in _stores:
+        _stores[filename][1].close()
+    store = h5.File(filename, 'r')
+    _stores[filename] = key, store
+    return store
+
+
+def closestore(filename=None):
+    """ Closes the store if openstore opened it, so that it can be written """
+    key, store = _stores.pop(filename or storefile, (None, None))
+    if store is not None:
+        store.close()
+
+
+def storeruns(store=None):
+    """ Returns the names of the runs in the store """
+    store = openstore() if store is None else store
+    names = []
+    store.visititems(lambda name, obj: names.append(name) if 'stamps' in obj.attrs else None)
+    return names
+
+
+def storeinfo(name, store=None):
+    """ Returns the attributes of a run in the store (the catalog entry it was packed from) """
+    store = openstore() if store is None else store
+    return {k: (v.item() if hasattr(v, 'item') else v) for k, v in store[name].attrs.items() if k != 'stamps'}
+
+
+def readstore(name, dataset, *index, store=None):
+    """ Returns the hyperslab dataset[index] of a run, e.g.
+
+        readstore(name, '_out/Ttt', -1)              the last time of Ttt
+        readstore(name, 'solution', slice(0, 10), slice(None), 0)
+
+    Only the chunks which hold the hyperslab are read and decompressed.
+    """
+    store = openstore() if store is None else store
+    return store[name][dataset][index if index else ()]
+
+
+def isstored(entry, store=None):
+    """ True if the store holds the current version of the files of a catalog entry """
+    store = openstore() if store is None else store
+    group = store.get(entry['name'])
+    return group is not None and group.attrs.get('stamps') == runstamps(entry)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Packs every run into one HDF5 file')
+    parser.add_argument('-o', '--output', default=storefile, help='the store (default %(default)s)')
+    parser.add_argument('-f', '--force', action='store_true', help='pack every run even if it is unchanged')
+    args = parser.parse_args()
+
+    packed = packstore(args.output, force=args.force, verbose=True)
+    print('{} runs packed, {:.1f} MB'.format(len(packed), os.path.getsize(args.output)/2**20))
+    sys.exit(0)
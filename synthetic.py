@@ -0,0 +1,210 @@
+""" Synthetic data in the formats of the repository, at any size.
+
+writesynthetic writes a tree laid out like the top of the repository
+
+    DFAndBDNK/nbys_<4 pi eta/s>_d_<const>_A_<amplitude>_w_<width>.h5   x, initialdata, initialdatain, finaldata, solution
+    DFAndBDNK/nbys_..._w_<width>.json                                    the parameters of the run
+    DFAndBDNK/nbys_..._w_<width>_out/<tag>.txt                           the ten solver histories
+    <testcase>_eta<eta/s>.h5                                             the runs of make_paper_plot_test*.py
+    music_data/shear_relax_5/<testcase>/<eta/s>_tfinal_<t>.dat           the MUSIC tables
+    new_EKT/<testcase>_L<lambda>_gluon_Tmunu_vs_time.out                 the 19 column EKT blocks
+
+for any number of grid points, printed times and values of eta/s. The fields
+are the free streaming solution of the Gaussian test cases (freegaussian), which
+is cheap to evaluate one time at a time. Every file is written one time slice
+at a time, so the memory used is O(NX) whatever the size of the tree.
+
+    python synthetic.py /tmp/big --nx 8193 --ntimes 1025 --etabys 10
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from dfdata import outtags, h5variables
+from catalog import testparams
+from freestream import freegaussian
+from idealhydro import primitives
+from rta import etabys_of_lambdaekt, nug, a, ektcols, ekt_tcol, ekt_zcol, ekt_tmunu
+
+
+# Columns of the solver's HDF5 output after the ones in h5variables
+NDOF = 7
+
+# Header of the MUSIC tables
+musicheader = 'eta z(GeV^-1) T(GeV) epsilon(GeV^4) Ttautau(GeV^4) Ttauz(GeV^4)'
+
+
+################################################################################
+def etalist(etabys):
+    """ A list of eta/s is used as is. A number n gives eta/s = 0 (ideal hydro) and n - 1 values from 0.1 to 2 """
+    if np.ndim(etabys) == 0:
+        return [0.0] + [float('{:.4g}'.format(e)) for e in np.geomspace(0.1, 2.0, int(etabys) - 1)]
+    return [float(e) for e in etabys]
+
+
+def dname(value):
+    """ Writes a number the way the solver names its runs: 0.12 -> 0d12 """
+    return repr(float(value)).replace('.', 'd')
+
+
+def fields(x, t, params):
+    """ Returns {tag: values} of every history of the solver at time t """
+    Ttt, Ttx = freegaussian(x, t, params['const'], params['amplitude'], params['width'])
+    e, v = primitives(Ttt[0], Ttx[0])
+    ux = v/np.sqrt(1 - v**2)
+    return {'Ttt': Ttt[0], 'Ttx': Ttx[0], 'eps': e, 'ux': ux, 'VISC': 0*x, 'xi': np.log(e),
+            'xiD': 0*x, 'uxD': ux}
+
+
+def solutionrow(f):
+    """ The columns of solution for the fields f of one time """
+    row = np.empty((len(f['Ttt']), NDOF))
+    for tag, col in h5variables.items():
+        row[:, col] = f[tag]
+    row[:, 4] = f['eps']/3
+    row[:, 5] = f['xi']
+    row[:, 6] = 1/3
+    return row
+
+
+def runattrs(x, times, etabys, iofilename, steps_per_print=10):
+    """ The attributes of a run, as in its .h5 and .json """
+    dt = (times[1] - times[0])/steps_per_print if len(times) > 1 else 0.0
+    return {'NDOF': NDOF, 'NX': len(x), 'xmin': float(x[0]), 'xmax': float(x[-1]),
+            'initial_time': float(times[0]), 'final_time': float(times[-1]), 'cfl_max': 0.1, 'dt': dt,
+            'eta_over_s': etabys, 'iofilename': iofilename, 'steps_per_print': steps_per_print}
+
+
+################################################################################
+def writeh5(filename, x, times, params, attrs):
+    """ Writes a run's .h5 one time slice at a time """
+    import h5py as h5
+    nx = len(x)
+    with h5.File(filename, 'w') as file:
+        file.attrs.update(attrs)
+        file['x'] = x
+        solution = file.create_dataset('solution', (len(times), nx, NDOF), 'f8', chunks=(1, nx, NDOF))
+        for i, t in enumerate(times):
+            row = solutionrow(fields(x, t, params))
+            solution[i] = row
+            if i == 0:
+                file.create_dataset('initialdatain', data=row, chunks=row.shape)
+                file['initialdata'] = row
+        file.create_dataset('finaldata', data=row, chunks=row.shape)
+
+
+def writedfrun(outdir, testcase, etabys, x, times, withh5=True):
+    """ Writes the .h5, .json and _out/ of one density frame / BDNK run. Returns its name """
+    params = testparams[testcase]
+    fourpietabys = 4*np.pi*etabys if etabys else 0.0
+    base = 'nbys_{}_d_{}_A_{}_w_{}'.format(dname(fourpietabys), dname(params['const']),
+                                          dname(params['amplitude']), dname(params['width']))
+    name = os.path.join(outdir, 'DFAndBDNK', base)
+    os.makedirs(name + '_out', exist_ok=True)
+    attrs = runattrs(x, times, etabys, base + '.h5')
+
+    with open(name + '.json', 'w') as f:
+        json.dump({k: v for k, v in attrs.items() if k != 'dt'}, f, indent=4)
+    if withh5:
+        writeh5(name + '.h5', x, times, params, attrs)
+
+    np.savetxt(name + '_out/x.txt', x[None, :], fmt='%e', delimiter='  ')
+    np.savetxt(name + '_out/t.txt', times, fmt='%e')
+    files = {tag: open(name + '_out/{}.txt'.format(tag), 'w') for tag in outtags if tag not in ('t', 'x')}
+    try:
+        for t in times:
+            f = fields(x, t, params)
+            for tag, file in files.items():
+                np.savetxt(file, f[tag][None, :], fmt='%e', delimiter='  ')
+    finally:
+        for file in files.values():
+            file.close()
+    return name
+
+
+def writeetarun(outdir, testcase, etabys, x, times):
+    """ Writes a <testcase>_eta<eta/s>.h5 run. Returns its file name """
+    filename = os.path.join(outdir, '{}_eta{:g}.h5'.format(testcase, etabys))
+    writeh5(filename, x, times, testparams[testcase], runattrs(x, times, etabys, os.path.basename(filename)))
+    return filename
+
+
+def writemusic(outdir, testcase, etabys, x, final_time, shear_relax_factor='5'):
+    """ Writes a MUSIC table at final_time. Returns its file name """
+    directory = os.path.join(outdir, 'music_data', 'shear_relax_' + shear_relax_factor, testcase)
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, '{:g}_tfinal_{:g}.dat'.format(etabys, final_time))
+    f = fields(x, final_time, testparams[testcase])
+    table = np.stack([0*x - 2e-5, x, (f['eps']/a)**0.25, f['eps'], f['Ttt'], f['Ttx']], axis=-1)
+    np.savetxt(filename, table, fmt='%f', header=musicheader, comments='')
+    return filename
+
+
+def writeekt(outdir, testcase, lambdaekt, x, times):
+    """ Writes an EKT file, one block of len(x) rows per time. Returns its file name """
+    directory = os.path.join(outdir, 'new_EKT')
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, '{}_L{:d}_gluon_Tmunu_vs_time.out'.format(testcase, lambdaekt))
+    block = np.zeros((len(x), ektcols))
+    block[:, ekt_zcol] = x
+    with open(filename, 'w') as file:
+        for t in times:
+            f = fields(x, t, testparams[testcase])
+            block[:, ekt_tcol] = t
+            block[:, ekt_tmunu['tt']] = f['Ttt']/nug
+            block[:, ekt_tmunu['tz']] = f['Ttx']/nug
+            block[:, ekt_tmunu['zz']] = (f['Ttt'] - f['eps']*2/3)/nug
+            block[:, ekt_tmunu['xx']] = block[:, ekt_tmunu['yy']] = f['eps']/3/nug
+            np.savetxt(file, block, fmt='%.10e')
+    return filename
+
+
+def writesynthetic(outdir, NX=513, ntimes=129, etabys=(0.0, 0.18, 0.513, 1.48), testcases=('test1', 'test2'),
+                   lambdas=(20, 10, 5), final_time=50.0, sources=('df', 'eta_h5', 'music', 'ekt'), verbose=False):
+    """ Writes a synthetic tree in outdir (see the module docstring). Returns the list of files and runs written.
+
+    etabys is a list of eta/s or a number of them (see etalist). The EKT files
+    are written for the lambdas, with ntimes blocks of NX rows.
+    """
+    x = np.linspace(-100.0, 100.0, NX)
+    times = np.linspace(0.0, final_time, ntimes)
+    written = []
+    for testcase in testcases:
+        for eta in etalist(etabys):
+            if 'df' in sources:
+                written.append(writedfrun(outdir, testcase, eta, x, times))
+            if 'eta_h5' in sources:
+                written.append(writeetarun(outdir, testcase, eta, x, times))
+            if 'music' in sources and eta > 0:
+                written.append(writemusic(outdir, testcase, eta, x, final_time))
+            if verbose and written:
+                print(written[-1], flush=True)
+        if 'ekt' in sources:
+            for lambdaekt in lambdas:
+                written.append(writeekt(outdir, testcase, lambdaekt, x, times))
+                if verbose:
+                    print(written[-1], flush=True)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes synthetic runs in the formats of the repository')
+    parser.add_argument('outdir')
+    parser.add_argument('--nx', type=int, default=513, help='grid points')
+    parser.add_argument('--ntimes', type=int, default=129, help='printed times (and EKT blocks)')
+    parser.add_argument('--etabys', type=float, nargs='+', default=[0.0, 0.18, 0.513, 1.48],
+                        help='values of eta/s, or a single integer n for n values')
+    parser.add_argument('--testcases', nargs='+', default=['test1', 'test2'], choices=sorted(testparams))
+    parser.add_argument('--lambdas', type=int, nargs='+', default=sorted(etabys_of_lambdaekt, reverse=True))
+    parser.add_argument('--sources', nargs='+', default=['df', 'eta_h5', 'music', 'ekt'],
+                        choices=['df', 'eta_h5', 'music', 'ekt'])
+    args = parser.parse_args()
+
+    etabys = args.etabys
+    if len(etabys) == 1 and etabys[0] >= 2 and etabys[0] == int(etabys[0]):
+        etabys = int(etabys[0])
+    writesynthetic(args.outdir, args.nx, args.ntimes, etabys, args.testcases, args.lambdas,
+                   sources=args.sources, verbose=True)
+    sys.exit(0)
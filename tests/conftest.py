@@ -0,0 +1,73 @@
+""" Fixtures of the tests.
+
+The loaders find the runs relative to dfdata.topdir, the top of the repository.
+The tests instead point every module at a small synthetic tree written by
+synthetic.py, with its own cache directory, so they neither need nor touch the
+data of the repository.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+repodir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repodir)
+# Before dfdata is imported, so that nothing is ever cached in the repository's .dfcache
+os.environ['DFPLOTS_CACHE'] = tempfile.mkdtemp(prefix='dfplots-tests-')
+
+import dfdata
+import catalog
+import solution
+import store
+import freestream
+import heatmap
+import observables
+import idealhydro
+from synthetic import writesynthetic
+
+
+# The modules which locate the runs with their own copy of topdir
+treemodules = [dfdata, catalog, solution, store, freestream, heatmap, observables]
+
+# Size of the synthetic tree shared by the tests
+treeNX = 257
+treentimes = 33
+treeetabys = (0.0, 0.18, 1.48)
+
+
+################################################################################
+@pytest.fixture
+def usetree(monkeypatch):
+    """ Returns a function which points the modules at the tree in a directory, until the test ends """
+    def use(directory):
+        directory = str(directory)
+        for module in treemodules:
+            monkeypatch.setattr(module, 'topdir', directory)
+        cachedir = os.path.join(directory, '.dfcache')
+        monkeypatch.setattr(dfdata, 'cachedir', cachedir)
+        monkeypatch.setattr(catalog, 'cachedir', cachedir)
+        monkeypatch.setattr(idealhydro, 'cachedir', cachedir)
+        monkeypatch.setattr(dfdata, 'ektdir', os.path.join(directory, 'new_EKT'))
+        monkeypatch.setattr(catalog, 'catalogfile', os.path.join(cachedir, 'catalog.json'))
+        monkeypatch.setattr(catalog, '_catalog', None)
+        dfdata.memoclear()
+        return directory
+
+    yield use
+    dfdata.memoclear()
+
+
+@pytest.fixture(scope='session')
+def synthetictree(tmp_path_factory):
+    """ The directory of the synthetic tree, written once """
+    directory = tmp_path_factory.mktemp('tree')
+    writesynthetic(str(directory), NX=treeNX, ntimes=treentimes, etabys=treeetabys, lambdas=(20,))
+    return str(directory)
+
+
+@pytest.fixture
+def tree(synthetictree, usetree):
+    """ The synthetic tree, with the modules pointed at it """
+    return usetree(synthetictree)
+
@@ -0,0 +1,69 @@
+""" The saved catalog is reused while nothing changes and rescanned when a run or a file it read changes """
+import os
+import json
+
+import numpy as np
+import pytest
+
+import catalog
+from synthetic import writesynthetic, writedfrun
+
+
+@pytest.fixture
+def smalltree(tmp_path, usetree):
+    writesynthetic(str(tmp_path), NX=33, ntimes=5, etabys=(0.0, 0.18), testcases=('test1',), sources=('df', 'eta_h5'))
+    return usetree(tmp_path)
+
+
+def reload():
+    """ The catalog as a new process would load it """
+    catalog._catalog = None
+    return catalog.loadcatalog()
+
+
+def test_catalog_entries(smalltree):
+    entries = catalog.findruns(testcase='test1')
+    assert sorted((e['source'], round(e['fourpietabys'], 6)) for e in entries) == [
+        ('DFAndBDNK', 0.0), ('DFAndBDNK', round(4*np.pi*0.18, 6)), ('eta_h5', 0.0), ('eta_h5', round(4*np.pi*0.18, 6))]
+    assert catalog.idealof(catalog.findrun(4*np.pi*0.18, 0.12, 0.48, 25.0))['fourpietabys'] == 0.0
+
+
+def test_catalog_reused(smalltree):
+    catalog.loadcatalog()
+    saved = os.stat(catalog.catalogfile).st_mtime_ns
+    reload()
+    assert os.stat(catalog.catalogfile).st_mtime_ns == saved
+
+
+def test_catalog_unrelated_files(smalltree):
+    catalog.loadcatalog()
+    saved = os.stat(catalog.catalogfile).st_mtime_ns
+    entry = catalog.findrun(0.0, 0.12, 0.48, 25.0)
+    for filename in ('notes.txt', entry['name'] + '_pyramid.h5', 'DFAndBDNK/README'):
+        with open(os.path.join(smalltree, filename), 'w') as f:
+            f.write('not a run')
+    os.makedirs(os.path.join(smalltree, 'rta_EKT'))
+    reload()
+    assert os.stat(catalog.catalogfile).st_mtime_ns == saved
+
+
+def test_catalog_new_run(smalltree):
+    before = len(catalog.loadcatalog())
+    x = np.linspace(-100.0, 100.0, 33)
+    writedfrun(smalltree, 'test2', 0.18, x, np.linspace(0.0, 50.0, 5))
+    assert len(reload()) == before + 1
+    assert catalog.findruns(testcase='test2', source='DFAndBDNK')
+
+
+def test_catalog_edited_json(smalltree):
+    entry = catalog.findrun(4*np.pi*0.18, 0.12, 0.48, 25.0)
+    filename = os.path.join(smalltree, entry['name'] + '.json')
+    with open(filename) as f:
+        info = json.load(f)
+    # Same directory, same size: only the stamp of the file tells
+    info['cfl_max'] = 0.2
+    with open(filename, 'w') as f:
+        json.dump(info, f, indent=4)
+    assert catalog.findrun(4*np.pi*0.18, 0.12, 0.48, 25.0)['cfl_max'] == 0.1
+    reload()
+    assert catalog.findrun(4*np.pi*0.18, 0.12, 0.48, 25.0)['cfl_max'] == 0.2
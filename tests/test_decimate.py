@@ -0,0 +1,67 @@
+""" Decimation keeps the envelope of a curve in every pixel column """
+import numpy as np
+import pytest
+
+from decimate import pixelcolumns, minmax, lttb, decimate
+
+
+def curve(n=20000, seed=0):
+    """ A noisy curve with narrow spikes and a gap, in display coordinates 0..400 """
+    rng = np.random.default_rng(seed)
+    px = np.linspace(0.0, 400.0, n)
+    py = np.sin(px/20) + 0.1*rng.standard_normal(n)
+    py[rng.integers(0, n, 20)] += rng.choice([-5.0, 5.0], 20)
+    py[5000:5010] = np.nan
+    return px, py
+
+
+def envelope(px, py, keep, left, right, scale=2.0):
+    """ (column, min, max) of the finite points of every column, of all the points and of the kept ones """
+    columns = pixelcolumns(px, left, right, scale)
+    finite = np.isfinite(py)
+    out = []
+    for points in (np.arange(len(px)), keep):
+        points = points[finite[points]]
+        out.append({c: (py[points][columns[points] == c].min(), py[points][columns[points] == c].max())
+                    for c in np.unique(columns[points])})
+    return out
+
+
+@pytest.mark.parametrize('left, right', [(0.0, 400.0), (100.0, 250.0)])
+def test_minmax_keeps_extrema(left, right):
+    px, py = curve()
+    keep = minmax(px, py, left, right)
+    assert len(keep) <= 4*(2*(right - left) + 3) + 10
+    full, kept = envelope(px, py, keep, left, right)
+    assert kept == full
+    assert keep[0] == 0 and keep[-1] == len(px) - 1
+    assert np.isnan(py[keep]).sum() == 10
+
+
+def test_minmax_global_extrema():
+    px, py = curve(seed=1)
+    keep = decimate(px, py, 0.0, 400.0)
+    assert np.nanmax(py[keep]) == np.nanmax(py)
+    assert np.nanmin(py[keep]) == np.nanmin(py)
+
+
+def test_lttb():
+    px, py = curve(seed=2)
+    keep = lttb(px, np.nan_to_num(py), 500)
+    assert len(keep) == 500
+    assert keep[0] == 0 and keep[-1] == len(px) - 1
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_decimate_lttb_window():
+    px, py = curve(seed=3)
+    keep = decimate(px, np.nan_to_num(py), 100.0, 200.0, method='lttb')
+    inside = (px[keep] >= 100.0) & (px[keep] <= 200.0)
+    # The view, plus the points which carry the curve into it and out of it
+    assert inside.sum() <= 2*2*100 + 2
+    assert px[keep].min() < 100.0 and px[keep].max() > 200.0
+
+
+def test_short_curves():
+    assert list(minmax(np.arange(2.0), np.arange(2.0))) == [0, 1]
+    assert list(lttb(np.arange(5.0), np.arange(5.0), 10)) == [0, 1, 2, 3, 4]
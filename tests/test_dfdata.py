@@ -0,0 +1,114 @@
+""" The loaders of dfdata.py against a full np.loadtxt / h5py read of the same files """
+import os
+
+import h5py as h5
+import numpy as np
+import pytest
+
+import dfdata
+from catalog import findruns
+from synthetic import writedfrun
+
+
+def runname(tree, fourpietabys):
+    """ The file name (without extension) of the test1 run of the tree with this 4 pi eta/s """
+    entry, = findruns(source='DFAndBDNK', testcase='test1', fourpietabys=fourpietabys)
+    return os.path.join(tree, entry['name'])
+
+
+@pytest.mark.parametrize('tag', ['Ttt', 'ux', 'VISC', 'x', 't'])
+def test_loadout(tree, tag):
+    name = runname(tree, 4*np.pi*0.18)
+    full = np.loadtxt(name + '_out/{}.txt'.format(tag), ndmin=1 if tag in ('x', 't') else 2)
+    assert np.array_equal(dfdata.loadout(name, tag), full)
+    # Again, from the cache
+    assert np.array_equal(dfdata.loadout(name, tag), full)
+
+
+def test_loadout_rebuilds_stale_cache(tree):
+    name = runname(tree, 4*np.pi*1.48)
+    filename = name + '_out/xiD.txt'
+    before = np.array(dfdata.loadout(name, 'xiD'))
+    np.savetxt(filename, before + 1, fmt='%e', delimiter='  ')
+    assert np.array_equal(dfdata.loadout(name, 'xiD'), np.loadtxt(filename, ndmin=2))
+
+
+@pytest.mark.parametrize('index', [0, 1, 7, -1, -2, -5])
+def test_loadoutslice(tree, index):
+    name = runname(tree, 0.0)
+    filename = name + '_out/Ttx.txt'
+    full = np.loadtxt(filename, ndmin=2)
+    assert np.array_equal(dfdata.loadoutslice(name, 'Ttx', index), full[index])
+    # The slice does not convert the file, the full read does
+    assert dfdata.cachename(filename) not in dfdata._pending
+    dfdata.loadout(name, 'Ttx')
+    assert np.array_equal(dfdata.loadoutslice(name, 'Ttx', index), full[index])
+
+
+def test_loadoutslice_cache_in_background(tmp_path, usetree, monkeypatch):
+    monkeypatch.setattr(dfdata, 'slicecache', True)
+    name = writedfrun(str(tmp_path), 'test1', 0.18, np.linspace(-100.0, 100.0, 65), np.linspace(0.0, 50.0, 9),
+                      withh5=False)
+    usetree(tmp_path)
+    filename = name + '_out/eps.txt'
+    full = np.loadtxt(filename, ndmin=2)
+    thread = dfdata.cacheinbackground(filename, ndmin=2)
+    thread.join()
+    assert thread.daemon and dfdata.isfresh(filename, dfdata.cachename(filename))
+    assert dfdata.cachename(filename) not in dfdata._pending
+    # The file changes: the next slice converts it again
+    np.savetxt(filename, full[:-1], fmt='%e', delimiter='  ')
+    assert np.array_equal(dfdata.loadoutslice(name, 'eps', -1), full[-2])
+    dfdata.awaitcache(dfdata.cachename(filename))
+    assert dfdata.isfresh(filename, dfdata.cachename(filename))
+    assert np.array_equal(dfdata.loadout(name, 'eps'), full[:-1])
+
+
+@pytest.mark.parametrize('index', [33, -34])
+def test_loadoutslice_out_of_range(tree, index):
+    name = runname(tree, 0.0)
+    filename = name + '_out/ux.txt'
+    with pytest.raises(IndexError):
+        dfdata.loadoutslice(name, 'ux', index)
+    dfdata.loadout(name, 'ux')
+    with pytest.raises(IndexError):
+        dfdata.loadoutslice(name, 'ux', index)
+
+
+def test_tailrows_small_blocks(tree):
+    filename = runname(tree, 0.0) + '_out/Ttt.txt'
+    assert np.array_equal(dfdata.tailrows(filename, 3, blocksize=100), np.loadtxt(filename)[-3:])
+
+
+@pytest.mark.parametrize('tags', [['Ttt'], ['Ttx', 'ux'], ['Ttt', 'Ttx', 'eps', 'ux']])
+def test_readcolumns(tree, tags):
+    filename = runname(tree, 4*np.pi*0.18) + '.h5'
+    with h5.File(filename, 'r') as file:
+        full = file['finaldata'][()]
+    columns = dfdata.readcolumns(filename, 'finaldata', tags)
+    assert list(columns) == tags
+    for tag in tags:
+        assert np.array_equal(columns[tag], full[:, dfdata.h5variables[tag]])
+
+
+def test_readcolumns_memoized(tree):
+    filename = runname(tree, 0.0) + '.h5'
+    with dfdata.touchedfiles() as files:
+        first = dfdata.readcolumns(filename, 'finaldata', ['Ttt', 'ux'])
+        assert dfdata.readcolumns(filename, 'finaldata', ['Ttt', 'ux']) is first
+    # A hit still records the file it was read from
+    assert os.path.abspath(filename) in files
+
+
+@pytest.mark.parametrize('time_index', [0, 10, -1])
+def test_getDFfields_time_index(tree, time_index):
+    entry, = findruns(source='DFAndBDNK', testcase='test1', fourpietabys=4*np.pi*0.18)
+    ideal, = findruns(source='DFAndBDNK', testcase='test1', fourpietabys=0.0)
+    x, df, bdnk, idealfields, info = dfdata.getDFfields(entry, time_index=time_index)
+    with h5.File(os.path.join(tree, entry['name']) + '.h5', 'r') as file:
+        assert np.array_equal(x, file['x'][()])
+        assert np.array_equal(df['Ttt'], file['solution'][time_index, :, 0])
+    with h5.File(os.path.join(tree, ideal['name']) + '.h5', 'r') as file:
+        assert np.array_equal(idealfields['ux'], file['solution'][time_index, :, 3])
+    full = np.loadtxt(os.path.join(tree, entry['name']) + '_out/eps.txt')
+    assert np.array_equal(bdnk['eps'], full[time_index])
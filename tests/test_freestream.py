@@ -0,0 +1,58 @@
+""" The free streaming of any initial data against the closed form for the Gaussian test cases """
+import numpy as np
+import pytest
+
+import catalog
+from catalog import testparams
+from freestream import freegaussian, freestream, freerun
+from observables import trapezoid
+from synthetic import writedfrun
+
+
+@pytest.mark.parametrize('testcase', ['test1', 'test2'])
+def test_freestream_gaussian(testcase):
+    p = testparams[testcase]
+    x = np.linspace(-100.0, 100.0, 513)
+    times = np.array([0.0, 0.5, 10.0, 47.5, 50.0])
+    Ttt, Ttx = freegaussian(x, times, p['const'], p['amplitude'], p['width'])
+    freeTtt, freeTtx = freestream(x, Ttt[0], Ttx[0], times)
+    assert np.allclose(freeTtt, Ttt, rtol=0, atol=1e-12)
+    assert np.allclose(freeTtx, Ttx, rtol=0, atol=1e-12)
+
+
+def test_freestream_conserves():
+    # Any data, with no flux at the edges: the energy and momentum stay put
+    x = np.linspace(-100.0, 100.0, 801)
+    Ttt0 = 1 + np.exp(-(x - 10)**2/4) + 0.5*np.exp(-(x + 20)**2/30)
+    Ttx0 = 0.3*np.exp(-(x + 20)**2/30)
+    Ttt, Ttx = freestream(x, Ttt0, Ttx0, [10.0, 30.0])
+    w = trapezoid(x)
+    assert np.allclose(Ttt @ w, Ttt0 @ w, rtol=1e-10)
+    assert np.allclose(Ttx @ w, Ttx0 @ w, rtol=1e-8)
+    # Nothing moves faster than light
+    assert np.all(abs(Ttx) <= Ttt + 1e-12)
+
+
+def test_freerun(tree):
+    for entry in catalog.findruns(source='DFAndBDNK'):
+        p = testparams[entry['testcase']]
+        x, Ttt, Ttx = freerun(entry)
+        gaussianTtt, gaussianTtx = freegaussian(x, entry['final_time'], p['const'], p['amplitude'], p['width'])
+        assert np.allclose(Ttt, gaussianTtt, rtol=0, atol=1e-12)
+        assert np.allclose(Ttx, gaussianTtx, rtol=0, atol=1e-12)
+
+
+def test_freerun_without_h5(tmp_path, usetree):
+    # Like the runs of figure12_data: the initial data are the first rows of _out, printed with 6 digits
+    x = np.linspace(-80.0, 80.0, 321)
+    writedfrun(str(tmp_path), 'test2', 0.18, x, np.linspace(0.0, 30.0, 7), withh5=False)
+    usetree(tmp_path)
+    entry, = catalog.findruns(testcase='test2')
+    assert not entry['h5']
+    times = [10.0, 30.0]
+    freex, Ttt, Ttx = freerun(entry, times)
+    p = testparams['test2']
+    gaussianTtt, gaussianTtx = freegaussian(x, times, p['const'], p['amplitude'], p['width'])
+    assert np.allclose(freex, x, rtol=1e-6)
+    assert np.allclose(Ttt, gaussianTtt, rtol=1e-5)
+    assert np.allclose(Ttx, gaussianTtx, rtol=0, atol=1e-5*p['amplitude'])
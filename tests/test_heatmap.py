@@ -0,0 +1,72 @@
+""" The levels of the heatmap pyramids against the direct means of the histories """
+import os
+
+import h5py as h5
+import numpy as np
+import pytest
+
+import catalog
+import heatmap
+
+
+def blockmean(a, level):
+    """ The means of the whole 2^level x 2^level blocks of a """
+    k = 2**level
+    nt, nx = a.shape[0]//k, a.shape[1]//k
+    return a[:nt*k, :nx*k].reshape(nt, k, nx, k).mean(axis=(1, 3))
+
+
+def history(tree, entry, source, tag):
+    name = os.path.join(tree, entry['name'])
+    if source == 'BDNK':
+        return np.loadtxt(name + '_out/{}.txt'.format(tag))
+    with h5.File(name + '.h5', 'r') as file:
+        return file['solution'][:, :, heatmap.h5variables[tag]]
+
+
+def test_pool():
+    a = np.arange(15.0).reshape(3, 5)
+    pooled = heatmap.pool(a)
+    assert pooled.shape == (2, 3)
+    assert pooled[0, 0] == a[:2, :2].mean()
+    # The odd last row and column are repeated
+    assert pooled[1, 2] == a[2, 4]
+    assert pooled[0, 2] == a[:2, 4].mean()
+
+
+@pytest.mark.parametrize('source', ['DF', 'BDNK'])
+def test_pyramid_levels(tree, monkeypatch, source):
+    entry, = catalog.findruns(source='DFAndBDNK', testcase='test2', fourpietabys=4*np.pi*0.18)
+    # Blocks of three rows for the four BDNK tags, so that rows wait for their pair across blocks
+    monkeypatch.setattr(heatmap, 'pyramidbytes', 8*entry['NX']*4*3)
+    tags = heatmap.buildpyramid(entry, source)
+    assert tags == (['Ttt', 'ux'] if source == 'DF' else heatmap.pyramidtags)
+    x, t = heatmap.grid(entry, source)
+    nt, nx = len(t), len(x)
+    levels = heatmap.nlevels(nt, nx)
+    assert levels >= 2
+    with h5.File(heatmap.pyramidname(entry), 'r') as file:
+        assert file[source].attrs['levels'] == levels
+        for tag in tags:
+            full = history(tree, entry, source, tag)
+            for level in range(1, levels + 1):
+                pyramid = file[source][tag][str(level)][()]
+                assert pyramid.shape == heatmap.levelshape(nt, nx, level)
+                direct = blockmean(full, level)
+                assert np.allclose(pyramid[:direct.shape[0], :direct.shape[1]], direct, rtol=1e-12, atol=1e-14)
+    assert heatmap.haspyramid(entry, source, tags)
+
+
+def test_heatmapdata(tree):
+    entry, = catalog.findruns(source='DFAndBDNK', testcase='test1', fourpietabys=4*np.pi*1.48)
+    full = history(tree, entry, 'BDNK', 'Ttt')
+    # At the size of the history, level 0: the history itself
+    values, extent, level = heatmap.heatmapdata(entry, 'Ttt', size=full.shape)
+    assert level == 0 and np.array_equal(values, full)
+    # A quarter of the cells in each direction
+    values, extent, level = heatmap.heatmapdata(entry, 'Ttt', size=(full.shape[0]//4, full.shape[1]//4))
+    assert level == 2
+    assert np.allclose(values[:full.shape[0]//4, :full.shape[1]//4], blockmean(full, 2))
+    x = np.loadtxt(os.path.join(tree, entry['name']) + '_out/x.txt')
+    dx = x[1] - x[0]
+    assert extent[0] == pytest.approx(x[0] - dx/2) and extent[1] == pytest.approx(x[-1] + dx/2)
@@ -0,0 +1,87 @@
+""" The time series of the conserved charges, on runs which conserve them and on runs which do not """
+import os
+import shutil
+
+import h5py as h5
+import numpy as np
+import pytest
+
+import catalog
+import dfdata
+import observables
+from synthetic import writedfrun
+
+
+def test_conservative_runs(tree, tmp_path, monkeypatch):
+    # Blocks of a few times, so that every history is reduced in several of them
+    monkeypatch.setattr(observables, 'reducebytes', 8*257*4*5)
+    filename = str(tmp_path / 'observables.h5')
+    reduced = observables.writeobservables(filename)
+    assert sorted(reduced) == sorted(e['name'] for e in catalog.findruns(source='DFAndBDNK'))
+    table = observables.drifttable(filename)
+    assert len(table) == 2*len(reduced)
+    for row in table:
+        assert not observables.isdrifting(row), row
+        assert row['blowup'] is None
+        # The histories of _out are printed with 6 digits, solution is exact
+        assert row['E'] < (1e-6 if row['source'] == 'BDNK' else 1e-12)
+    # Nothing changed, nothing is reduced again
+    assert observables.writeobservables(filename) == []
+
+
+def test_series(tree, tmp_path):
+    entry, = catalog.findruns(source='DFAndBDNK', testcase='test2', fourpietabys=4*np.pi*1.48)
+    filename = str(tmp_path / 'observables.h5')
+    observables.writeobservables(filename)
+    name = os.path.join(tree, entry['name'])
+    with h5.File(name + '.h5', 'r') as file:
+        x, solution = file['x'][()], file['solution'][()]
+    df = observables.readobservables(entry, 'DF', filename)
+    w = observables.trapezoid(x)
+    assert np.allclose(df['E'], solution[:, :, 0] @ w, rtol=1e-14)
+    assert np.allclose(df['P'], solution[:, :, 1] @ w, rtol=0, atol=1e-14)
+    assert np.array_equal(df['Tttmax'], solution[:, :, 0].max(axis=1))
+    assert np.allclose(df['t'], np.linspace(0.0, entry['final_time'], len(solution)))
+    # From the text and from the binary cache
+    Ttt = np.loadtxt(name + '_out/Ttt.txt')
+    assert np.allclose(observables.readobservables(entry, 'BDNK', filename)['E'], Ttt @ w, rtol=1e-14)
+    for tag in observables.reducetags:
+        dfdata.loadout(name, tag)
+    series = observables.reducehistory(observables.outblocks(name))
+    assert np.allclose(series['E'], Ttt @ w, rtol=1e-14)
+
+
+def test_drift_and_blowup(tmp_path, usetree):
+    x = np.linspace(-100.0, 100.0, 129)
+    times = np.linspace(0.0, 50.0, 11)
+    name = writedfrun(str(tmp_path), 'test1', 0.18, x, times, withh5=False)
+    usetree(tmp_path)
+    # Energy which grows by 1% per unit time, then a run which blows up at the 8th time
+    Ttt = np.loadtxt(name + '_out/Ttt.txt')
+    Ttt *= 1 + 0.01*times[:, None]
+    Ttt[7:, 60] = np.nan
+    np.savetxt(name + '_out/Ttt.txt', Ttt, fmt='%e', delimiter='  ')
+
+    filename = str(tmp_path / 'observables.h5')
+    observables.writeobservables(filename)
+    row, = observables.drifttable(filename)
+    assert row['source'] == 'BDNK'
+    assert row['blowup'] == pytest.approx(times[7])
+    # Measured up to the blowup
+    assert row['E'] == pytest.approx(0.01*times[6], rel=1e-3)
+    assert observables.isdrifting(row)
+    assert 'not finite from t = 35' in observables.formatdrifts(observables.drifttable(filename))
+
+
+def test_removed_run(tmp_path, synthetictree, usetree):
+    tree = usetree(shutil.copytree(synthetictree, str(tmp_path / 'tree')))
+    filename = str(tmp_path / 'observables.h5')
+    observables.writeobservables(filename)
+    entry, = catalog.findruns(source='DFAndBDNK', testcase='test1', fourpietabys=4*np.pi*0.18)
+    name = os.path.join(tree, entry['name'])
+    os.remove(name + '.h5')
+    os.remove(name + '.json')
+    shutil.rmtree(name + '_out')
+    catalog._catalog = None
+    assert observables.writeobservables(filename) == []
+    assert entry['name'] not in [row['run'] for row in observables.drifttable(filename)]
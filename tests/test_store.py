@@ -0,0 +1,56 @@
+""" The store holds the same data as the files it is packed from, and gives back the space of removed runs """
+import os
+import glob
+import shutil
+
+import h5py as h5
+import numpy as np
+
+import catalog
+import dfdata
+import store
+
+
+def test_packstore(tree, tmp_path, monkeypatch):
+    # Blocks of a few times, so that every history is copied in several of them
+    monkeypatch.setattr(store, 'packbytes', 8*257*7*5)
+    filename = str(tmp_path / 'store.h5')
+    packed = store.packstore(filename)
+    assert sorted(packed) == sorted(e['name'] for e in catalog.loadcatalog().values())
+    # Packing does not leave binary caches behind
+    assert not glob.glob(os.path.join(dfdata.cachedir, 'DFAndBDNK', '*.npy'))
+
+    opened = store.openstore(filename)
+    for entry in catalog.findruns(source='DFAndBDNK'):
+        name = os.path.join(tree, entry['name'])
+        with h5.File(name + '.h5', 'r') as file:
+            for key in ('x', 'initialdatain', 'finaldata', 'solution'):
+                assert np.array_equal(store.readstore(entry['name'], key, store=opened), file[key][()])
+        for tag in ('Ttt', 'VISC', 't', 'x'):
+            full = np.loadtxt(name + '_out/{}.txt'.format(tag))
+            assert np.array_equal(store.readstore(entry['name'], '_out/' + tag, store=opened), full)
+        assert store.readstore(entry['name'], 'solution', store=opened).shape[0] == store.readstore(
+            entry['name'], '_out/Ttt', store=opened).shape[0]
+        assert store.storeinfo(entry['name'], opened)['NX'] == entry['NX']
+    assert store.packstore(filename) == []
+
+
+def test_packstore_removed_run(tmp_path, synthetictree, usetree):
+    tree = usetree(shutil.copytree(synthetictree, str(tmp_path / 'tree')))
+    filename = str(tmp_path / 'store.h5')
+    store.packstore(filename)
+    size = os.path.getsize(filename)
+
+    entry, = catalog.findruns(source='DFAndBDNK', testcase='test2', fourpietabys=0.0)
+    name = os.path.join(tree, entry['name'])
+    os.remove(name + '.h5')
+    os.remove(name + '.json')
+    shutil.rmtree(name + '_out')
+    catalog._catalog = None
+    assert store.packstore(filename) == []
+    with h5.File(filename, 'r') as opened:
+        assert entry['name'] not in opened
+        assert len(store.storeruns(opened)) == len(catalog.loadcatalog())
+    # The group of the removed run is not kept as free space
+    assert os.path.getsize(filename) < size
+    assert not glob.glob(filename + '.*.tmp')
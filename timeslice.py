@@ -0,0 +1,151 @@
+""" The fields of any source at any time.
+
+The figures take the last time of every source: finaldata, solution[-1], the
+last row of name_out/<tag>.txt, the last block of an EKT file and the MUSIC
+table of tfinal_50. fieldat(run, tag, t) returns a field at the time t instead,
+whatever the source:
+
+    DF       the .h5 of a DFAndBDNK run or of <testcase>_eta<eta/s>.h5: one row of
+             solution per steps_per_print steps from the attributes, and finaldata at final_time.
+             Runs whose solution only holds copies of the initial data (the
+             <testcase>_eta<eta/s>.h5 runs) have finaldata alone
+    BDNK     name_out/<tag>.txt, at the times of name_out/t.txt
+    EKT      the blocks of an EKT file (or of its RTA stand-in), at the times of column 0
+    MUSIC    the tables <eta/s>_tfinal_<t>.dat of a test case and eta/s, at the times of their names
+
+The time axis of the source is searched for the two times around t, only
+those two slices are read (solution.py, loadoutslice and loadekt read a slice
+without the rest of the history), and the field is interpolated linearly
+between them. With interpolate=False the slice closest to t is returned. A t
+outside the time axis is a ValueError.
+
+    x, Ttt = fieldat('DFAndBDNK/nbys_6d446548125166256_d_0d12_A_0d48_w_25d0', 'Ttt', 25.0)
+    x, fields = fieldsat(ektfile('test1', 10), ['Ttt', 'Ttx'], 25.0)
+"""
+import os
+import numpy as np
+
+from dfdata import topdir, loadout, loadoutslice, loadtxtcached, loadekt, ektlayout, readcolumns
+
+
+# Columns of the MUSIC .dat files and of the EKT files (Ttt and Ttx are divided by nug)
+musiccols = {'x': 1, 'eps': 3, 'Ttt': 4, 'Ttx': 5}
+ektcols = {'x': 18, 'Ttt': 8, 'Ttx': 11}
+
+
+################################################################################
+def bracket(times, t, rtol=1e-9):
+    """ Returns (i, j, w) such that t = (1 - w) times[i] + w times[j], with i == j if t is one of times """
+    times = np.asarray(times, dtype=float)
+    tol = rtol*max(abs(times[-1]), 1.0)
+    if t < times[0] - tol or t > times[-1] + tol:
+        raise ValueError('t = {} is outside the times {} to {}'.format(t, times[0], times[-1]))
+    j = min(int(np.searchsorted(times, t)), len(times) - 1)
+    if abs(times[j] - t) <= tol:
+        return j, j, 0.0
+    if j > 0 and abs(times[j - 1] - t) <= tol:
+        return j - 1, j - 1, 0.0
+    return j - 1, j, (t - times[j - 1])/(times[j] - times[j - 1])
+
+
+def musicruns(entry):
+    """ Returns the MUSIC entries of the test case, eta/s and shear relaxation of entry, sorted by time """
+    from catalog import findruns
+    runs = findruns(source=entry['source'], testcase=entry['testcase'], visMUSIC=entry['visMUSIC'])
+    return sorted(runs, key=lambda e: e['final_time'])
+
+
+def timeline(run, source=None):
+    """ Returns (source, run, times) of a run, the time axis of the source being read.
+
+    run is a catalog entry, the name of a run or an EKT file. A DFAndBDNK run
+    is DF, unless source='BDNK' or it has no .h5.
+    """
+    from catalog import entryof
+
+    if isinstance(run, str) and run.endswith('.out'):
+        return 'EKT', run, np.asarray(ektlayout(run)['times'])
+    entry = run if isinstance(run, dict) else entryof(run)
+    name = os.path.join(topdir, entry['name'])
+
+    if entry['source'].startswith('music_'):
+        return 'MUSIC', entry, np.array([e['final_time'] for e in musicruns(entry)])
+    if source == 'BDNK' or not entry.get('h5'):
+        return 'BDNK', entry, np.atleast_1d(loadout(name, 't'))
+
+    from solution import SolutionView
+    with SolutionView(entry) as view:
+        times = view.times
+        # Some runs never wrote their history, and every row of solution is the initial data
+        recorded = view.shape[0] < 2 or not np.allclose(view[0], view[-1], rtol=1e-12, atol=1e-12)
+    final = entry.get('final_time', times[-1])
+    if not recorded:
+        return 'final', entry, np.array([final])
+    # finaldata is one more time when final_time is not a printed step
+    if final - times[-1] > 1e-9*max(abs(final), 1.0):
+        times = np.append(times, final)
+    return 'DF', entry, times
+
+
+def timesof(run, source=None):
+    """ Returns the times at which the fields of a run are known """
+    return timeline(run, source)[2]
+
+
+################################################################################
+def readslices(source, run, indices, tags):
+    """ Reads the time slices indices of a run. Returns x[:], {tag: values[len(indices), nx]} """
+    if source == 'EKT':
+        from rta import nug
+        z, data = loadekt(run, list(indices))
+        return z, {tag: nug*data[:, :, ektcols[tag]] for tag in tags}
+
+    name = os.path.join(topdir, run['name'])
+    if source == 'MUSIC':
+        runs = musicruns(run)
+        slices = [loadtxtcached(os.path.join(topdir, runs[i]['name']), skiprows=1) for i in indices]
+        x = slices[0][:, musiccols['x']]
+        # Tables of different times need not share a grid
+        return x, {tag: np.stack([np.interp(x, s[:, musiccols['x']], s[:, musiccols[tag]]) for s in slices])
+                   for tag in tags}
+
+    if source == 'BDNK':
+        nt = len(timesof(run, 'BDNK'))
+        # The last row is read from the end of the file, the others by skipping the lines before them
+        rows = {tag: np.stack([loadoutslice(name, tag, i - nt if i == nt - 1 else i) for i in indices]) for tag in tags}
+        return loadout(name, 'x'), rows
+
+    from solution import SolutionView
+    filename = name if name.endswith('.h5') else name + '.h5'
+    with SolutionView(run) as view:
+        x = view.x
+        # Slices past the printed times are finaldata
+        blocks = [view[i, :, tags] if source == 'DF' and i < view.shape[0] else
+                  np.stack([readcolumns(filename, 'finaldata', tags)[tag] for tag in tags], axis=-1)
+                  for i in indices]
+    return x, {tag: np.stack([b[:, k] for b in blocks]) for k, tag in enumerate(tags)}
+
+
+def fieldsat(run, tags, t, source=None, interpolate=True):
+    """ Returns x[:], {tag: values[:]} of the fields tags of a run at time t (see fieldat) """
+    source, run, times = timeline(run, source)
+    i, j, w = bracket(times, t)
+    if not interpolate and i != j:
+        i = j = i if w < 0.5 else j
+    tags = list(tags)
+    x, values = readslices(source, run, [i] if i == j else [i, j], tags)
+    if i == j:
+        return x, {tag: v[0] for tag, v in values.items()}
+    return x, {tag: (1 - w)*v[0] + w*v[1] for tag, v in values.items()}
+
+
+def fieldat(run, tag, t, source=None, interpolate=True):
+    """ Returns x[:], values[:] of the field tag of a run at time t.
+
+    run is a catalog entry, the name of a run or an EKT file, and source='BDNK'
+    selects the BDNK history of a DFAndBDNK run. The field is interpolated
+    linearly in time between the two slices around t, or with
+    interpolate=False taken from the closest one.
+    """
+    x, values = fieldsat(run, [tag], t, source, interpolate)
+    return x, values[tag]
@@ -0,0 +1,300 @@
+""" Stage tracing of the figure builds, written as a Chrome trace.
+
+With DFPLOTS_TRACE=<file> (or dfplots build --trace <file>) every figure is
+timed stage by stage:
+
+    figure    the figure function
+    load      the loaders of dfdata.py and catalog.py and the get...data functions of the figure files
+    compute   freefunction, free streaming, ideal hydro and the RTA solver
+    draw      the plotting calls (plot, fill_between, legend, labels, ...)
+    layout    tight_layout
+    savefig   Figure.savefig, and within it
+    render    drawing the figure (Figure.draw)
+    latex     typesetting TeX strings which are not in the TeX cache
+
+Every stage records its wall time, the CPU time of the process and the bytes
+read (rchar of /proc/self/io), and stages nest. The result is a Chrome trace
+(open it in chrome://tracing or https://ui.perfetto.dev) and next to it a .txt
+summary with the time of every figure split into the stages, each counted
+without the stages inside it.
+
+The functions are wrapped by instrument, which render.setmode calls only when
+tracing is on, so a build without DFPLOTS_TRACE runs the original functions.
+Every process appends its stages to a part file in cachedir/trace, and
+writetrace merges them.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import contextlib
+import collections
+
+from dfdata import topdir, cachedir
+
+
+# Directory of the part files of the processes
+partdir = os.path.join(cachedir, 'trace')
+
+# The functions which are wrapped, by stage
+stagefunctions = {
+    'load': [('dfdata', ['loadtxtcached', 'loadout', 'loadoutslice', 'tailrows', 'headrow', 'loadekt',
+                         'readcolumns', 'getDFfields']),
+             ('catalog', ['loadcatalog']),
+             ('solution', ['rechunk'])],
+    'compute': [('freestream', ['freegaussian', 'freestream', 'freerun']),
+                ('idealhydro', ['solveideal', 'idealfinal']),
+                ('rta', ['solverta', 'rtafile'])],
+}
+# Functions of the figure files, wrapped wherever they are defined
+figurestages = {'getDFdata': 'load', 'getdata': 'load', 'getEKTdata': 'load', 'getMUSICdata': 'load',
+                'freefunction': 'compute'}
+# Methods of matplotlib, by stage
+drawmethods = ['plot', 'fill_between', 'scatter', 'errorbar', 'legend', 'text', 'annotate',
+               'set_xlabel', 'set_ylabel', 'set_title']
+
+# Stages in the order of the summary
+stages = ['load', 'compute', 'draw', 'layout', 'render', 'savefig', 'latex']
+
+_events = []
+_collecting = False
+
+
+################################################################################
+def tracefile():
+    """ Returns the trace file set by DFPLOTS_TRACE, or None if tracing is off """
+    value = os.environ.get('DFPLOTS_TRACE', '')
+    if value in ('', '0'):
+        return None
+    return os.path.join(topdir, 'trace.json') if value == '1' else os.path.abspath(value)
+
+
+def istracing():
+    """ True if the figures are traced """
+    return tracefile() is not None
+
+
+def settrace(filename):
+    """ Switches tracing on (to filename) or off (None) for this process and the processes it starts """
+    os.environ['DFPLOTS_TRACE'] = os.path.abspath(filename) if filename else '0'
+
+
+def bytesread():
+    """ Bytes read by this process so far, or 0 where /proc/self/io does not exist """
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            for line in f:
+                if line.startswith(b'rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+@contextlib.contextmanager
+def tracedstage(name, cat, args):
+    start, cpu, nbytes = time.perf_counter_ns(), time.process_time_ns(), bytesread()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        _events.append({'name': name, 'cat': cat, 'ph': 'X', 'ts': start/1000, 'dur': (end - start)/1000,
+                        'pid': os.getpid(), 'tid': 0,
+                        'args': dict(args, cpu_ms=(time.process_time_ns() - cpu)/1e6,
+                                     bytes_read=bytesread() - nbytes)})
+
+
+def stage(name, cat='stage', **args):
+    """ Context manager which records the with block as a stage when tracing is on, and does nothing otherwise """
+    if not istracing():
+        return contextlib.nullcontext()
+    return tracedstage(name, cat, args)
+
+
+def traced(func, name, cat):
+    """ Returns func wrapped in a stage """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracedstage(name, cat, {}):
+            return func(*args, **kwargs)
+    wrapper.__traced__ = func
+    return wrapper
+
+
+################################################################################
+def rebind(old, new):
+    """ Replaces old by new in the modules of the repository which imported it by name """
+    for module in list(sys.modules.values()):
+        filename = getattr(module, '__file__', None) or ''
+        if not filename.startswith(topdir) or module.__name__ == __name__:
+            continue
+        for key, value in list(vars(module).items()):
+            if value is old:
+                setattr(module, key, new)
+
+
+def instrument():
+    """ Wraps the loaders, the reference computations and the matplotlib stages in stages. Call after setmode """
+    import importlib
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+    from matplotlib.texmanager import TexManager
+
+    for cat, modules in stagefunctions.items():
+        for modulename, names in modules:
+            module = importlib.import_module(modulename)
+            for name in names:
+                func = getattr(module, name)
+                if not hasattr(func, '__traced__'):
+                    wrapper = traced(func, '{}.{}'.format(modulename, name), cat)
+                    setattr(module, name, wrapper)
+                    rebind(func, wrapper)
+
+    for module in list(sys.modules.values()):
+        if not (getattr(module, '__file__', None) or '').startswith(topdir):
+            continue
+        for name, cat in figurestages.items():
+            func = vars(module).get(name)
+            if callable(func) and not hasattr(func, '__traced__') and getattr(func, '__module__', None) == module.__name__:
+                setattr(module, name, traced(func, '{}.{}'.format(module.__name__, name), cat))
+        # The figures list, which the __main__ block of a figure file runs
+        figures = vars(module).get('figures')
+        if isinstance(figures, list):
+            for i, (func, kwargs) in enumerate(figures):
+                if not hasattr(func, '__traced__'):
+                    args = ', '.join('{}={!r}'.format(k, v) for k, v in kwargs.items())
+                    name = '{}.{}({})'.format(os.path.splitext(os.path.basename(module.__file__))[0], func.__name__, args)
+                    figures[i] = traced(func, name, 'figure'), kwargs
+
+    for name in drawmethods:
+        if not hasattr(getattr(Axes, name), '__traced__'):
+            setattr(Axes, name, traced(getattr(Axes, name), 'Axes.' + name, 'draw'))
+    for name, cat in (('tight_layout', 'layout'), ('savefig', 'savefig'), ('draw', 'render')):
+        if not hasattr(getattr(Figure, name), '__traced__'):
+            setattr(Figure, name, traced(getattr(Figure, name), 'Figure.' + name, cat))
+    if not hasattr(TexManager.make_dvi, '__traced__'):
+        makedvi = traced(TexManager.make_dvi, 'TexManager.make_dvi', 'latex')
+        TexManager.make_dvi = staticmethod(makedvi)
+
+    if not getattr(instrument, 'registered', False):
+        atexit.register(finish)
+        instrument.registered = True
+
+
+################################################################################
+def partname(pid=None):
+    return os.path.join(partdir, '{}.jsonl'.format(pid or os.getpid()))
+
+
+def starttrace():
+    """ Removes the part files of earlier traces. Called by the process which writes the trace """
+    global _collecting
+    _collecting = True
+    if os.path.isdir(partdir):
+        for name in os.listdir(partdir):
+            os.remove(os.path.join(partdir, name))
+
+
+def flush():
+    """ Appends the stages recorded so far to the part file of this process """
+    if not _events:
+        return
+    os.makedirs(partdir, exist_ok=True)
+    with open(partname(), 'a') as f:
+        for event in _events:
+            f.write(json.dumps(event) + '\n')
+    del _events[:]
+
+
+def finish():
+    """ At exit: a figure file run on its own writes its trace, a worker only its part file """
+    flush()
+    if not _collecting and tracefile():
+        writetrace()
+
+
+def readparts():
+    events = []
+    if os.path.isdir(partdir):
+        for name in sorted(os.listdir(partdir)):
+            with open(os.path.join(partdir, name)) as f:
+                events += [json.loads(line) for line in f if line.strip()]
+    return events
+
+
+def writetrace(filename=None):
+    """ Merges the part files into the Chrome trace filename (default tracefile()) and writes the summary
+    next to it. Returns the summary text
+    """
+    flush()
+    filename = filename or tracefile()
+    events = readparts()
+    meta = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'dfplots {}'.format(pid)}}
+            for pid in sorted(set(e['pid'] for e in events))]
+    with open(filename, 'w') as f:
+        json.dump({'traceEvents': meta + events, 'displayTimeUnit': 'ms'}, f)
+    text = summary(events)
+    with open(os.path.splitext(filename)[0] + '.txt', 'w') as f:
+        f.write(text + '\n')
+    starttrace()
+    return text
+
+
+################################################################################
+def selftimes(events):
+    """ Returns [(event, self time in us, enclosing figure event or None)] with the time of nested stages removed """
+    result = []
+    bythread = collections.defaultdict(list)
+    for event in events:
+        bythread[event['pid'], event['tid']].append(event)
+    for thread in bythread.values():
+        thread.sort(key=lambda e: (e['ts'], -e['dur']))
+        stack = []
+        for event in thread:
+            while stack and stack[-1][0]['ts'] + stack[-1][0]['dur'] <= event['ts']:
+                stack.pop()
+            if stack:
+                stack[-1][1] += event['dur']
+            figure = next((e for e, c, f in reversed(stack) if e['cat'] == 'figure'), None)
+            entry = [event, 0.0, figure]
+            stack.append(entry)
+            result.append(entry)
+    return [(event, event['dur'] - children, figure) for event, children, figure in result]
+
+
+def summary(events):
+    """ Returns the text summary of a list of stages: the split of every figure and the time of every function """
+    split = collections.defaultdict(lambda: collections.defaultdict(float))
+    figures = {}
+    for event, self, figure in selftimes(events):
+        if event['cat'] == 'figure':
+            figures[id(event)] = event
+            split[id(event)]['other'] += self
+        elif figure is not None:
+            split[id(figure)][event['cat']] += self
+
+    columns = stages + ['other']
+    lines = ['{:60s} {:>8s} '.format('figure', 'total') + ' '.join('{:>8s}'.format(c) for c in columns) + '   MB read']
+    for key, figure in sorted(figures.items(), key=lambda item: -item[1]['dur']):
+        lines.append('{:60s} {:8.3f} '.format(figure['name'][:60], figure['dur']/1e6) +
+                     ' '.join('{:8.3f}'.format(split[key][c]/1e6) for c in columns) +
+                     ' {:9.2f}'.format(figure['args']['bytes_read']/2**20))
+
+    calls = collections.defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0])
+    for event, self, figure in selftimes(events):
+        if event['cat'] == 'figure':
+            continue
+        row = calls[event['cat'], event['name']]
+        row[0] += 1
+        row[1] += event['dur']
+        row[2] += self
+        row[3] += event['args']['cpu_ms']
+        row[4] += event['args']['bytes_read']
+    lines += ['', '{:8s} {:40s} {:>7s} {:>9s} {:>9s} {:>9s} {:>9s}'.format(
+        'stage', 'function', 'calls', 'wall s', 'self s', 'cpu s', 'MB read')]
+    for (cat, name), (n, wall, self, cpu, nbytes) in sorted(calls.items(), key=lambda item: -item[1][2]):
+        lines.append('{:8s} {:40s} {:7d} {:9.3f} {:9.3f} {:9.3f} {:9.2f}'.format(
+            cat, name[:40], n, wall/1e6, self/1e6, cpu/1e3, nbytes/2**20))
+    return '\n'.join(lines)